@@ -0,0 +1,64 @@
+"""
+Benchmark: ANN recall vs latency
+================================
+Сравнение IVF-flat (IVFIndex) с точным перебором (DenseIndex) на
+хешированных эмбеддингах: recall@k относительно точного top-k и средняя
+задержка запроса для разных nprobe.
+
+Корпус тематический (у реальных документов есть темы — на них и опирается
+IVF), запросы — несколько слов из случайного чанка.
+
+Запуск из корня репозитория:
+    python -m benchmarks.bench_ann [n_chunks ...]
+"""
+
+import sys
+import time
+import random
+
+from benchmarks.corpus import synthetic_chunks
+from rag.ann import IVFIndex
+from rag.dense import DenseIndex, HashingEmbedder
+
+NPROBES = (1, 2, 4, 8, 16, 32, 64)
+
+
+def run(n_chunks: int, k: int = 10, n_queries: int = 200):
+    """Строит оба индекса на n_chunks и печатает recall@k и задержку"""
+    rng = random.Random(7)
+    chunks = synthetic_chunks(n_chunks, topics=max(1, n_chunks // 500))
+    embedder = HashingEmbedder()
+    dense = DenseIndex(embedder.embed(chunks))
+    queries = [
+        embedder.embed_one(" ".join(rng.sample(rng.choice(chunks).split(), 6)))
+        for _ in range(n_queries)
+    ]
+
+    start = time.perf_counter()
+    ann = IVFIndex.build(dense.vectors)
+    print(f"  build: {ann.n_lists} lists in {time.perf_counter() - start:.2f} s")
+    # Раскладка векторов по спискам строится при первом поиске — не в замерах
+    ann.search(dense.vectors, queries[0], k)
+
+    start = time.perf_counter()
+    exact = [{doc_id for doc_id, _ in dense.search(q, k)} for q in queries]
+    elapsed = (time.perf_counter() - start) / n_queries * 1000
+    print(f"  {'exact':<12} {elapsed:8.3f} ms/query   recall@{k} 1.000")
+
+    default = ann.default_nprobe
+    for nprobe in sorted({*(n for n in NPROBES if n <= ann.n_lists), default}):
+        start = time.perf_counter()
+        approx = [{doc_id for doc_id, _ in ann.search(dense.vectors, q, k, nprobe)} for q in queries]
+        elapsed = (time.perf_counter() - start) / n_queries * 1000
+
+        found = sum(len(a & e) for a, e in zip(approx, exact))
+        recall = found / max(1, sum(len(e) for e in exact))
+        label = " (default)" if nprobe == default else ""
+        print(f"  nprobe={nprobe:<5} {elapsed:8.3f} ms/query   recall@{k} {recall:.3f}{label}")
+
+
+if __name__ == "__main__":
+    sizes = [int(arg) for arg in sys.argv[1:]] or [20_000, 100_000]
+    for size in sizes:
+        print(f"{size} chunks:")
+        run(size)
@@ -0,0 +1,213 @@
+"""
+Benchmark: vector store backends
+================================
+Общий набор проверок соответствия VectorStoreBackend и замеров
+производительности для всех реализаций хранилища (bm25, dense, hybrid,
+chroma). Бэкенд chroma пропускается, если пакет chromadb не установлен.
+
+Проверки: формат результатов, поиск чанка по его собственному тексту
+(в top-3 — поиск chroma приближённый), совпадение search_many с search,
+инкрементальная индексация (добавление, изменение, удаление файла),
+повторное открытие индекса и очистка.
+Замеры: время индексации, задержка search и search_many на запрос
+(кеш запросов выключен), доля запросов, у которых исходный файл
+попал в top-3.
+
+Запуск из корня репозитория:
+    python -m benchmarks.bench_backends [n_files] [backend ...]
+"""
+
+import os
+import sys
+import time
+import random
+import asyncio
+import logging
+import tempfile
+import importlib.util
+
+os.environ["RAG_CACHE_SIZE"] = "0"  # замеряем поиск, а не кеш
+
+from benchmarks.corpus import corpus_chunks, write_corpus, write_file
+from rag.backend import ALL_BACKENDS, VectorStoreBackend, create_store
+
+
+class CheckFailed(Exception):
+    """Проверка соответствия не пройдена"""
+
+
+def check(condition: bool, message: str):
+    """Бросает CheckFailed, если условие не выполнено"""
+    if not condition:
+        raise CheckFailed(message)
+
+
+def sources(result: dict) -> list[str]:
+    """Источники результатов поиска"""
+    return [meta["source"] for meta in result["metadatas"][0]]
+
+
+def best_ms(fn, repeats: int = 3) -> float:
+    """Лучшее из нескольких прогонов время fn, мс"""
+    timings = []
+    for _ in range(repeats):
+        start = time.perf_counter()
+        fn()
+        timings.append((time.perf_counter() - start) * 1000)
+    return min(timings)
+
+
+async def run_backend(backend: str, n_files: int, n_queries: int = 200) -> list[str]:
+    """
+    Прогоняет проверки и замеры для одного бэкенда.
+
+    Returns:
+        Список непройденных проверок
+    """
+    rng = random.Random(7)
+    failures = []
+    data_dir = tempfile.mkdtemp(prefix="bench-data-")
+    persist_dir = tempfile.mkdtemp(prefix="bench-store-")
+    corpus = write_corpus(data_dir, n_files)
+
+    def run_check(name: str, fn):
+        try:
+            fn()
+            print(f"  ok    {name}")
+        except CheckFailed as e:
+            failures.append(f"{backend}: {name}: {e}")
+            print(f"  FAIL  {name}: {e}")
+
+    store = create_store(persist_dir, backend)
+    run_check("implements VectorStoreBackend", lambda: check(
+        isinstance(store, VectorStoreBackend), f"{type(store).__name__} не реализует протокол"
+    ))
+
+    start = time.perf_counter()
+    stats = await store.index_documents(data_dir)
+    index_s = time.perf_counter() - start
+
+    def check_index_stats():
+        for key in ("files", "chunks", "added", "updated", "removed", "skipped", "duplicates", "total_chunks"):
+            check(key in stats, f"нет ключа {key} в статистике индексации")
+        check(stats["added"] == n_files, f"added={stats['added']}, ожидалось {n_files}")
+        store_stats = store.get_stats()
+        for key in ("total_chunks", "sources", "generation", "cache_hits", "cache_misses", "cache_hit_rate", "cache_size"):
+            check(key in store_stats, f"нет ключа {key} в get_stats")
+        check(store_stats["total_chunks"] == stats["total_chunks"] > 0, "total_chunks не совпадает")
+        check(store_stats["sources"] == n_files, f"sources={store_stats['sources']}, ожидалось {n_files}")
+
+    run_check("index stats", check_index_stats)
+
+    # Запросы: несколько слов абзаца; ожидаемый источник — его файл
+    labelled = []
+    for _ in range(n_queries):
+        filename = rng.choice(list(corpus))
+        words = rng.choice(corpus[filename]).split()
+        labelled.append((" ".join(rng.sample(words, min(6, len(words)))), filename))
+    queries = [query for query, _ in labelled]
+
+    def check_result_format():
+        result = store.search(queries[0], 3)
+        for key in ("documents", "metadatas", "distances"):
+            check(key in result and len(result[key]) == 1, f"некорректный ключ {key}")
+        check(0 < len(result["documents"][0]) <= 3, "n_results не соблюдён")
+        check(len(result["documents"][0]) == len(result["metadatas"][0]) == len(result["distances"][0]),
+              "длины списков результата различаются")
+        check(result["distances"][0] == sorted(result["distances"][0]), "расстояния не отсортированы")
+        check(not store.search("", 3)["documents"][0], "пустой запрос вернул результаты")
+
+    def check_self_retrieval():
+        misses = [
+            filename for filename in list(corpus)[:50]
+            if filename not in sources(store.search(corpus[filename][0], 3))
+        ]
+        check(len(misses) <= 2, f"абзац не нашёл свой файл: {misses[:3]}")
+
+    def check_search_many():
+        single = [store.search(query, 3) for query in queries[:50]]
+        batch = store.search_many(queries[:50], 3)
+        check(len(batch) == len(single), "search_many вернул не то число результатов")
+        for one, many in zip(single, batch):
+            check(sources(one) == sources(many), "search_many не совпадает с search")
+            check(all(abs(a - b) < 1e-4 for a, b in zip(one["distances"][0], many["distances"][0])),
+                  "расстояния search_many не совпадают с search")
+
+    run_check("result format", check_result_format)
+    run_check("self retrieval", check_self_retrieval)
+    run_check("search_many == search", check_search_many)
+
+    hits = sum(filename in sources(store.search(query, 3)) for query, filename in labelled)
+    search_ms = best_ms(lambda: [store.search(query, 3) for query in queries]) / len(queries)
+    many_ms = best_ms(lambda: store.search_many(queries, 3)) / len(queries)
+
+    # Инкрементальная индексация: изменить, удалить и добавить по файлу
+    names = list(corpus)
+    updated, removed = names[0], names[1]
+    write_file(data_dir, updated, list(reversed(corpus[updated])) + ["дополнительный абзац про сроки"])
+    os.remove(os.path.join(data_dir, removed))
+    added_text = corpus_chunks(1, seed=1)[0]
+    write_file(data_dir, "added.md", [added_text])
+    stats = await store.index_documents(data_dir)
+
+    def check_incremental():
+        check((stats["added"], stats["updated"], stats["removed"]) == (1, 1, 1),
+              f"added/updated/removed = {stats['added']}/{stats['updated']}/{stats['removed']}")
+        check(stats["skipped"] >= n_files - 2, f"skipped={stats['skipped']}")
+        found = {source for query in corpus[removed] for source in sources(store.search(query, 5))}
+        check(removed not in found, "чанки удалённого файла остались в индексе")
+        check("added.md" in sources(store.search(added_text, 3)), "новый файл не находится")
+        check(store.get_stats()["sources"] == n_files, "sources после обновления")
+
+    run_check("incremental index", check_incremental)
+
+    total = store.get_stats()["total_chunks"]
+    store.close()
+    store = create_store(persist_dir, backend)
+    stats = await store.index_documents(data_dir)
+
+    def check_reopen():
+        check(store.get_stats()["total_chunks"] == total, "число чанков после открытия")
+        check(stats["skipped"] == n_files and not stats["chunks"], "повторная индексация не пустая")
+
+    run_check("reopen", check_reopen)
+
+    def check_clear():
+        check(store.clear(), "clear вернул False")
+        check(store.get_stats()["total_chunks"] == 0, "после clear остались чанки")
+        check(not store.search(queries[0], 3)["documents"][0], "после clear поиск что-то нашёл")
+
+    run_check("clear", check_clear)
+    store.close()
+
+    print(f"  index {n_files} files: {index_s * 1000:8.1f} ms")
+    print(f"  search          {search_ms:8.3f} ms/query")
+    print(f"  search_many     {many_ms:8.3f} ms/query")
+    print(f"  source in top-3 {hits / len(labelled):8.1%}")
+    return failures
+
+
+async def main(n_files: int, backends: list[str]) -> int:
+    """Прогоняет бэкенды по очереди; возвращает код выхода"""
+    failures = []
+    for backend in backends:
+        print(f"{backend}:")
+        if backend == "chroma" and importlib.util.find_spec("chromadb") is None:
+            print("  skipped: chromadb не установлен")
+            continue
+        failures += await run_backend(backend, n_files)
+
+    if failures:
+        print(f"\n{len(failures)} проверок не пройдено:")
+        for failure in failures:
+            print(f"  {failure}")
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.WARNING)
+    args = sys.argv[1:]
+    n_files = int(args.pop(0)) if args and args[0].isdigit() else 200
+    backends = args or sorted(ALL_BACKENDS)
+    sys.exit(asyncio.run(main(n_files, backends)))
@@ -0,0 +1,93 @@
+"""
+Benchmark: index memory footprint
+=================================
+Байт на чанк для прежнего представления (list[dict] чанков +
+postings {термин: {doc_id: tf}}) и для компактного (ChunkStore +
+InvertedIndex на массивах с интернированным словарём).
+
+Память считается через tracemalloc; тексты генерируются пачками и
+не удерживаются, поэтому в замер входит всё, что хранит структура.
+Прежнее представление на 1M чанков требует больше 5 ГБ, поэтому
+по умолчанию оно замеряется только до LEGACY_MAX_CHUNKS.
+
+Запуск из корня репозитория:
+    python -m benchmarks.bench_memory [n_chunks ...]
+"""
+
+import sys
+import tracemalloc
+from collections import Counter
+from typing import Iterator
+
+from benchmarks.corpus import synthetic_chunks
+from rag.chunk_store import ChunkStore
+from rag.inverted_index import InvertedIndex
+from rag.tokenizer import tokenize
+
+LEGACY_MAX_CHUNKS = 200_000
+BATCH_SIZE = 10_000
+CHUNKS_PER_FILE = 50
+
+
+def chunk_stream(n_chunks: int) -> Iterator[tuple[str, int, str]]:
+    """(источник, номер чанка в источнике, текст) без удержания всего корпуса"""
+    for batch, start in enumerate(range(0, n_chunks, BATCH_SIZE)):
+        texts = synthetic_chunks(min(BATCH_SIZE, n_chunks - start), seed=batch)
+        for offset, text in enumerate(texts):
+            doc_id = start + offset
+            if doc_id % CHUNKS_PER_FILE == 0:
+                filename = f"document_{doc_id // CHUNKS_PER_FILE}.md"
+            yield filename, doc_id % CHUNKS_PER_FILE, text
+
+
+def build_legacy(n_chunks: int):
+    """Прежнее представление: словари чанков и словари postings"""
+    documents = []
+    postings: dict[str, dict[int, int]] = {}
+    doc_lengths = []
+    for doc_id, (filename, i, text) in enumerate(chunk_stream(n_chunks)):
+        documents.append({"id": f"{filename}_{i}", "content": text, "source": filename})
+        tokens = tokenize(text)
+        doc_lengths.append(len(tokens))
+        for term, tf in Counter(tokens).items():
+            postings.setdefault(term, {})[doc_id] = tf
+    return documents, postings, doc_lengths
+
+
+def build_compact(n_chunks: int):
+    """Компактное представление"""
+    documents = ChunkStore()
+    index = InvertedIndex()
+    for filename, i, text in chunk_stream(n_chunks):
+        documents.append(filename, i, text)
+        index.add_document(tokenize(text))
+    return documents, index
+
+
+def measure(build, n_chunks: int) -> float:
+    """Байт на чанк, удерживаемых построенной структурой"""
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    structure = build(n_chunks)
+    retained = tracemalloc.get_traced_memory()[0] - before
+    tracemalloc.stop()
+    del structure
+    return retained / n_chunks
+
+
+def run(n_chunks: int):
+    compact = measure(build_compact, n_chunks)
+    if n_chunks <= LEGACY_MAX_CHUNKS:
+        legacy = measure(build_legacy, n_chunks)
+        print(f"  legacy  {legacy:10,.0f} B/chunk")
+        print(f"  compact {compact:10,.0f} B/chunk  ({legacy / compact:.1f}x smaller)")
+    else:
+        print(f"  legacy  {'skipped':>10}")
+        print(f"  compact {compact:10,.0f} B/chunk")
+
+
+if __name__ == "__main__":
+    sizes = [int(arg) for arg in sys.argv[1:]] or [10_000, 100_000, 1_000_000]
+    for size in sizes:
+        print(f"{size} chunks:")
+        run(size)
@@ -0,0 +1,86 @@
+"""
+Benchmark: compressed postings
+==============================
+Размер postings в сжатом виде (дельта + VByte) против несжатых пар
+uint32 и цена ленивого декодирования: скорость декодирования всех
+postings и задержка top-k по сжатому индексу против заранее
+декодированных postings.
+
+Запуск из корня репозитория:
+    python -m benchmarks.bench_postings [n_chunks ...]
+"""
+
+import sys
+import time
+
+from benchmarks.corpus import synthetic_chunks, synthetic_queries
+from rag.bm25 import BM25Scorer
+from rag.inverted_index import InvertedIndex, Postings
+from rag.tokenizer import tokenize
+
+
+class DecodedIndex:
+    """Тот же индекс с заранее декодированными postings (эквивалент несжатого формата)"""
+
+    def __init__(self, index: InvertedIndex):
+        self._postings = {term: index.get_postings(term) for term in index.terms()}
+        self.doc_lengths = index.doc_lengths
+        self.n_docs = index.n_docs
+        self.avg_doc_length = index.avg_doc_length
+
+    def get_postings(self, term: str) -> Postings:
+        return self._postings.get(term) or Postings([], [])
+
+
+def best_ms(fn, queries: list[list[str]], repeats: int = 3) -> float:
+    """Лучшее из нескольких прогонов среднее время fn на запрос, мс"""
+    timings = []
+    for _ in range(repeats):
+        start = time.perf_counter()
+        for tokens in queries:
+            fn(tokens)
+        timings.append((time.perf_counter() - start) / len(queries) * 1000)
+    return min(timings)
+
+
+def run(n_chunks: int, k: int = 3, n_queries: int = 200):
+    """Строит индекс на n_chunks и печатает размер postings и стоимость декодирования"""
+    index = InvertedIndex.build(synthetic_chunks(n_chunks), tokenize)
+    terms = list(index.terms())
+
+    n_postings = sum(index.doc_freq(term) for term in terms)
+    encoded = sum(len(index.encoded_postings(term)[0]) for term in terms)
+    raw = n_postings * 8
+    print(f"  postings: {n_postings:,} entries, {len(terms):,} terms")
+    print(f"  raw uint32 pairs {raw / 2**20:8.2f} MiB")
+    print(f"  delta + vbyte    {encoded / 2**20:8.2f} MiB  ({raw / encoded:.1f}x smaller, "
+          f"{encoded / n_postings:.2f} B/posting)")
+
+    start = time.perf_counter()
+    for term in terms:
+        index.get_postings(term)
+    elapsed = time.perf_counter() - start
+    print(f"  decode all: {elapsed * 1000:.1f} ms ({n_postings / elapsed / 1e6:.1f} M postings/s)")
+
+    decoded = DecodedIndex(index)
+    queries = [tokenize(q) for q in synthetic_queries(n_queries)]
+    scorer = BM25Scorer()
+
+    def decode_query(tokens: list[str]):
+        for term in tokens:
+            index.get_postings(term)
+
+    print(f"  decode per query  {best_ms(decode_query, queries):8.3f} ms/query")
+    for name, target in (("decoded", decoded), ("compressed", index)):
+        # Прогрев кеша верхних границ терминов
+        for tokens in queries:
+            scorer.top_k(target, tokens, k)
+        elapsed = best_ms(lambda tokens: scorer.top_k(target, tokens, k), queries)
+        print(f"  top-{k} {name:<11} {elapsed:8.3f} ms/query")
+
+
+if __name__ == "__main__":
+    sizes = [int(arg) for arg in sys.argv[1:]] or [10_000, 100_000]
+    for size in sizes:
+        print(f"{size} chunks:")
+        run(size)
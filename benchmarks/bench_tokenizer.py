@@ -0,0 +1,43 @@
+"""
+Benchmark: tokenizer throughput
+===============================
+Скорость токенизации (токенов/с) без нормализации и со стеммингом:
+на холодной таблице мемоизации и на прогретой.
+
+Запуск из корня репозитория:
+    python -m benchmarks.bench_tokenizer [n_chunks]
+"""
+
+import sys
+import time
+
+from benchmarks.corpus import synthetic_chunks
+from rag.tokenizer import create_tokenizer
+
+
+def measure(name: str, tokenizer, texts: list[str]):
+    """Печатает пропускную способность токенизатора на текстах"""
+    start = time.perf_counter()
+    n_tokens = sum(len(tokenizer(text)) for text in texts)
+    elapsed = time.perf_counter() - start
+    print(f"  {name:<16} {n_tokens / elapsed:12,.0f} tokens/s")
+
+
+def run(n_chunks: int):
+    texts = synthetic_chunks(n_chunks)
+
+    measure("simple", create_tokenizer(stemming=False), texts)
+
+    stemming = create_tokenizer(stemming=True)
+    measure("stemming (cold)", stemming, texts)
+    measure("stemming (warm)", stemming, texts)
+
+    info = stemming.normalizer.cache_info()
+    print(f"  memo table: {info.currsize} forms, {info.hits} hits, {info.misses} misses")
+
+    # Без мемоизации каждая словоформа стеммится заново
+    measure("stemming (no memo)", create_tokenizer(stemming=True, cache_size=0), texts)
+
+
+if __name__ == "__main__":
+    run(int(sys.argv[1]) if len(sys.argv) > 1 else 20_000)
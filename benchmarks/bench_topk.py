@@ -0,0 +1,54 @@
+"""
+Benchmark: top-k selection
+==========================
+Сравнение полного подсчёта + сортировки (BM25Scorer.score) с MaxScore
+и кучей ограниченного размера (BM25Scorer.top_k).
+
+Запуск из корня репозитория:
+    python -m benchmarks.bench_topk [n_chunks ...]
+"""
+
+import sys
+import time
+
+from benchmarks.corpus import synthetic_chunks, synthetic_queries
+from rag.bm25 import BM25Scorer
+from rag.inverted_index import InvertedIndex
+from rag.tokenizer import tokenize
+
+
+def full_sort(scorer: BM25Scorer, index: InvertedIndex, tokens: list[str], k: int) -> list[tuple[int, float]]:
+    """Прежняя реализация: скор всех документов и полная сортировка"""
+    scores = scorer.score(index, tokens)
+    return sorted(scores.items(), key=lambda x: x[1], reverse=True)[:k]
+
+
+def run(n_chunks: int, k: int = 3, n_queries: int = 200):
+    """Строит индекс на n_chunks и печатает среднюю задержку запроса"""
+    index = InvertedIndex.build(synthetic_chunks(n_chunks), tokenize)
+    queries = [tokenize(q) for q in synthetic_queries(n_queries)]
+    scorer = BM25Scorer()
+
+    # Прогрев кеша верхних границ терминов
+    for tokens in queries:
+        scorer.top_k(index, tokens, k)
+
+    results = {}
+    for name, fn in (("full sort", full_sort), ("maxscore", BM25Scorer.top_k)):
+        start = time.perf_counter()
+        results[name] = [fn(scorer, index, tokens, k) for tokens in queries]
+        elapsed = (time.perf_counter() - start) / n_queries * 1000
+        print(f"  {name:<10} {elapsed:8.3f} ms/query")
+
+    mismatches = sum(
+        [doc_id for doc_id, _ in a] != [doc_id for doc_id, _ in b]
+        for a, b in zip(results["full sort"], results["maxscore"])
+    )
+    print(f"  mismatched top-{k}: {mismatches}/{n_queries}")
+
+
+if __name__ == "__main__":
+    sizes = [int(arg) for arg in sys.argv[1:]] or [10_000, 100_000]
+    for size in sizes:
+        print(f"{size} chunks:")
+        run(size)
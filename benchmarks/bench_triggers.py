@@ -0,0 +1,120 @@
+"""
+Benchmark: RAG trigger detection
+================================
+Стоимость AutoRAGService.detect_trigger (автомат Ахо–Корасик + одно
+регулярное выражение) против прежней проверки (подстрока на каждое
+ключевое слово, затем каждый паттерн) в зависимости от числа ключевых
+слов и длины сообщения. Сообщения без триггеров — худший случай, когда
+проверяется всё. По этим замерам выбран AUTOMATON_MIN_KEYWORDS: на
+меньшем словаре сервис проверяет подстроки по одной.
+
+Запуск из корня репозитория:
+    python -m benchmarks.bench_triggers
+"""
+
+import re
+import time
+import random
+
+from benchmarks.corpus import load_vocabulary
+from services.auto_rag import (
+    AUTOMATON_MIN_KEYWORDS, PATTERN_ANCHORS, QUESTION_PREFIXES, RAG_KEYWORDS, RAG_PATTERNS,
+    REFERENCE_WORDS
+)
+from utils.aho_corasick import AhoCorasick
+
+KEYWORD_COUNTS = (len(RAG_KEYWORDS), AUTOMATON_MIN_KEYWORDS, 350, 3500)
+MESSAGE_LENGTHS = (60, 500, 4000)
+
+
+class LegacyGate:
+    """Прежняя проверка: по подстроке на ключевое слово и по regex на паттерн"""
+
+    def __init__(self, keywords: list[str]):
+        self.keywords = keywords
+        self.patterns = [re.compile(p, re.IGNORECASE) for p in RAG_PATTERNS]
+
+    def __call__(self, message: str) -> bool:
+        message_lower = message.lower()
+        if any(keyword in message_lower for keyword in self.keywords):
+            return True
+        if any(pattern.search(message_lower) for pattern in self.patterns):
+            return True
+        is_question = "?" in message or message_lower.startswith(QUESTION_PREFIXES)
+        return is_question and any(word in message_lower for word in REFERENCE_WORDS)
+
+
+class AutomatonGate:
+    """Один проход автомата + одно объединённое регулярное выражение"""
+
+    def __init__(self, keywords: list[str]):
+        self.matcher = AhoCorasick(
+            [(keyword, "keyword") for keyword in keywords]
+            + [(word, "reference") for word in REFERENCE_WORDS]
+            + [(word, "anchor") for word in PATTERN_ANCHORS]
+            + [("?", "question")]
+        )
+        self.patterns = re.compile("|".join(f"(?:{p})" for p in RAG_PATTERNS))
+
+    def __call__(self, message: str) -> bool:
+        message_lower = message.lower()
+        is_question = message_lower.startswith(QUESTION_PREFIXES)
+        reference = has_anchor = False
+        for _, _, role in self.matcher.iter_matches(message_lower):
+            if role == "keyword":
+                return True
+            if role == "question":
+                is_question = True
+            elif role == "anchor":
+                has_anchor = True
+            else:
+                reference = True
+        if has_anchor and self.patterns.search(message_lower):
+            return True
+        return is_question and reference
+
+
+def keywords_of_size(n: int, rng: random.Random) -> list[str]:
+    """Ключевые слова RAG, дополненные до n редкими словами словаря и их парами"""
+    vocabulary = [word for word in load_vocabulary() if len(word) > 3]
+    keywords = list(RAG_KEYWORDS)
+    while len(keywords) < n:
+        keywords.append(f"{rng.choice(vocabulary)}{rng.choice('абвгд')} {rng.choice(vocabulary)}")
+    return keywords
+
+
+def message_of_length(length: int, rng: random.Random) -> str:
+    """Сообщение без триггеров из обычных слов"""
+    words = ["сайт", "нужен", "для", "кофейни", "с", "меню", "доставкой", "и", "оплатой", "онлайн"]
+    message = ""
+    while len(message) < length:
+        message += rng.choice(words) + " "
+    return message[:length]
+
+
+def us_per_call(gate, messages: list[str], repeats: int = 5) -> float:
+    """Лучшее из нескольких прогонов время на сообщение, мкс"""
+    timings = []
+    for _ in range(repeats):
+        start = time.perf_counter()
+        for message in messages:
+            gate(message)
+        timings.append((time.perf_counter() - start) / len(messages) * 1e6)
+    return min(timings)
+
+
+def run():
+    rng = random.Random(7)
+    for n_keywords in KEYWORD_COUNTS:
+        keywords = keywords_of_size(n_keywords, rng)
+        legacy, automaton = LegacyGate(keywords), AutomatonGate(keywords)
+        print(f"{n_keywords} keywords:")
+        for length in MESSAGE_LENGTHS:
+            messages = [message_of_length(length, rng) for _ in range(200)]
+            assert [legacy(m) for m in messages] == [automaton(m) for m in messages]
+            old, new = us_per_call(legacy, messages), us_per_call(automaton, messages)
+            print(f"  {length:>5} chars: legacy {old:9.1f} us  automaton {new:9.1f} us  ({old / new:.1f}x)")
+
+
+if __name__ == "__main__":
+    run()
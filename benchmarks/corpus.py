@@ -0,0 +1,140 @@
+"""
+Synthetic Corpus
+================
+Генерация синтетических корпусов для бенчмарков на основе словаря из data/.
+
+Слова сэмплируются по закону Ципфа, чтобы распределение документных
+частот было похоже на реальный текст. write_corpus записывает корпус
+заданного размера на диск для индексации (по желанию — вместе с
+реальными документами data/).
+"""
+
+import os
+import re
+import zlib
+import shutil
+import random
+from collections import Counter
+from itertools import accumulate
+
+DATA_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "data")
+
+# Синтетические слова корпуса ("термин123") делят символьные n-граммы,
+# из-за чего хешированные эмбеддинги всех чанков почти совпадают.
+# В корпусах для оценки поиска они заменяются различимыми «словами»
+SYNTHETIC_WORD_RE = re.compile(r"термин(\d+)")
+LETTERS = "абвгдежзиклмнопрстуфхцчшэюя"
+
+CHUNKS_PER_FILE = 5
+
+
+def load_vocabulary(data_dir: str = DATA_DIR) -> list[str]:
+    """Словарь из файлов data/, отсортированный по убыванию частоты"""
+    counter: Counter = Counter()
+    for filename in sorted(os.listdir(data_dir)):
+        with open(os.path.join(data_dir, filename), "r", encoding="utf-8") as f:
+            counter.update(re.findall(r"\b\w+\b", f.read().lower()))
+    return [word for word, _ in counter.most_common()]
+
+
+def synthetic_chunks(
+    n_chunks: int,
+    words_per_chunk: int = 70,
+    extra_vocab: int = 20000,
+    seed: int = 42,
+    topics: int = 0
+) -> list[str]:
+    """
+    Генерирует тексты чанков.
+
+    Args:
+        n_chunks: Количество чанков
+        words_per_chunk: Средняя длина чанка в словах
+        extra_vocab: Сколько синтетических слов добавить к словарю data/
+        seed: Сид генератора
+        topics: Число тем (0 — без тем); при темах половина слов чанка
+                берётся из собственного словаря его темы
+
+    Returns:
+        Список текстов
+    """
+    rng = random.Random(seed)
+    vocab = load_vocabulary() + [f"термин{i}" for i in range(extra_vocab)]
+    # Накопленные веса считаем один раз: choices(weights=...) пересчитывает их на каждый вызов
+    cum_weights = list(accumulate(1.0 / rank for rank in range(1, len(vocab) + 1)))
+
+    topic_vocabs = [rng.sample(vocab, 200) for _ in range(topics)]
+
+    chunks = []
+    for _ in range(n_chunks):
+        length = rng.randint(words_per_chunk // 2, words_per_chunk * 3 // 2)
+        if topics:
+            words = rng.choices(vocab, cum_weights=cum_weights, k=length - length // 2)
+            words += rng.choices(rng.choice(topic_vocabs), k=length // 2)
+            rng.shuffle(words)
+        else:
+            words = rng.choices(vocab, cum_weights=cum_weights, k=length)
+        chunks.append(" ".join(words))
+    return chunks
+
+
+def synthetic_queries(n_queries: int, terms_per_query: int = 4, seed: int = 7) -> list[str]:
+    """Запросы из слов словаря data/ (по несколько терминов)"""
+    rng = random.Random(seed)
+    vocab = [word for word in load_vocabulary() if len(word) > 2]
+    return [" ".join(rng.sample(vocab[:400], terms_per_query)) for _ in range(n_queries)]
+
+
+def pseudo_word(match: re.Match) -> str:
+    """Детерминированное «слово» из букв вместо синтетического термина"""
+    value = zlib.crc32(match.group(1).encode())
+    letters = []
+    for _ in range(4 + value % 5):
+        value, index = divmod(value, len(LETTERS))
+        letters.append(LETTERS[index])
+        value = value * 2654435761 % (1 << 32) + 1
+    return "".join(letters)
+
+
+def corpus_chunks(n_chunks: int, seed: int) -> list[str]:
+    """Тематические чанки синтетического корпуса с различимыми словами"""
+    chunks = synthetic_chunks(n_chunks, words_per_chunk=40, seed=seed, topics=max(1, n_chunks // 50))
+    return [SYNTHETIC_WORD_RE.sub(pseudo_word, chunk) for chunk in chunks]
+
+
+def write_file(data_dir: str, filename: str, paragraphs: list[str]):
+    """Записывает абзацы файла через пустую строку"""
+    with open(os.path.join(data_dir, filename), "w", encoding="utf-8") as f:
+        f.write("\n\n".join(paragraphs))
+
+
+def write_corpus(
+    data_dir: str,
+    n_files: int,
+    seed: int = 42,
+    include_data: bool = False
+) -> dict[str, list[str]]:
+    """
+    Записывает корпус для индексации: по CHUNKS_PER_FILE абзацев на файл.
+
+    Args:
+        data_dir: Директория корпуса
+        n_files: Количество синтетических файлов
+        seed: Сид генератора
+        include_data: Скопировать также реальные документы из data/
+                      (синтетические файлы служат для них шумом)
+
+    Returns:
+        Словарь {имя синтетического файла: абзацы}
+    """
+    chunks = corpus_chunks(n_files * CHUNKS_PER_FILE, seed)
+    corpus = {}
+    for i in range(n_files):
+        filename = f"doc{i:05d}.md"
+        corpus[filename] = chunks[i * CHUNKS_PER_FILE:(i + 1) * CHUNKS_PER_FILE]
+        write_file(data_dir, filename, corpus[filename])
+
+    if include_data:
+        for filename in sorted(os.listdir(DATA_DIR)):
+            shutil.copy(os.path.join(DATA_DIR, filename), os.path.join(data_dir, filename))
+    return corpus
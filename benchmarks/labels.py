@@ -0,0 +1,104 @@
+"""
+Labelled Queries
+================
+Размеченные запросы и метрики качества поиска (recall@k, MRR).
+
+Релевантность задаётся на уровне чанков через «якоря»: чанк релевантен
+запросу, если содержит хотя бы один из его якорей (без учёта регистра).
+Так разметка не зависит от параметров чанкинга.
+
+Два набора:
+    curated   — вопросы на естественном языке к документам data/
+                (benchmarks/queries.json)
+    synthetic — несколько слов случайного абзаца синтетического корпуса;
+                якорь — начало этого абзаца
+"""
+
+import os
+import json
+import random
+from dataclasses import dataclass
+
+QUERIES_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "queries.json")
+
+# Сколько первых слов абзаца служит якорем синтетического запроса
+ANCHOR_WORDS = 5
+
+
+@dataclass(frozen=True)
+class LabelledQuery:
+    """Запрос и якоря релевантных чанков"""
+    query: str
+    relevant: tuple[str, ...]
+
+    def is_relevant(self, document: str) -> bool:
+        """Релевантен ли чанк запросу"""
+        document = document.lower()
+        return any(anchor in document for anchor in self.relevant)
+
+
+def curated_queries(path: str = QUERIES_FILE) -> list[LabelledQuery]:
+    """Размеченные вопросы к документам data/"""
+    with open(path, "r", encoding="utf-8") as f:
+        items = json.load(f)
+    return [
+        LabelledQuery(item["query"], tuple(anchor.lower() for anchor in item["relevant"]))
+        for item in items
+    ]
+
+
+def synthetic_queries(
+    corpus: dict[str, list[str]],
+    n_queries: int,
+    terms_per_query: int = 6,
+    seed: int = 7
+) -> list[LabelledQuery]:
+    """
+    Запросы из слов абзацев синтетического корпуса.
+
+    Args:
+        corpus: {имя файла: абзацы} из benchmarks.corpus.write_corpus
+        n_queries: Количество запросов
+        terms_per_query: Слов в запросе
+        seed: Сид генератора
+
+    Returns:
+        Запросы, релевантный чанк — содержащий начало исходного абзаца
+    """
+    rng = random.Random(seed)
+    paragraphs = [paragraph for paragraphs in corpus.values() for paragraph in paragraphs]
+    queries = []
+    for paragraph in rng.sample(paragraphs, min(n_queries, len(paragraphs))):
+        words = paragraph.split()
+        anchor = " ".join(words[:ANCHOR_WORDS]).lower()
+        queries.append(LabelledQuery(" ".join(rng.sample(words, min(terms_per_query, len(words)))), (anchor,)))
+    return queries
+
+
+def first_relevant_rank(query: LabelledQuery, documents: list[str]) -> int:
+    """Позиция первого релевантного чанка (с 1); 0 — не найден"""
+    for rank, document in enumerate(documents, 1):
+        if query.is_relevant(document):
+            return rank
+    return 0
+
+
+def quality(ranks: list[int], ks: tuple[int, ...]) -> dict[str, float]:
+    """
+    Метрики качества по позициям первых релевантных чанков.
+
+    Args:
+        ranks: first_relevant_rank для каждого запроса (поиск на max(ks) результатов)
+        ks: Значения k для recall@k
+
+    Returns:
+        {"recall@k": доля запросов с релевантным чанком в top-k, ..., "mrr": ...}
+    """
+    if not ranks:
+        return {}
+    metrics = {
+        f"recall@{k}": sum(1 for rank in ranks if 0 < rank <= k) / len(ranks)
+        for k in ks
+    }
+    metrics["mrr"] = sum(1 / rank for rank in ranks if rank) / len(ranks)
+    return metrics
@@ -0,0 +1,276 @@
+"""
+Benchmark: retrieval quality and latency report
+===============================================
+Сводный замер для всех бэкендов VectorStoreManager на одном корпусе:
+
+    quality     recall@k и MRR на размеченных запросах (benchmarks/labels.py):
+                curated — вопросы к документам data/, synthetic — к шуму
+    latency_ms  p50/p99/mean задержки search (кеш запросов выключен,
+                после прогревочного прохода) и search_many на запрос
+    index       время полной сборки, время повторной индексации без
+                изменений и размер индекса на диске
+    memory      пиковый RSS процесса (и его пула индексации)
+
+Корпус — документы data/ плюс --files синтетических файлов шума
+(benchmarks/corpus.py). Хранилище на ChromaDB замеряется, если указать
+его явно: --backends chroma. Каждый бэкенд замеряется в отдельном процессе,
+чтобы пиковый RSS не смешивался. Результат пишется в JSON с
+отсортированными ключами — отчёты двух коммитов можно сравнить diff'ом
+или через --baseline.
+
+Запуск из корня репозитория:
+    python -m benchmarks.run [--files N] [--backends bm25 dense ...]
+                             [--output report.json] [--baseline old.json]
+"""
+
+import os
+import sys
+import json
+import time
+import shutil
+import asyncio
+import logging
+import argparse
+import platform
+import resource
+import tempfile
+import subprocess
+from datetime import datetime, timezone
+
+import numpy as np
+
+from benchmarks.corpus import CHUNKS_PER_FILE, DATA_DIR, write_corpus
+from benchmarks.labels import curated_queries, first_relevant_rank, quality, synthetic_queries
+
+KS = (1, 3, 5, 10)
+DEFAULT_BACKENDS = ("bm25", "dense", "hybrid")
+
+
+def measure_backend(backend: str, data_dir: str, persist_dir: str, corpus_file: str, n_queries: int) -> dict:
+    """
+    Замеры одного бэкенда (выполняется в отдельном процессе).
+
+    Returns:
+        Раздел отчёта для бэкенда
+    """
+    os.environ["RAG_CACHE_SIZE"] = "0"  # замеряем поиск, а не кеш
+    from rag.backend import create_store
+
+    with open(corpus_file, "r", encoding="utf-8") as f:
+        corpus = json.load(f)
+    query_sets = {
+        "curated": curated_queries(),
+        "synthetic": synthetic_queries(corpus, n_queries),
+    }
+
+    store = create_store(persist_dir, backend)
+    started = time.perf_counter()
+    stats = asyncio.run(store.index_documents(data_dir))
+    build_s = time.perf_counter() - started
+
+    started = time.perf_counter()
+    asyncio.run(store.index_documents(data_dir))
+    noop_ms = (time.perf_counter() - started) * 1000
+
+    k = max(KS)
+    all_queries = [query for queries in query_sets.values() for query in queries]
+    for query in all_queries:  # прогрев: mmap, кеш стемминга
+        store.search(query.query, k)
+
+    latencies = []
+    section_quality = {}
+    for name, queries in query_sets.items():
+        ranks = []
+        for query in queries:
+            started = time.perf_counter()
+            result = store.search(query.query, k)
+            latencies.append((time.perf_counter() - started) * 1000)
+            ranks.append(first_relevant_rank(query, result["documents"][0]))
+        section_quality[name] = {key: round(value, 4) for key, value in quality(ranks, KS).items()}
+
+    started = time.perf_counter()
+    store.search_many([query.query for query in all_queries], k)
+    many_ms = (time.perf_counter() - started) * 1000 / len(all_queries)
+    store.close()
+
+    index_bytes = sum(
+        os.path.getsize(os.path.join(root, filename))
+        for root, _, filenames in os.walk(persist_dir)
+        for filename in filenames
+    )
+    # ru_maxrss в Linux — в КиБ
+    rss_self = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+    rss_children = resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss / 1024
+
+    return {
+        "quality": section_quality,
+        "latency_ms": {
+            "p50": round(float(np.percentile(latencies, 50)), 3),
+            "p99": round(float(np.percentile(latencies, 99)), 3),
+            "mean": round(float(np.mean(latencies)), 3),
+            "search_many_per_query": round(many_ms, 3),
+        },
+        "index": {
+            "chunks": stats["total_chunks"],
+            "build_s": round(build_s, 3),
+            "noop_reindex_ms": round(noop_ms, 3),
+            "size_bytes": index_bytes,
+        },
+        "memory": {
+            "peak_rss_mb": round(rss_self, 1),
+            "peak_rss_index_workers_mb": round(rss_children, 1),
+        },
+    }
+
+
+def run_worker(backend: str, data_dir: str, corpus_file: str, n_queries: int) -> dict:
+    """Запускает measure_backend в отдельном процессе и читает его JSON"""
+    persist_dir = tempfile.mkdtemp(prefix=f"bench-{backend}-")
+    try:
+        completed = subprocess.run(
+            [
+                sys.executable, "-m", "benchmarks.run", "--worker", backend,
+                "--data-dir", data_dir, "--persist-dir", persist_dir,
+                "--corpus-file", corpus_file, "--queries", str(n_queries),
+            ],
+            capture_output=True, text=True, check=True
+        )
+    except subprocess.CalledProcessError as e:
+        raise RuntimeError(f"Замер {backend} завершился с ошибкой:\n{e.stderr}") from e
+    finally:
+        shutil.rmtree(persist_dir, ignore_errors=True)
+    return json.loads(completed.stdout.strip().splitlines()[-1])
+
+
+def git_revision() -> str:
+    """Текущий коммит (с пометкой -dirty при незакоммиченных изменениях)"""
+    try:
+        revision = subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, check=True
+        ).stdout.strip()
+        dirty = subprocess.run(
+            ["git", "status", "--porcelain", "--untracked-files=no"], capture_output=True, text=True
+        ).stdout.strip()
+        return revision + ("-dirty" if dirty else "")
+    except (OSError, subprocess.CalledProcessError):
+        return "unknown"
+
+
+def flatten(report: dict, prefix: str = "") -> dict[str, float]:
+    """Плоский словарь числовых метрик: {"bm25.latency_ms.p50": ...}"""
+    flat = {}
+    for key, value in report.items():
+        path = f"{prefix}{key}"
+        if isinstance(value, dict):
+            flat.update(flatten(value, path + "."))
+        elif isinstance(value, (int, float)):
+            flat[path] = value
+    return flat
+
+
+def print_comparison(baseline: dict, report: dict):
+    """Печатает метрики общих бэкендов, отличающиеся от отчёта-базы"""
+    common = baseline["backends"].keys() & report["backends"].keys()
+    old = flatten({backend: baseline["backends"][backend] for backend in common})
+    new = flatten({backend: report["backends"][backend] for backend in common})
+    print(f"\nСравнение с {baseline['meta']['revision']} → {report['meta']['revision']}:")
+    if baseline["meta"]["corpus"] != report["meta"]["corpus"]:
+        print("  внимание: корпуса отчётов различаются")
+    only = sorted(baseline["backends"].keys() ^ report["backends"].keys())
+    if only:
+        print(f"  бэкенды только в одном отчёте: {', '.join(only)}")
+    for key in sorted(old.keys() | new.keys()):
+        before, after = old.get(key), new.get(key)
+        if before == after:
+            continue
+        if before is None or after is None:
+            print(f"  {key:<50} {before!s:>12} → {after!s:<12}")
+        else:
+            delta = f"{(after - before) / before:+.1%}" if before else ""
+            print(f"  {key:<50} {before:>12} → {after:<12} {delta}")
+
+
+def print_summary(report: dict):
+    """Краткая таблица по бэкендам"""
+    print(f"{'backend':<8} {'build s':>8} {'p50 ms':>8} {'p99 ms':>8} {'RSS MB':>8} "
+          f"{'index MB':>9} {'cur R@3':>8} {'cur MRR':>8} {'syn R@3':>8} {'syn MRR':>8}")
+    for backend, section in report["backends"].items():
+        curated, synthetic = section["quality"]["curated"], section["quality"]["synthetic"]
+        print(
+            f"{backend:<8} {section['index']['build_s']:>8.2f} {section['latency_ms']['p50']:>8.3f} "
+            f"{section['latency_ms']['p99']:>8.3f} {section['memory']['peak_rss_mb']:>8.1f} "
+            f"{section['index']['size_bytes'] / 2**20:>9.2f} {curated['recall@3']:>8.3f} "
+            f"{curated['mrr']:>8.3f} {synthetic['recall@3']:>8.3f} {synthetic['mrr']:>8.3f}"
+        )
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Качество и задержка поиска по бэкендам")
+    parser.add_argument("--files", type=int, default=1000, help="синтетических файлов шума")
+    parser.add_argument("--queries", type=int, default=500, help="синтетических запросов")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--backends", nargs="+", default=list(DEFAULT_BACKENDS))
+    parser.add_argument("--output", default="benchmark-report.json")
+    parser.add_argument("--baseline", help="отчёт для сравнения")
+    # Внутренний режим: замер одного бэкенда в отдельном процессе
+    parser.add_argument("--worker", help=argparse.SUPPRESS)
+    parser.add_argument("--data-dir", help=argparse.SUPPRESS)
+    parser.add_argument("--persist-dir", help=argparse.SUPPRESS)
+    parser.add_argument("--corpus-file", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.worker:
+        logging.basicConfig(level=logging.WARNING)
+        section = measure_backend(args.worker, args.data_dir, args.persist_dir, args.corpus_file, args.queries)
+        print(json.dumps(section))
+        return
+
+    work_dir = tempfile.mkdtemp(prefix="bench-corpus-")
+    try:
+        data_dir = os.path.join(work_dir, "data")
+        os.makedirs(data_dir)
+        corpus = write_corpus(data_dir, args.files, seed=args.seed, include_data=True)
+        corpus_file = os.path.join(work_dir, "corpus.json")
+        with open(corpus_file, "w", encoding="utf-8") as f:
+            json.dump(corpus, f, ensure_ascii=False)
+
+        backends = {}
+        for backend in args.backends:
+            print(f"{backend}...", file=sys.stderr)
+            backends[backend] = run_worker(backend, data_dir, corpus_file, args.queries)
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+    report = {
+        "meta": {
+            "revision": git_revision(),
+            "created": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+            "python": platform.python_version(),
+            "machine": f"{platform.system()} {platform.machine()}, {os.cpu_count()} CPU",
+            "corpus": {
+                "data_files": len(os.listdir(DATA_DIR)),
+                "synthetic_files": args.files,
+                "synthetic_paragraphs": args.files * CHUNKS_PER_FILE,
+                "seed": args.seed,
+                "curated_queries": len(curated_queries()),
+                "synthetic_queries": args.queries,
+            },
+            "ks": list(KS),
+        },
+        "backends": backends,
+    }
+
+    with open(args.output, "w", encoding="utf-8") as f:
+        json.dump(report, f, ensure_ascii=False, indent=2, sort_keys=True)
+        f.write("\n")
+
+    print_summary(report)
+    print(f"\nОтчёт: {args.output}")
+
+    if args.baseline:
+        with open(args.baseline, "r", encoding="utf-8") as f:
+            print_comparison(json.load(f), report)
+
+
+if __name__ == "__main__":
+    main()
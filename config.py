@@ -48,6 +48,34 @@ class Config:
     RAG_CHUNK_SIZE: int = int(os.getenv("RAG_CHUNK_SIZE", "500"))
     RAG_CHUNK_OVERLAP: int = int(os.getenv("RAG_CHUNK_OVERLAP", "50"))
     RAG_TOP_K: int = int(os.getenv("RAG_TOP_K", "3"))
+    RAG_BM25_K1: float = float(os.getenv("RAG_BM25_K1", "1.5"))
+    RAG_BM25_B: float = float(os.getenv("RAG_BM25_B", "0.75"))
+    RAG_BM25_DELTA: float = float(os.getenv("RAG_BM25_DELTA", "0.0"))  # > 0 — BM25+
+    RAG_STEMMING: bool = os.getenv("RAG_STEMMING", "true").lower() == "true"
+    RAG_STEM_CACHE_SIZE: int = int(os.getenv("RAG_STEM_CACHE_SIZE", "100000"))
+    RAG_CACHE_SIZE: int = int(os.getenv("RAG_CACHE_SIZE", "256"))  # 0 — кеш выключен
+    RAG_CACHE_TTL: float = float(os.getenv("RAG_CACHE_TTL", "600"))  # секунд
+    RAG_INDEX_WORKERS: int = int(os.getenv("RAG_INDEX_WORKERS", "0"))  # 0 — по числу CPU
+    RAG_BACKEND: str = os.getenv("RAG_BACKEND", "bm25")  # bm25 | dense | hybrid | chroma
+    RAG_CHROMA_HNSW_M: int = int(os.getenv("RAG_CHROMA_HNSW_M", "32"))
+    RAG_CHROMA_HNSW_EF: int = int(os.getenv("RAG_CHROMA_HNSW_EF", "200"))
+    RAG_DENSE_DIM: int = int(os.getenv("RAG_DENSE_DIM", "1024"))
+    RAG_ANN_MIN_DOCS: int = int(os.getenv("RAG_ANN_MIN_DOCS", "50000"))  # 0 — только точный поиск
+    RAG_ANN_LISTS: int = int(os.getenv("RAG_ANN_LISTS", "0"))  # 0 — ~sqrt(числа чанков)
+    RAG_ANN_NPROBE: int = int(os.getenv("RAG_ANN_NPROBE", "0"))  # 0 — четверть списков
+    RAG_RRF_K: int = int(os.getenv("RAG_RRF_K", "60"))
+    RAG_HYBRID_DEPTH: int = int(os.getenv("RAG_HYBRID_DEPTH", "20"))
+    RAG_DEDUP_THRESHOLD: float = float(os.getenv("RAG_DEDUP_THRESHOLD", "0.8"))
+    RAG_WATCH: bool = os.getenv("RAG_WATCH", "false").lower() == "true"
+    RAG_WATCH_INTERVAL: float = float(os.getenv("RAG_WATCH_INTERVAL", "5"))
+    RAG_WATCH_DEBOUNCE: float = float(os.getenv("RAG_WATCH_DEBOUNCE", "2"))
+    RAG_COLLECTION_IDLE_TTL: float = float(os.getenv("RAG_COLLECTION_IDLE_TTL", "1800"))  # 0 — не выгружать
+    RAG_COLLECTION_ROUTES: str = os.getenv("RAG_COLLECTION_ROUTES", "")  # пусто — маршруты по умолчанию
+    RAG_CLASSIFIER_PATH: str = os.getenv("RAG_CLASSIFIER_PATH", "")  # пусто — только ключевые слова
+    RAG_MESSAGE_LOG: str = os.getenv("RAG_MESSAGE_LOG", "")  # пусто — журнал выключен
+    RAG_MIN_RELEVANCE: str = os.getenv("RAG_MIN_RELEVANCE", "")  # пусто — по бэкенду (bm25 0.3, dense/chroma 0.1, hybrid 0)
+    RAG_CONTEXT_TOKENS: int = int(os.getenv("RAG_CONTEXT_TOKENS", "1500"))  # бюджет контекста базы знаний
+    RAG_RELEVANCE_BAND: float = float(os.getenv("RAG_RELEVANCE_BAND", "0.5"))  # доля от лучшего чанка
     
     # === Paths ===
     DATA_DIR: str = os.getenv("DATA_DIR", "./data")
@@ -4,8 +4,12 @@ RAG Handler
 Обработчик запросов с использованием базы знаний (Retrieval-Augmented Generation).
 """
 
+import asyncio
 import logging
-from rag.vectorstore import VectorStoreManager
+from typing import Optional
+
+from rag.backend import VectorStoreBackend
+from services.context_packer import ContextPacker, scored_chunks
 from services.openai_client import get_openai_client
 from utils.prompts import RAG_SYSTEM_PROMPT
 from utils.helpers import UserStateManager, format_sources
@@ -16,10 +20,11 @@ logger = logging.getLogger(__name__)
 class RAGHandler:
     """Обработчик RAG-запросов"""
     
-    def __init__(self, vector_store: VectorStoreManager):
+    def __init__(self, vector_store: VectorStoreBackend):
         self.vector_store = vector_store
         self.openai_client = get_openai_client()
         self.top_k = 3  # Количество релевантных чанков
+        self.packer = ContextPacker(header="[Источник: {source}]")
     
     async def handle(
         self,
@@ -39,9 +44,10 @@ class RAGHandler:
             Ответ с учётом базы знаний
         """
         try:
-            # 1. Проверяем наличие документов в базе
-            stats = self.vector_store.get_stats()
-            if stats.get("total_chunks", 0) == 0:
+            # 1-3. Проверяем базу, ищем документы и формируем контекст
+            # (индекс и кодировщик tiktoken блокируют — в отдельном потоке)
+            retrieved = await asyncio.to_thread(self._retrieve, user_id, text)
+            if retrieved is None:
                 return (
                     "📚 База знаний пуста.\n\n"
                     "Чтобы использовать режим RAG:\n"
@@ -49,17 +55,7 @@ class RAGHandler:
                     "2. Выполните команду /index\n\n"
                     "Поддерживаемые форматы: .txt, .md"
                 )
-            
-            # 2. Ищем релевантные документы
-            logger.info(f"RAG-поиск для пользователя {user_id}: {text[:50]}...")
-            
-            search_results = self.vector_store.search(
-                query=text,
-                n_results=self.top_k
-            )
-            
-            # 3. Формируем контекст
-            context, sources = self._format_context(search_results)
+            context, sources = retrieved
             
             # 4. Получаем историю диалога
             history = user_state_manager.get_history(user_id)
@@ -92,9 +88,31 @@ class RAGHandler:
                 "Попробуйте ещё раз или переключитесь в режим /mode text"
             )
     
+    def _retrieve(self, user_id: int, text: str) -> Optional[tuple[str, list[dict]]]:
+        """
+        Поиск по базе и сборка контекста (вызывать через asyncio.to_thread).
+        
+        Args:
+            user_id: ID пользователя
+            text: Текст запроса
+            
+        Returns:
+            Кортеж (контекст, список источников) или None, если база пуста
+        """
+        stats = self.vector_store.get_stats()
+        if stats.get("total_chunks", 0) == 0:
+            return None
+        
+        logger.info(f"RAG-поиск для пользователя {user_id}: {text[:50]}...")
+        search_results = self.vector_store.search(
+            query=text,
+            n_results=self.top_k
+        )
+        return self._format_context(search_results)
+    
     def _format_context(self, search_results: dict) -> tuple[str, list[dict]]:
         """
-        Форматирует результаты поиска в контекст.
+        Форматирует результаты поиска в контекст в пределах бюджета токенов.
         
         Args:
             search_results: Результаты поиска из ChromaDB
@@ -102,31 +120,12 @@ class RAGHandler:
         Returns:
             Кортеж (контекст, список источников)
         """
-        if not search_results or not search_results.get("documents"):
+        packed = self.packer.pack(scored_chunks(search_results))
+        if not packed.text:
             return "Релевантные документы не найдены.", []
         
-        documents = search_results["documents"][0]
-        metadatas = search_results.get("metadatas", [[]])[0]
-        distances = search_results.get("distances", [[]])[0]
-        
-        context_parts = []
-        sources = []
-        seen_sources = set()
-        
-        for i, (doc, meta) in enumerate(zip(documents, metadatas)):
-            source_name = meta.get("source", f"Документ {i+1}")
-            
-            # Добавляем в контекст
-            context_parts.append(f"[Источник: {source_name}]\n{doc}")
-            
-            # Собираем уникальные источники
-            if source_name not in seen_sources:
-                sources.append({"source": source_name})
-                seen_sources.add(source_name)
-        
-        context = "\n\n---\n\n".join(context_parts)
-        
-        return context, sources
+        logger.info(f"RAG-контекст: {packed.tokens}/{packed.budget} токенов, {len(packed.chunks)} чанков")
+        return packed.text, packed.sources
     
     async def search_only(self, query: str, n_results: int = 3) -> list[dict]:
         """
@@ -139,7 +138,7 @@ class RAGHandler:
         Returns:
             Список найденных документов
         """
-        results = self.vector_store.search(query=query, n_results=n_results)
+        results = await asyncio.to_thread(self.vector_store.search, query=query, n_results=n_results)
         
         if not results or not results.get("documents"):
             return []
@@ -5,14 +5,18 @@ Production-ready версия бота для превращения запро
 """
 
 import asyncio
+import html
 import logging
 import os
+import time
 from datetime import datetime
+from typing import Optional
 
 from aiogram import Bot, Dispatcher, types, F
 from aiogram.filters import Command, CommandStart
 from aiogram.fsm.storage.memory import MemoryStorage
 from aiogram.types import FSInputFile
+from aiogram.utils.chat_action import ChatActionSender
 
 from config import config
 
@@ -38,6 +42,7 @@ async def main():
     from services.router import MessageRouter
     from services.brief_session import BriefSessionManager
     from services.auto_rag import AutoRAGService
+    from services.context_packer import PackedContext
     from services.document_generator import DocumentGenerator
     from services.rate_limiter import get_rate_limiter
     from services.openai_client import get_openai_client, OpenAIError
@@ -45,7 +50,9 @@ async def main():
     from handlers.voice import VoiceHandler
     from handlers.image import ImageHandler
     from handlers.rag import RAGHandler
-    from rag.vectorstore import VectorStoreManager
+    from rag.collection_manager import CollectionManager
+    from rag.watcher import KnowledgeBaseWatcher
+    from utils.tokens import get_encoding
     from utils.helpers import (
         UserStateManager, split_long_message, 
         validate_message_length, hash_user_id
@@ -78,7 +85,7 @@ async def main():
     # Компоненты
     user_state_manager = UserStateManager()
     brief_session_manager = BriefSessionManager()
-    vector_store = VectorStoreManager()
+    vector_store = CollectionManager()
     auto_rag = AutoRAGService(vector_store)
     doc_generator = DocumentGenerator()  # Для совместимости
     tz_generator = get_tz_generator()    # Новый генератор .docx
@@ -211,6 +218,18 @@ async def main():
         """Сгенерировать финальное ТЗ"""
         await generate_final_tz(message.from_user.id, message, bot)
 
+    def retrieve_brief_context(brief_data) -> Optional[str]:
+        """Справочный контекст по ключевым полям брифа — одним пакетным поиском (выполняется в потоке)"""
+        collection = auto_rag.collection_for(brief_data.project_type)
+        if not auto_rag.has_knowledge_base(collection):
+            return None
+        return auto_rag.get_brief_context([
+            brief_data.project_goal,
+            ", ".join(brief_data.must_have_features or []),
+            brief_data.platform,
+            brief_data.budget_range,
+        ], collection=collection)
+
     async def generate_final_tz(user_id: int, message_or_callback, bot_instance):
         """
         Генерация финального ТЗ с валидацией.
@@ -262,6 +281,13 @@ async def main():
             history = user_state_manager.get_history(user_id)
             raw_text = "\n".join(brief_data.raw_messages)
             
+            # Поиск (и возможная загрузка коллекции) — вне event loop
+            knowledge = await asyncio.to_thread(retrieve_brief_context, brief_data)
+            knowledge_section = f"""
+Справочная информация из базы знаний (используй для выявления рисков):
+{knowledge}
+""" if knowledge else ""
+            
             analysis_prompt = f"""Проанализируй собранную информацию о проекте и сформируй:
 1. Список возможных рисков (red flags) — что может пойти не так
 2. Список открытых вопросов — что нужно уточнить перед началом работ
@@ -277,7 +303,7 @@ async def main():
 
 Дополнительный контекст из диалога:
 {raw_text[:2000] if raw_text else 'нет'}
-
+{knowledge_section}
 Ответь в формате:
 РИСКИ:
 - риск 1
@@ -403,14 +429,49 @@ async def main():
             await message.answer("⛔ Команда недоступна.")
             return
         
-        await message.answer("📥 Начинаю индексацию...")
-        
+        status_msg = await message.answer("📥 Начинаю индексацию...")
+        last_update = 0.0
+
+        async def report_progress(done: int, total: int):
+            """Обновляет сообщение о прогрессе не чаще раза в 2 секунды"""
+            nonlocal last_update
+            now = asyncio.get_running_loop().time()
+            if done < total and now - last_update < 2.0:
+                return
+            last_update = now
+            await status_msg.edit_text(f"📥 Индексация: обработано файлов {done} из {total}...")
+
         try:
-            stats = await vector_store.index_documents(config.DATA_DIR)
+            stats = await vector_store.index_documents(config.DATA_DIR, progress=report_progress)
+            
+            duplicates = stats["duplicates"]
+            dedup_report = ""
+            if duplicates:
+                dedup_report = f"\n🧬 <b>Пропущено почти-дубликатов: {len(duplicates)}</b>\n"
+                for duplicate in duplicates[:5]:
+                    dedup_report += (
+                        f"• {html.escape(duplicate['id'])} ≈ {html.escape(duplicate['duplicate_of'])} "
+                        f"({duplicate['similarity']:.0%})\n"
+                    )
+                if len(duplicates) > 5:
+                    dedup_report += f"… и ещё {len(duplicates) - 5}\n"
+            
+            collections_report = "".join(
+                f"• {html.escape(name)}: {collection_stats['total_chunks']} чанков\n"
+                for name, collection_stats in stats["collections"].items()
+            )
+            
             await message.answer(
                 f"✅ <b>Индексация завершена!</b>\n\n"
-                f"📄 Файлов: {stats['files']}\n"
-                f"📦 Чанков: {stats['chunks']}",
+                f"➕ Добавлено файлов: {stats['added']}\n"
+                f"🔄 Обновлено: {stats['updated']}\n"
+                f"🗑 Удалено: {stats['removed']}\n"
+                f"⏭ Без изменений: {stats['skipped']}\n"
+                f"♻️ Перечанковано ради возврата дубликатов: {stats['restored']}\n\n"
+                f"📦 Новых чанков: {stats['chunks']}\n"
+                f"📚 Всего чанков: {stats['total_chunks']}\n\n"
+                f"🗂 <b>Коллекции</b>\n{collections_report}"
+                f"{dedup_report}",
                 parse_mode="HTML"
             )
         except Exception as e:
@@ -426,11 +487,22 @@ async def main():
         
         try:
             stats = vector_store.get_stats()
+            loaded = set(stats["loaded_collections"])
+            collections_report = "".join(
+                f"• {html.escape(name)}: {chunks} чанков{' (загружена)' if name in loaded else ''}\n"
+                for name, chunks in stats["collections"].items()
+            )
             await message.answer(
                 f"📊 <b>Статистика</b>\n\n"
                 f"📦 Чанков: {stats['total_chunks']}\n"
                 f"📄 Источников: {stats['sources']}\n"
-                f"👥 Админов: {len(config.ADMIN_IDS)}",
+                f"👥 Админов: {len(config.ADMIN_IDS)}\n\n"
+                f"🗂 <b>Коллекции</b>\n{collections_report}\n"
+                f"🗄 <b>Кеш поиска</b>\n"
+                f"✅ Попаданий: {stats['cache_hits']}\n"
+                f"❌ Промахов: {stats['cache_misses']}\n"
+                f"📈 Hit rate: {stats['cache_hit_rate']:.0%}\n"
+                f"🔢 Поколение индекса: {stats['generation']}",
                 parse_mode="HTML"
             )
         except Exception as e:
@@ -674,6 +746,21 @@ async def main():
             return
         await message_router.route_image(message, bot)
 
+    def retrieve_rag_context(text: str, project_type: Optional[str]) -> tuple[Optional[PackedContext], float]:
+        """
+        Авто-RAG для сообщения: нужен ли контекст и поиск (выполняется в потоке).
+        
+        Returns:
+            Кортеж (контекст или None, время в мс)
+        """
+        started = time.perf_counter()
+        context = None
+        if auto_rag.should_use_rag(text):
+            collection = auto_rag.collection_for(project_type)
+            if auto_rag.has_knowledge_base(collection):
+                context = auto_rag.pack_rag_context(text, collection=collection)
+        return context, (time.perf_counter() - started) * 1000
+
     @dp.message(F.text)
     async def handle_text(message: types.Message):
         """Обработка текстовых сообщений с сохранением в BriefData"""
@@ -696,10 +783,10 @@ async def main():
             await message.answer(f"⚠️ {error}")
             return
         
-        # Показываем индикатор
-        await bot.send_chat_action(message.chat.id, "typing")
-        
         try:
+            timings: dict[str, float] = {}
+            started = time.perf_counter()
+            
             user_state_manager.init_user(user_id)
             session = brief_session_manager.get_session(user_id)
             
@@ -736,19 +823,21 @@ async def main():
                         session.data.project_goal = text[:1000]
                     session.current_step = "details"
             
-            # Авто-RAG
-            rag_context = None
-            if auto_rag.should_use_rag(text) and auto_rag.has_knowledge_base():
-                rag_context = auto_rag.get_rag_context(text)
-            
-            # Получаем историю
-            history = user_state_manager.get_history(user_id)
-            messages = history + [{"role": "user", "content": text}]
-            
-            # Формируем промпт для извлечения информации
-            extraction_context = ""
-            if session.is_active():
-                extraction_context = f"""
+            # Индикатор "печатает" отправляется в фоне и обновляется, пока готовится ответ
+            async with ChatActionSender.typing(bot=bot, chat_id=message.chat.id):
+                # Авто-RAG в потоке (по коллекции для типа проекта из брифа): медленный
+                # поиск не блокирует обработку сообщений других пользователей
+                project_type = session.data.project_type if session.is_active() else None
+                rag_task = asyncio.create_task(asyncio.to_thread(retrieve_rag_context, text, project_type))
+                
+                # Пока идёт поиск — история и промпт
+                history = user_state_manager.get_history(user_id)
+                messages = history + [{"role": "user", "content": text}]
+                
+                # Формируем промпт для извлечения информации
+                extraction_context = ""
+                if session.is_active():
+                    extraction_context = f"""
 Текущие данные брифа:
 - Цель: {session.data.project_goal or 'не указана'}
 - Тип: {session.data.project_type or 'не указан'}
@@ -758,30 +847,45 @@ async def main():
 Если пользователь предоставляет новую информацию — помоги её структурировать.
 Если чего-то не хватает — задай 1-2 уточняющих вопроса.
 """
+                
+                rag_context, timings["rag"] = await rag_task
+                
+                # Формируем промпт
+                if rag_context:
+                    system_prompt = SYSTEM_PROMPT + f"\n\nКОНТЕКСТ ИЗ БАЗЫ ЗНАНИЙ:\n{rag_context.text}"
+                else:
+                    system_prompt = SYSTEM_PROMPT
+                
+                if extraction_context:
+                    system_prompt += extraction_context
+                timings["prepare"] = (time.perf_counter() - started) * 1000
+                
+                # Генерируем ответ
+                stage_started = time.perf_counter()
+                response = await openai_client.chat_completion(
+                    messages=messages,
+                    system_prompt=system_prompt
+                )
+                timings["llm"] = (time.perf_counter() - stage_started) * 1000
+                
+                # Сохраняем в историю
+                user_state_manager.add_message(user_id, "user", text)
+                user_state_manager.add_message(user_id, "assistant", response)
+                
+                # Отправляем ответ (индикатор "печатает" — до последней части)
+                stage_started = time.perf_counter()
+                for part in split_long_message(response):
+                    await message.answer(part, parse_mode="HTML")
+                timings["send"] = (time.perf_counter() - stage_started) * 1000
+            timings["total"] = (time.perf_counter() - started) * 1000
             
-            # Формируем промпт
-            if rag_context:
-                system_prompt = SYSTEM_PROMPT + f"\n\nКОНТЕКСТ ИЗ БАЗЫ ЗНАНИЙ:\n{rag_context}"
-            else:
-                system_prompt = SYSTEM_PROMPT
-            
-            if extraction_context:
-                system_prompt += extraction_context
-            
-            # Генерируем ответ
-            response = await openai_client.chat_completion(
-                messages=messages,
-                system_prompt=system_prompt
+            context_info = f", контекст {rag_context.tokens} токенов" if rag_context else ""
+            logger.info(
+                f"Ответ {hash_user_id(user_id)}: "
+                + ", ".join(f"{stage} {ms:.0f} ms" for stage, ms in timings.items())
+                + context_info
             )
             
-            # Сохраняем в историю
-            user_state_manager.add_message(user_id, "user", text)
-            user_state_manager.add_message(user_id, "assistant", response)
-            
-            # Отправляем ответ
-            for part in split_long_message(response):
-                await message.answer(part, parse_mode="HTML")
-            
             # Если сессия активна, показываем кнопки действий
             if session.is_active() and session.data.project_goal:
                 is_ready = session.data.is_valid_for_generation()
@@ -811,6 +915,21 @@ async def main():
     # Устанавливаем команды бота (меню "/" в Telegram)
     await setup_bot_commands(bot, list(config.ADMIN_IDS))
     
+    # Кодировщик tiktoken при первом запуске скачивает словарь — загружаем
+    # его заранее и вне event loop, а не на первом RAG-запросе
+    await asyncio.to_thread(get_encoding, config.OPENAI_MODEL)
+    
+    # Фоновое обновление базы знаний при изменении файлов в DATA_DIR
+    watcher = None
+    if config.RAG_WATCH:
+        watcher = KnowledgeBaseWatcher(
+            vector_store,
+            config.DATA_DIR,
+            interval=config.RAG_WATCH_INTERVAL,
+            debounce=config.RAG_WATCH_DEBOUNCE
+        )
+        watcher.start()
+    
     # Запускаем polling с обработкой конфликтов
     try:
         await dp.start_polling(
@@ -821,6 +940,11 @@ async def main():
     except Exception as e:
         logger.error(f"Ошибка polling: {e}")
         raise
+    finally:
+        # Сначала останавливаем переиндексацию, затем закрываем хранилища
+        if watcher:
+            await watcher.stop()
+        await asyncio.to_thread(vector_store.close)
 
 
 if __name__ == "__main__":
@@ -0,0 +1,236 @@
+"""
+ANN Index
+=========
+Приближённый поиск ближайших соседей (IVF-flat) на NumPy.
+
+Векторы разбиваются на списки сферическим k-means; запрос сравнивается
+с центроидами и перебирает только nprobe ближайших списков. Файл индекса
+хранит лишь центроиды и номер списка каждого вектора — сами векторы
+остаются в embeddings.npy, поэтому он небольшой.
+
+В памяти при первом поиске векторы копируются в порядке списков, так что
+каждый список — непрерывный срез, и перебор списка не копирует строки
+выборкой по индексам. Цена — вторая копия эмбеддингов в памяти.
+"""
+
+import os
+import logging
+import threading
+from typing import Optional
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+# Сколько векторов обучающей выборки приходится на один список
+TRAIN_POINTS_PER_LIST = 64
+MAX_TRAIN_POINTS = 65_536
+# Размер пакета при назначении векторов спискам (ограничивает память)
+ASSIGN_BATCH = 8192
+# Доля списков, перебираемая по умолчанию. На benchmarks.bench_ann
+# (50–200 тыс. чанков) это recall@10 0.96–0.99 при задержке в 1.4–1.9 раза
+# меньше точного перебора; при фиксированном nprobe recall падает с ростом
+# числа списков. На малом числе списков доля даёт слишком мало списков,
+# поэтому перебирается не меньше MIN_DEFAULT_NPROBE
+DEFAULT_PROBE_FRACTION = 0.25
+MIN_DEFAULT_NPROBE = 16
+
+
+def _assign(vectors: np.ndarray, centroids: np.ndarray) -> np.ndarray:
+    """Номер ближайшего центроида для каждого вектора (пакетами)"""
+    assignments = np.empty(len(vectors), dtype=np.int32)
+    for start in range(0, len(vectors), ASSIGN_BATCH):
+        batch = np.asarray(vectors[start:start + ASSIGN_BATCH], dtype=np.float32)
+        assignments[start:start + len(batch)] = np.argmax(batch @ centroids.T, axis=1)
+    return assignments
+
+
+def train_centroids(
+    vectors: np.ndarray,
+    n_lists: int,
+    n_iter: int = 10,
+    seed: int = 0
+) -> np.ndarray:
+    """
+    Сферический k-means на случайной выборке векторов.
+
+    Args:
+        vectors: Нормированные векторы (n, dim)
+        n_lists: Количество центроидов
+        n_iter: Количество итераций
+        seed: Зерно генератора
+
+    Returns:
+        Нормированные центроиды (n_lists, dim)
+    """
+    rng = np.random.default_rng(seed)
+    n_train = max(n_lists, min(len(vectors), n_lists * TRAIN_POINTS_PER_LIST, MAX_TRAIN_POINTS))
+    sample_ids = np.sort(rng.choice(len(vectors), size=n_train, replace=False))
+    sample = np.asarray(vectors[sample_ids], dtype=np.float32)
+
+    centroids = sample[rng.choice(n_train, size=n_lists, replace=False)].copy()
+    for _ in range(n_iter):
+        assignments = _assign(sample, centroids)
+        order = np.argsort(assignments, kind="stable")
+        counts = np.bincount(assignments, minlength=n_lists)
+        starts = np.concatenate(([0], np.cumsum(counts)[:-1]))
+
+        non_empty = counts > 0
+        sums = np.add.reduceat(sample[order], starts[non_empty], axis=0)
+        centroids[non_empty] = sums
+        # Пустые списки переинициализируем случайными точками
+        n_empty = int((~non_empty).sum())
+        if n_empty:
+            centroids[~non_empty] = sample[rng.choice(n_train, size=n_empty, replace=False)]
+
+        norms = np.linalg.norm(centroids, axis=1, keepdims=True)
+        centroids /= np.maximum(norms, 1e-12)
+
+    return centroids
+
+
+class IVFIndex:
+    """
+    Неизменяемый IVF-flat индекс поверх матрицы векторов.
+
+    Args:
+        centroids: Центроиды списков (n_lists, dim)
+        assignments: Номер списка для каждого doc_id
+        trained_size: Число векторов на момент обучения центроидов
+    """
+
+    def __init__(self, centroids: np.ndarray, assignments: np.ndarray, trained_size: int):
+        self.centroids = centroids
+        self.assignments = assignments
+        self.trained_size = trained_size
+        # Инвертированные списки: doc_id, сгруппированные по номеру списка
+        self._order = np.argsort(assignments, kind="stable")
+        self._offsets = np.searchsorted(
+            assignments[self._order], np.arange(len(centroids) + 1)
+        )
+        # Векторы в порядке списков (строятся при первом поиске) и их источник
+        self._list_vectors: Optional[np.ndarray] = None
+        self._source: Optional[np.ndarray] = None
+        self._layout_lock = threading.Lock()
+
+    @property
+    def n_docs(self) -> int:
+        """Количество проиндексированных векторов"""
+        return len(self.assignments)
+
+    @property
+    def n_lists(self) -> int:
+        """Количество списков"""
+        return len(self.centroids)
+
+    @property
+    def default_nprobe(self) -> int:
+        """nprobe по умолчанию — DEFAULT_PROBE_FRACTION от числа списков, но не меньше MIN_DEFAULT_NPROBE"""
+        return max(MIN_DEFAULT_NPROBE, int(np.ceil(self.n_lists * DEFAULT_PROBE_FRACTION)))
+
+    @classmethod
+    def build(cls, vectors: np.ndarray, n_lists: Optional[int] = None, seed: int = 0) -> "IVFIndex":
+        """
+        Обучает центроиды и распределяет векторы по спискам.
+
+        Args:
+            vectors: Нормированные векторы (n, dim)
+            n_lists: Количество списков (по умолчанию ~sqrt(n))
+            seed: Зерно генератора
+
+        Returns:
+            Индекс
+        """
+        n_lists = max(1, min(n_lists or int(np.sqrt(len(vectors))), len(vectors)))
+        centroids = train_centroids(vectors, n_lists, seed=seed)
+        logger.info(f"IVF: {n_lists} списков для {len(vectors)} векторов")
+        return cls(centroids, _assign(vectors, centroids), len(vectors))
+
+    def search(
+        self,
+        vectors: np.ndarray,
+        query_vector: np.ndarray,
+        k: int,
+        nprobe: Optional[int] = None
+    ) -> list[tuple[int, float]]:
+        """
+        Приближённый top-k по косинусной близости.
+
+        Args:
+            vectors: Матрица векторов, по которой построен индекс
+            query_vector: Нормированный вектор запроса
+            k: Количество результатов
+            nprobe: Сколько ближайших списков перебирать (None — default_nprobe)
+
+        Returns:
+            Список (doc_id, косинус) по убыванию, только с положительной близостью
+        """
+        if not self.n_docs or k <= 0:
+            return []
+
+        nprobe = max(1, min(nprobe or self.default_nprobe, self.n_lists))
+        centroid_scores = self.centroids @ query_vector
+        probe = np.argpartition(-centroid_scores, nprobe - 1)[:nprobe]
+
+        list_vectors = self._list_layout(vectors)
+        ranges = [(self._offsets[list_id], self._offsets[list_id + 1]) for list_id in probe]
+        doc_ids = np.concatenate([self._order[start:end] for start, end in ranges])
+        if not len(doc_ids):
+            return []
+
+        scores = np.concatenate([list_vectors[start:end] @ query_vector for start, end in ranges])
+        k = min(k, len(scores))
+        top = np.argpartition(-scores, k - 1)[:k]
+        top = top[np.argsort(-scores[top], kind="stable")]
+        return [(int(doc_ids[i]), float(scores[i])) for i in top if scores[i] > 0]
+
+    def prepare(self, vectors: np.ndarray):
+        """Заранее раскладывает векторы по спискам, чтобы первый поиск не ждал копирования"""
+        self._list_layout(vectors)
+
+    def _list_layout(self, vectors: np.ndarray) -> np.ndarray:
+        """Векторы, переупорядоченные по спискам (копия строится один раз на матрицу)"""
+        with self._layout_lock:
+            if self._source is not vectors:
+                self._list_vectors = np.ascontiguousarray(vectors[self._order], dtype=np.float32)
+                self._source = vectors
+            return self._list_vectors
+
+    def without(self, doc_ids: set[int]) -> "IVFIndex":
+        """Новый индекс без указанных doc_id (остальные сдвигаются, как в DenseIndex)"""
+        if not doc_ids:
+            return self
+        keep = np.ones(self.n_docs, dtype=bool)
+        keep[list(doc_ids)] = False
+        return IVFIndex(self.centroids, self.assignments[keep], self.trained_size)
+
+    def extended(self, vectors: np.ndarray) -> "IVFIndex":
+        """Новый индекс с добавленными в конец векторами (центроиды не переобучаются)"""
+        if not len(vectors):
+            return self
+        assignments = np.concatenate([self.assignments, _assign(vectors, self.centroids)])
+        return IVFIndex(self.centroids, assignments, self.trained_size)
+
+    def save(self, path: str):
+        """Атомарно сохраняет центроиды и назначения в .npz"""
+        tmp_path = path + ".tmp"
+        with open(tmp_path, "wb") as f:
+            np.savez(
+                f,
+                centroids=self.centroids,
+                assignments=self.assignments,
+                trained_size=np.int64(self.trained_size)
+            )
+        os.replace(tmp_path, path)
+
+    @classmethod
+    def load(cls, path: str) -> Optional["IVFIndex"]:
+        """Загружает индекс (None, если файла нет или он повреждён)"""
+        if not os.path.exists(path):
+            return None
+        try:
+            with np.load(path) as data:
+                return cls(data["centroids"], data["assignments"], int(data["trained_size"]))
+        except Exception as e:
+            logger.error(f"Ошибка загрузки ANN-индекса: {e}")
+            return None
@@ -0,0 +1,93 @@
+"""
+Vector Store Backends
+=====================
+Общий интерфейс хранилищ базы знаний и выбор реализации по RAG_BACKEND.
+
+Реализации:
+    bm25, dense, hybrid — VectorStoreManager: BM25 по инвертированному
+        индексу, точный/IVF dense-поиск по эмбеддингам NumPy или их гибрид
+    chroma — ChromaVectorStore: встроенный ChromaDB (PersistentClient,
+        без сервера); требует пакета chromadb
+
+Обработчики и сервисы зависят только от VectorStoreBackend, поэтому
+реализацию можно сменить без изменения их кода.
+"""
+
+import os
+from typing import Optional, Protocol, runtime_checkable
+
+from rag.vectorstore import BACKENDS, ProgressCallback, VectorStoreManager
+
+# Все значения RAG_BACKEND
+ALL_BACKENDS = BACKENDS | {"chroma"}
+
+
+@runtime_checkable
+class VectorStoreBackend(Protocol):
+    """Интерфейс хранилища базы знаний"""
+
+    @property
+    def is_indexing(self) -> bool:
+        """Идёт ли сейчас индексация"""
+        ...
+
+    async def index_documents(self, data_dir: str, progress: Optional[ProgressCallback] = None) -> dict:
+        """
+        Инкрементально индексирует документы директории.
+
+        Returns:
+            Статистика: files, chunks, added, updated, removed, skipped,
+            duplicates, total_chunks
+        """
+        ...
+
+    def search(self, query: str, n_results: int = 3) -> dict:
+        """
+        Поиск релевантных чанков.
+
+        Returns:
+            {"documents", "metadatas", "distances"} в формате ChromaDB
+            (по одному списку на запрос) и "timings" — задержки стадий в мс
+        """
+        ...
+
+    def search_many(self, queries: list[str], n_results: int = 3) -> list[dict]:
+        """Пакетный поиск: результат search для каждого запроса в том же порядке"""
+        ...
+
+    def get_stats(self) -> dict:
+        """
+        Статистика хранилища.
+
+        Returns:
+            Минимум: total_chunks, sources, generation, cache_hits,
+            cache_misses, cache_hit_rate, cache_size
+        """
+        ...
+
+    def clear(self) -> bool:
+        """Удаляет все чанки; True если успешно"""
+        ...
+
+    def close(self):
+        """Освобождает ресурсы (хранилище после этого не используется)"""
+        ...
+
+
+def create_store(persist_dir: Optional[str] = None, backend: Optional[str] = None) -> VectorStoreBackend:
+    """
+    Создаёт хранилище выбранной реализации.
+
+    Args:
+        persist_dir: Директория индекса (по умолчанию CHROMA_PERSIST_DIR)
+        backend: Реализация (по умолчанию RAG_BACKEND)
+
+    Returns:
+        Хранилище
+    """
+    backend = (backend or os.getenv("RAG_BACKEND", "bm25")).lower()
+    if backend == "chroma":
+        # chromadb — необязательная зависимость, импортируем только по запросу
+        from rag.chroma_store import ChromaVectorStore
+        return ChromaVectorStore(persist_dir)
+    return VectorStoreManager(persist_dir, backend=backend)
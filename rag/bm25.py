@@ -0,0 +1,313 @@
+"""
+BM25 Scorer
+===========
+Ранжирование чанков по BM25/BM25+ с корпусными статистиками.
+
+IDF считается по документной частоте термина во всём корпусе,
+нормализация длины — по средней длине чанка из инвертированного индекса.
+
+Для top-k используется MaxScore: термины обходятся по убыванию верхней
+границы вклада, а как только оставшиеся термины не могут поднять новый
+документ выше k-го лучшего, новые кандидаты больше не рассматриваются.
+Скоры кандидатов считаются векторно (NumPy) прямо по массивам postings.
+
+Для пачки запросов (top_k_many) postings каждого термина обходятся один раз,
+а его вклад прибавляется в строки-аккумуляторы всех запросов с этим термином.
+"""
+
+import weakref
+from math import log
+
+import numpy as np
+
+from rag.inverted_index import InvertedIndex
+
+# Предел памяти под матрицу аккумуляторов скоров в top_k_many
+MAX_ACCUMULATOR_BYTES = 64 << 20
+
+
+def top_k_row(scores: np.ndarray, k: int) -> list[tuple[int, float]]:
+    """
+    Top-k положительных скоров строки-аккумулятора.
+
+    Args:
+        scores: Скоры всех документов
+        k: Количество результатов
+
+    Returns:
+        Список (doc_id, скор) по убыванию скора (при равенстве — по возрастанию doc_id)
+    """
+    doc_ids = np.flatnonzero(scores > 0)
+    if len(doc_ids) > k:
+        # Порог — k-й по величине скор; равные ему оставляем все, чтобы порядок был детерминированным
+        kth = np.partition(scores[doc_ids], len(doc_ids) - k)[len(doc_ids) - k]
+        doc_ids = doc_ids[scores[doc_ids] >= kth]
+    order = np.lexsort((doc_ids, -scores[doc_ids]))[:k]
+    return [(int(doc_ids[i]), float(scores[doc_ids[i]])) for i in order]
+
+
+class BM25Scorer:
+    """
+    Скорер BM25 (при delta > 0 — BM25+).
+
+    Args:
+        k1: Насыщение частоты термина (обычно 1.2–2.0)
+        b: Сила нормализации по длине документа (0 — нет, 1 — полная)
+        delta: Нижняя граница вклада термина для BM25+ (0 — классический BM25)
+    """
+
+    def __init__(self, k1: float = 1.5, b: float = 0.75, delta: float = 0.0):
+        self.k1 = k1
+        self.b = b
+        self.delta = delta
+        # Верхние границы вклада терминов: индекс → {термин: max скор}.
+        # Снапшоты индекса не меняются после сборки, поэтому кеш валиден,
+        # пока жив сам индекс.
+        self._upper_bounds: weakref.WeakKeyDictionary = weakref.WeakKeyDictionary()
+
+    def idf(self, doc_freq: int, n_docs: int) -> float:
+        """IDF в варианте Lucene (всегда неотрицательный)"""
+        return log(1.0 + (n_docs - doc_freq + 0.5) / (doc_freq + 0.5))
+
+    def term_score(self, tf: int, doc_length: int, avg_doc_length: float, idf: float) -> float:
+        """Вклад одного термина запроса в скор документа"""
+        norm = self.k1 * (1.0 - self.b + self.b * doc_length / avg_doc_length)
+        return idf * (tf * (self.k1 + 1.0) / (tf + norm) + self.delta)
+
+    def term_scores(
+        self,
+        tfs: np.ndarray,
+        doc_lengths: np.ndarray,
+        avg_doc_length: float,
+        idf: float
+    ) -> np.ndarray:
+        """Векторный term_score (те же операции в том же порядке, что и у скалярного)"""
+        norm = self.k1 * (1.0 - self.b + self.b * doc_lengths.astype(np.float64) / avg_doc_length)
+        return idf * (tfs * (self.k1 + 1.0) / (tfs + norm) + self.delta)
+    
+    def score(self, index: InvertedIndex, query_tokens: list[str]) -> dict[int, float]:
+        """
+        Считает BM25-скор для всех документов, содержащих термины запроса.
+
+        Args:
+            index: Инвертированный индекс
+            query_tokens: Токены запроса (повторы учитываются один раз)
+
+        Returns:
+            Словарь {doc_id: скор}
+        """
+        scores: dict[int, float] = {}
+        n_docs = index.n_docs
+        if not n_docs:
+            return scores
+
+        avg_doc_length = index.avg_doc_length or 1.0
+        doc_lengths = index.doc_lengths
+
+        for term in dict.fromkeys(query_tokens):
+            postings = index.get_postings(term)
+            if not postings:
+                continue
+
+            idf = self.idf(len(postings), n_docs)
+            for doc_id, tf in postings.items():
+                scores[doc_id] = scores.get(doc_id, 0.0) + self.term_score(
+                    tf, doc_lengths[doc_id], avg_doc_length, idf
+                )
+
+        return scores
+
+    def term_upper_bound(self, index: InvertedIndex, term: str) -> float:
+        """
+        Максимальный вклад термина в скор любого документа (кешируется).
+
+        Args:
+            index: Инвертированный индекс
+            term: Термин
+
+        Returns:
+            Верхняя граница вклада термина
+        """
+        bounds = self._upper_bounds.setdefault(index, {})
+        bound = bounds.get(term)
+        if bound is None:
+            postings = index.get_postings(term)
+            bound = 0.0
+            if postings:
+                idf = self.idf(len(postings), index.n_docs)
+                doc_lengths = np.asarray(index.doc_lengths)[np.asarray(postings.doc_ids)]
+                bound = float(self.term_scores(
+                    np.asarray(postings.tfs, dtype=np.float64),
+                    doc_lengths,
+                    index.avg_doc_length or 1.0,
+                    idf
+                ).max())
+            bounds[term] = bound
+        return bound
+
+    def max_score(self, index: InvertedIndex, query_tokens: list[str]) -> float:
+        """
+        Наибольший скор, достижимый для запроса: сумма верхних границ
+        вклада его терминов.
+
+        Термину, которого нет в индексе, засчитывается вклад, который он
+        дал бы, встретившись один раз в одном документе средней длины.
+        Иначе запрос из одного известного слова и нескольких посторонних
+        ("привет как дела") получал бы тот же максимум, что и точный запрос.
+
+        Args:
+            index: Инвертированный индекс
+            query_tokens: Токены запроса (повторы учитываются один раз)
+
+        Returns:
+            Скор, к которому нормируется релевантность
+        """
+        avg_doc_length = index.avg_doc_length or 1.0
+        unseen = self.term_score(1, avg_doc_length, avg_doc_length, self.idf(0, index.n_docs))
+        return sum(
+            self.term_upper_bound(index, term) or unseen
+            for term in dict.fromkeys(query_tokens)
+        )
+
+    def top_k(self, index: InvertedIndex, query_tokens: list[str], k: int) -> list[tuple[int, float]]:
+        """
+        Находит k документов с наибольшим BM25-скором (MaxScore).
+
+        Термины обходятся по убыванию верхней границы вклада. Документ
+        впервые встречается в postings своего «старшего» термина, поэтому его
+        скор не превышает сумму границ оставшихся терминов: как только эта
+        сумма меньше k-го лучшего скора, новых кандидатов быть не может.
+        Новые кандидаты каждого термина дооцениваются векторно: частоты
+        младших терминов находятся двоичным поиском (searchsorted) по их
+        отсортированным postings.
+
+        Args:
+            index: Инвертированный индекс
+            query_tokens: Токены запроса (повторы учитываются один раз)
+            k: Количество результатов
+
+        Returns:
+            Список (doc_id, скор) по убыванию скора (при равенстве — по возрастанию doc_id)
+        """
+        n_docs = index.n_docs
+        if not n_docs or k <= 0:
+            return []
+
+        avg_doc_length = index.avg_doc_length or 1.0
+        doc_lengths = np.asarray(index.doc_lengths)
+
+        terms = []
+        for term in dict.fromkeys(query_tokens):
+            postings = index.get_postings(term)
+            if postings:
+                terms.append((
+                    self.term_upper_bound(index, term),
+                    np.asarray(postings.doc_ids),
+                    np.asarray(postings.tfs, dtype=np.float64),
+                    self.idf(len(postings), n_docs)
+                ))
+        terms.sort(key=lambda t: t[0], reverse=True)
+
+        # suffix_bounds[i] — сумма границ терминов i..end
+        suffix_bounds = [0.0] * (len(terms) + 1)
+        for i in range(len(terms) - 1, -1, -1):
+            suffix_bounds[i] = suffix_bounds[i + 1] + terms[i][0]
+
+        seen = np.zeros(n_docs, dtype=bool)
+        top_ids = np.empty(0, dtype=np.int64)
+        top_scores = np.empty(0, dtype=np.float64)
+
+        for i, (_, doc_ids, tfs, idf) in enumerate(terms):
+            if len(top_ids) == k and suffix_bounds[i] < top_scores[-1]:
+                break
+
+            fresh = ~seen[doc_ids]
+            candidates = doc_ids[fresh].astype(np.int64)
+            if not len(candidates):
+                continue
+            seen[candidates] = True
+
+            scores = self.term_scores(tfs[fresh], doc_lengths[candidates], avg_doc_length, idf)
+
+            # Добираем вклад младших терминов
+            for _, other_ids, other_tfs, other_idf in terms[i + 1:]:
+                positions = np.minimum(np.searchsorted(other_ids, candidates), len(other_ids) - 1)
+                hits = other_ids[positions] == candidates
+                if hits.any():
+                    scores[hits] += self.term_scores(
+                        other_tfs[positions[hits]],
+                        doc_lengths[candidates[hits]],
+                        avg_doc_length,
+                        other_idf
+                    )
+
+            # Сливаем с текущими лучшими: скор по убыванию, doc_id по возрастанию
+            pool_ids = np.concatenate([top_ids, candidates])
+            pool_scores = np.concatenate([top_scores, scores])
+            order = np.lexsort((pool_ids, -pool_scores))[:k]
+            top_ids = pool_ids[order]
+            top_scores = pool_scores[order]
+
+        return [(int(doc_id), float(score)) for doc_id, score in zip(top_ids, top_scores)]
+
+    def top_k_many(
+        self,
+        index: InvertedIndex,
+        queries: list[list[str]],
+        k: int
+    ) -> list[list[tuple[int, float]]]:
+        """
+        Top-k для пачки запросов с общим обходом postings.
+
+        Вклад каждого термина считается один раз и прибавляется в строки
+        всех запросов, где он встречается; затем из каждой строки берётся
+        top-k. Запросы обрабатываются блоками, чтобы матрица аккумуляторов
+        не превышала MAX_ACCUMULATOR_BYTES.
+
+        Args:
+            index: Инвертированный индекс
+            queries: Токены каждого запроса
+            k: Количество результатов на запрос
+
+        Returns:
+            Для каждого запроса — список (doc_id, скор) по убыванию скора
+        """
+        results: list[list[tuple[int, float]]] = [[] for _ in queries]
+        n_docs = index.n_docs
+        if not n_docs or k <= 0:
+            return results
+
+        avg_doc_length = index.avg_doc_length or 1.0
+        doc_lengths = np.asarray(index.doc_lengths)
+
+        # Термин → номера запросов, в которых он есть
+        term_queries: dict[str, list[int]] = {}
+        for query_id, tokens in enumerate(queries):
+            for term in dict.fromkeys(tokens):
+                term_queries.setdefault(term, []).append(query_id)
+
+        # Вклад термина во все его документы (doc_id, скоры)
+        contributions: dict[str, tuple[np.ndarray, np.ndarray]] = {}
+        for term in term_queries:
+            postings = index.get_postings(term)
+            if postings:
+                doc_ids = np.asarray(postings.doc_ids)
+                contributions[term] = (doc_ids, self.term_scores(
+                    np.asarray(postings.tfs, dtype=np.float64),
+                    doc_lengths[doc_ids],
+                    avg_doc_length,
+                    self.idf(len(postings), n_docs)
+                ))
+
+        block = max(1, MAX_ACCUMULATOR_BYTES // (8 * n_docs))
+        for start in range(0, len(queries), block):
+            stop = min(start + block, len(queries))
+            scores = np.zeros((stop - start, n_docs), dtype=np.float64)
+            for term, (doc_ids, term_scores) in contributions.items():
+                for query_id in term_queries[term]:
+                    if start <= query_id < stop:
+                        scores[query_id - start, doc_ids] += term_scores
+            for row in range(stop - start):
+                results[start + row] = top_k_row(scores[row], k)
+
+        return results
@@ -0,0 +1,74 @@
+"""
+Query Cache
+===========
+LRU-кеш результатов поиска с TTL и инвалидацией по поколению индекса.
+
+Каждая запись помнит поколение индекса, на котором была посчитана;
+после переиндексации поколение растёт, и старые записи перестают
+считаться попаданиями (и вытесняются по LRU).
+"""
+
+import time
+import threading
+from collections import OrderedDict
+from typing import Any, Hashable, Optional
+
+
+class QueryCache:
+    """Потокобезопасный LRU-кеш с TTL"""
+
+    def __init__(self, max_size: int = 256, ttl_seconds: float = 600.0):
+        self.max_size = max_size
+        self.ttl_seconds = ttl_seconds
+        self.hits = 0
+        self.misses = 0
+        self._entries: OrderedDict[Hashable, tuple[int, float, Any]] = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: Hashable, generation: int) -> Optional[Any]:
+        """
+        Возвращает закешированное значение.
+
+        Args:
+            key: Ключ запроса
+            generation: Текущее поколение индекса
+
+        Returns:
+            Значение или None, если записи нет, она устарела или протухла
+        """
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                entry_generation, expires_at, value = entry
+                if entry_generation == generation and expires_at > time.monotonic():
+                    self._entries.move_to_end(key)
+                    self.hits += 1
+                    return value
+                del self._entries[key]
+            self.misses += 1
+            return None
+
+    def put(self, key: Hashable, generation: int, value: Any):
+        """Сохраняет значение, вытесняя самые давние записи"""
+        if self.max_size <= 0:
+            return
+        with self._lock:
+            self._entries[key] = (generation, time.monotonic() + self.ttl_seconds, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+
+    def clear(self):
+        """Удаляет все записи (счётчики сохраняются)"""
+        with self._lock:
+            self._entries.clear()
+
+    def get_stats(self) -> dict:
+        """Счётчики попаданий/промахов"""
+        total = self.hits + self.misses
+        return {
+            "cache_hits": self.hits,
+            "cache_misses": self.misses,
+            "cache_hit_rate": self.hits / total if total else 0.0,
+            "cache_size": len(self._entries)
+        }
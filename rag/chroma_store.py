@@ -0,0 +1,349 @@
+"""
+ChromaDB Vector Store
+=====================
+Хранилище базы знаний во встроенном ChromaDB (RAG_BACKEND=chroma).
+
+Используется PersistentClient — база лежит в директории индекса,
+отдельный сервер не нужен. Эмбеддинги считаются тем же офлайн
+HashingEmbedder, что и у dense-бэкенда, поэтому модель скачивать
+не нужно, а поиск ведёт HNSW-индекс ChromaDB (косинусное расстояние).
+
+HNSW — приближённый поиск, поэтому параметры графа по умолчанию выше,
+чем у ChromaDB: RAG_CHROMA_HNSW_M=32 и RAG_CHROMA_HNSW_EF=200 (ef при
+построении и поиске) вместо 16 и 100. На benchmarks.bench_backends это
+поднимает долю запросов с верным источником в top-3 с ~93% до ~99%
+ценой примерно вдвое большей задержки. Параметры применяются при
+создании коллекции.
+
+Индексация инкрементальная, как у VectorStoreManager: по общему манифесту
+(rag/manifest.py: mtime, размер, sha256) перечанкуются только изменённые файлы,
+их старые чанки удаляются из коллекции по метаданным source.
+Почти-дубликаты этот бэкенд не отсеивает.
+
+Требует пакета chromadb (см. requirements.txt).
+"""
+
+import os
+import time
+import asyncio
+import logging
+from typing import Optional
+
+from dotenv import load_dotenv
+
+from rag.cache import QueryCache
+from rag.dense import HashingEmbedder
+from rag.ingest import ingest_file
+from rag.manifest import chunking_params, load_manifest, record_ingest, save_manifest, scan_files
+from rag.vectorstore import ProgressCallback, elapsed_ms, empty_result
+
+load_dotenv()
+
+logger = logging.getLogger(__name__)
+
+# Имя коллекции ChromaDB внутри директории индекса
+CHROMA_COLLECTION = "chunks"
+
+
+class ChromaVectorStore:
+    """Хранилище документов во встроенном ChromaDB"""
+
+    def __init__(self, persist_dir: Optional[str] = None):
+        """
+        Args:
+            persist_dir: Директория индекса (по умолчанию CHROMA_PERSIST_DIR)
+        """
+        try:
+            import chromadb
+            from chromadb.config import Settings
+        except ImportError as e:
+            raise RuntimeError("Для RAG_BACKEND=chroma установите пакет chromadb") from e
+
+        self.persist_dir = persist_dir or os.getenv("CHROMA_PERSIST_DIR", "./chroma_db")
+        self.chunk_size = int(os.getenv("RAG_CHUNK_SIZE", "500"))
+        self.chunk_overlap = int(os.getenv("RAG_CHUNK_OVERLAP", "50"))
+        self.embedder = HashingEmbedder(dim=int(os.getenv("RAG_DENSE_DIM", "1024")))
+        self.hnsw_m = int(os.getenv("RAG_CHROMA_HNSW_M", "32"))
+        self.hnsw_ef = int(os.getenv("RAG_CHROMA_HNSW_EF", "200"))
+        self.cache = QueryCache(
+            max_size=int(os.getenv("RAG_CACHE_SIZE", "256")),
+            ttl_seconds=float(os.getenv("RAG_CACHE_TTL", "600"))
+        )
+        self.manifest_file = os.path.join(self.persist_dir, "manifest.json")
+
+        os.makedirs(self.persist_dir, exist_ok=True)
+        self._client = chromadb.PersistentClient(
+            path=self.persist_dir,
+            settings=Settings(anonymized_telemetry=False)
+        )
+        self._collection = self._open_collection()
+        self._generation = 0  # растёт при каждом изменении коллекции (инвалидирует кеш)
+        self._index_lock = asyncio.Lock()
+        self._sources = sum(1 for entry in self._load_manifest().values() if entry.get("chunks"))
+
+        logger.info(f"VectorStore инициализирован (chroma): {self.persist_dir}, {self._collection.count()} чанков")
+
+    def _open_collection(self):
+        """Открывает (или создаёт) коллекцию чанков"""
+        return self._client.get_or_create_collection(
+            name=CHROMA_COLLECTION,
+            metadata={
+                "hnsw:space": "cosine",
+                "hnsw:M": self.hnsw_m,
+                "hnsw:construction_ef": self.hnsw_ef,
+                "hnsw:search_ef": self.hnsw_ef,
+            },
+            embedding_function=None
+        )
+
+    @property
+    def is_indexing(self) -> bool:
+        """Идёт ли сейчас индексация"""
+        return self._index_lock.locked()
+
+    def _load_manifest(self) -> dict[str, dict]:
+        """
+        Загружает манифест проиндексированных файлов (см. rag/manifest.py).
+
+        Манифест валиден, только если параметры чанкинга и эмбеддер
+        не менялись, а число чанков совпадает с коллекцией.
+
+        Returns:
+            Словарь {имя файла: {"mtime", "size", "sha256", "chunks"}}
+            (пустой — полная переиндексация)
+        """
+        return load_manifest(self.manifest_file, self._index_params(), self._collection.count())
+
+    def _save_manifest(self, files: dict[str, dict]):
+        """Сохраняет манифест проиндексированных файлов"""
+        save_manifest(self.manifest_file, self._index_params(), files)
+
+    def _index_params(self) -> dict:
+        """Параметры, при смене которых коллекция собирается заново"""
+        return {**chunking_params(self.chunk_size, self.chunk_overlap), "embedder": self.embedder.name}
+
+    async def index_documents(
+        self,
+        data_dir: str,
+        progress: Optional[ProgressCallback] = None
+    ) -> dict:
+        """
+        Инкрементально индексирует документы из указанной директории.
+
+        Чтение, чанкинг и запись в ChromaDB выполняются в отдельном потоке.
+
+        Args:
+            data_dir: Путь к директории с документами
+            progress: Колбэк прогресса (обработано файлов, всего файлов)
+
+        Returns:
+            Статистика индексации
+        """
+        async with self._index_lock:
+            return await self._index_documents(data_dir, progress)
+
+    async def _index_documents(
+        self,
+        data_dir: str,
+        progress: Optional[ProgressCallback]
+    ) -> dict:
+        """Индексация под блокировкой (см. index_documents)"""
+        stats = {
+            "files": 0, "chunks": 0,
+            "added": 0, "updated": 0, "removed": 0, "skipped": 0,
+            "restored": 0,  # дубликаты этот бэкенд не отсеивает — всегда 0
+            "duplicates": [],
+            "total_chunks": self._collection.count()
+        }
+
+        if not os.path.exists(data_dir):
+            os.makedirs(data_dir)
+            logger.info(f"Создана директория {data_dir}")
+            return stats
+
+        old_files = await asyncio.to_thread(self._load_manifest)
+        if not old_files and stats["total_chunks"]:
+            # Чанки без валидного манифеста не сопоставить с файлами — начинаем заново
+            await asyncio.to_thread(self._reset_collection)
+
+        # Быстрая проверка по mtime/размеру без чтения файлов
+        new_files, to_ingest, stats["skipped"] = scan_files(data_dir, old_files)
+
+        changed: dict[str, list[str]] = {}  # имя файла → чанки
+        for done, filename in enumerate(to_ingest, 1):
+            entry = old_files.get(filename)
+            try:
+                result = await asyncio.to_thread(
+                    ingest_file,
+                    os.path.join(data_dir, filename),
+                    entry["sha256"] if entry else None,
+                    self.chunk_size,
+                    self.chunk_overlap
+                )
+            except Exception as e:
+                logger.error(f"Ошибка индексации файла {filename}: {e}")
+                result = None
+
+            if record_ingest(filename, result, old_files, new_files, changed):
+                stats["skipped"] += 1
+            elif filename in changed:
+                if filename in old_files:
+                    stats["updated"] += 1
+                else:
+                    stats["added"] += 1
+                if result["chunks"]:
+                    stats["files"] += 1
+                    stats["chunks"] += len(result["chunks"])
+
+            if progress:
+                try:
+                    await progress(done, len(to_ingest))
+                except Exception as e:
+                    logger.warning(f"Ошибка колбэка прогресса: {e}")
+
+        stale_sources = (set(old_files) - set(new_files)) | (set(changed) & set(old_files))
+        stats["removed"] = len(set(old_files) - set(new_files))
+
+        if stale_sources or changed:
+            await asyncio.to_thread(self._apply_changes, stale_sources, changed)
+            self._generation += 1
+
+        if new_files != old_files:
+            await asyncio.to_thread(self._save_manifest, new_files)
+        self._sources = sum(1 for entry in new_files.values() if entry.get("chunks"))
+
+        stats["total_chunks"] = self._collection.count()
+
+        logger.info(
+            f"Индексация (chroma): +{stats['added']} ~{stats['updated']} "
+            f"-{stats['removed']} ={stats['skipped']}"
+        )
+        return stats
+
+    def _apply_changes(self, stale_sources: set[str], changed: dict[str, list[str]]):
+        """Удаляет чанки устаревших файлов и добавляет чанки изменённых"""
+        for source in sorted(stale_sources):
+            self._collection.delete(where={"source": source})
+
+        ids, texts, metadatas = [], [], []
+        for filename, chunks in changed.items():
+            for i, chunk in enumerate(chunks):
+                ids.append(f"{filename}_{i}")
+                texts.append(chunk)
+                metadatas.append({"source": filename})
+
+        batch_size = self._client.get_max_batch_size()
+        for start in range(0, len(ids), batch_size):
+            end = start + batch_size
+            self._collection.add(
+                ids=ids[start:end],
+                documents=texts[start:end],
+                metadatas=metadatas[start:end],
+                embeddings=self.embedder.embed(texts[start:end])
+            )
+
+    def _reset_collection(self):
+        """Пересоздаёт пустую коллекцию"""
+        self._client.delete_collection(CHROMA_COLLECTION)
+        self._collection = self._open_collection()
+        self._generation += 1
+
+    def search(self, query: str, n_results: int = 3) -> dict:
+        """
+        Поиск релевантных документов.
+
+        Args:
+            query: Поисковый запрос
+            n_results: Количество результатов
+
+        Returns:
+            Результаты поиска в формате ChromaDB и "timings" (dense или cache, мс)
+        """
+        return self.search_many([query], n_results)[0]
+
+    def search_many(self, queries: list[str], n_results: int = 3) -> list[dict]:
+        """
+        Пакетный поиск: все запросы, которых нет в кеше, уходят
+        в ChromaDB одним вызовом query.
+
+        Args:
+            queries: Поисковые запросы
+            n_results: Количество результатов на запрос
+
+        Returns:
+            Результаты в формате search для каждого запроса (в том же порядке)
+        """
+        generation = self._generation
+        results: list[Optional[dict]] = [None] * len(queries)
+        pending: dict[tuple, list[int]] = {}  # ключ кеша → позиции запроса в пакете
+
+        started = time.perf_counter()
+        count = self._collection.count()
+        for i, query in enumerate(queries):
+            text = " ".join(query.lower().split())
+            if not count or not text:
+                results[i] = empty_result()
+                continue
+            key = (text, n_results)
+            cached = self.cache.get(key, generation)
+            if cached is not None:
+                results[i] = {**cached, "timings": {"cache": elapsed_ms(started)}}
+            else:
+                pending.setdefault(key, []).append(i)
+
+        if pending:
+            started = time.perf_counter()
+            response = self._collection.query(
+                query_embeddings=self.embedder.embed(text for text, _ in pending),
+                n_results=min(n_results, count),
+                include=["documents", "metadatas", "distances"]
+            )
+            timings = {"dense": elapsed_ms(started)}
+
+            for row, (key, positions) in enumerate(pending.items()):
+                result = {
+                    "documents": [response["documents"][row]],
+                    "metadatas": [response["metadatas"][row]],
+                    "distances": [response["distances"][row]],
+                }
+                self.cache.put(key, generation, result)
+                for i in positions:
+                    results[i] = {**result, "timings": timings}
+
+        return results
+
+    def get_stats(self) -> dict:
+        """
+        Возвращает статистику базы знаний.
+
+        Returns:
+            Словарь со статистикой
+        """
+        return {
+            "total_chunks": self._collection.count(),
+            "sources": self._sources,
+            "generation": self._generation,
+            **self.cache.get_stats()
+        }
+
+    def close(self):
+        """Закрывает клиент ChromaDB (хранилище после этого не используется)"""
+        self._client.close()
+
+    def clear(self) -> bool:
+        """
+        Очищает хранилище.
+
+        Returns:
+            True если успешно
+        """
+        try:
+            self._reset_collection()
+            self._sources = 0
+            if os.path.exists(self.manifest_file):
+                os.remove(self.manifest_file)
+            logger.info("Хранилище очищено")
+            return True
+        except Exception as e:
+            logger.error(f"Ошибка очистки: {e}")
+            return False
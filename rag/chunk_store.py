@@ -0,0 +1,122 @@
+"""
+Chunk Store
+===========
+Компактное изменяемое хранилище чанков в памяти.
+
+Та же колоночная схема, что у ChunkTable поверх mmap: тексты всех чанков —
+один UTF-8 bytearray со смещениями, источник и порядковый номер — массивы
+uint32, а имена файлов-источников хранятся один раз в таблице. Вместо
+словаря и трёх строк на чанк — несколько байт служебных данных.
+"""
+
+from array import array
+from typing import Iterable
+
+from rag.index_storage import ChunkTable, _parse_id
+
+
+class ChunkStore(ChunkTable):
+    """
+    Изменяемая таблица чанков в памяти.
+
+    Читается так же, как ChunkTable (list-подобно, элементы — dict с ключами
+    "id", "content", "source"); чанки добавляются в конец и удаляются пачкой.
+    """
+
+    def __init__(self):
+        super().__init__(
+            text=bytearray(),
+            offsets=array("Q", [0]),
+            doc_sources=array("I"),
+            doc_ordinals=array("I"),
+            sources=[]
+        )
+        self._source_ids: dict[str, int] = {}
+
+    @classmethod
+    def copy_of(cls, documents: ChunkTable | Iterable[dict]) -> "ChunkStore":
+        """
+        Независимая копия набора чанков.
+
+        Args:
+            documents: ChunkTable/ChunkStore (копируются буферы целиком)
+                       или последовательность словарей чанков
+
+        Returns:
+            Новое хранилище
+        """
+        store = cls()
+        if isinstance(documents, ChunkTable):
+            store._text = bytearray(documents._text)
+            store._offsets = array("Q", bytes(documents._offsets))
+            store._doc_sources = array("I", bytes(documents._doc_sources))
+            store._doc_ordinals = array("I", bytes(documents._doc_ordinals))
+            store.sources = list(documents.sources)
+            store._source_ids = {source: i for i, source in enumerate(store.sources)}
+        else:
+            for doc in documents:
+                store.append(doc["source"], _parse_id(doc), doc["content"])
+        return store
+
+    def append(self, source: str, ordinal: int, content: str) -> int:
+        """
+        Добавляет чанк в конец.
+
+        Args:
+            source: Имя файла-источника
+            ordinal: Порядковый номер чанка внутри источника
+            content: Текст чанка
+
+        Returns:
+            doc_id добавленного чанка
+        """
+        source_id = self._source_ids.get(source)
+        if source_id is None:
+            source_id = self._source_ids[source] = len(self.sources)
+            self.sources.append(source)
+
+        doc_id = len(self._doc_sources)
+        self._text += content.encode("utf-8")
+        self._offsets.append(len(self._text))
+        self._doc_sources.append(source_id)
+        self._doc_ordinals.append(ordinal)
+        return doc_id
+
+    def remove(self, doc_ids: set[int]):
+        """
+        Удаляет чанки, сохраняя порядок остальных (как InvertedIndex.remove_documents).
+
+        Args:
+            doc_ids: doc_id удаляемых чанков
+        """
+        if not doc_ids:
+            return
+
+        text = bytearray()
+        offsets = array("Q", [0])
+        doc_sources = array("I")
+        doc_ordinals = array("I")
+
+        # Копируем непрерывные диапазоны оставшихся чанков целиком
+        start = 0
+        for stop in sorted(doc_ids) + [len(self)]:
+            if start < stop:
+                shift = len(text) - self._offsets[start]
+                text += self._text[self._offsets[start]:self._offsets[stop]]
+                offsets.extend(offset + shift for offset in self._offsets[start + 1:stop + 1])
+                doc_sources.extend(self._doc_sources[start:stop])
+                doc_ordinals.extend(self._doc_ordinals[start:stop])
+            start = stop + 1
+
+        # Источники без чанков убираем из таблицы
+        used = sorted(set(doc_sources))
+        if len(used) != len(self.sources):
+            new_ids = {old: new for new, old in enumerate(used)}
+            doc_sources = array("I", (new_ids[source_id] for source_id in doc_sources))
+            self.sources = [self.sources[old] for old in used]
+            self._source_ids = {source: i for i, source in enumerate(self.sources)}
+
+        self._text = text
+        self._offsets = offsets
+        self._doc_sources = doc_sources
+        self._doc_ordinals = doc_ordinals
@@ -0,0 +1,245 @@
+"""
+Chunker
+=======
+Разбиение текста документов на чанки.
+
+Чанкер потоковый: строки читаются из файла по одной, абзацы режутся
+на предложения, а чанки собираются из них ленивым генератором со
+скользящим перекрытием. Текст файла целиком не загружается: чанкер
+держит только текущий абзац (или его хвост) и окно одного чанка.
+Готовые чанки вызывающий код собирает в список (см. rag/ingest.py),
+так что память индексации файла всё равно растёт с его размером.
+
+Функции модульного уровня, чтобы их можно было вызывать
+в процессах-воркерах при параллельной индексации.
+"""
+
+import re
+from typing import Iterable, Iterator
+
+# Версия алгоритма; сохраняется в манифесте, чтобы индекс перестраивался при её смене
+CHUNKER_NAME = "stream-v1"
+
+PARAGRAPH_SEP = "\n\n"
+SENTENCE_SEP = " "
+
+# Граница предложения: пробельные символы после . ! ? или …
+SENTENCE_RE = re.compile(r"(?<=[.!?…])\s+")
+
+# Абзац длиннее chunk_size * STREAM_FLUSH_FACTOR режется на предложения,
+# не дожидаясь его конца
+STREAM_FLUSH_FACTOR = 4
+
+# Максимальная длина строки, читаемой из файла за раз; более длинные
+# строки читаются частями, разрезанными по пробелам
+MAX_LINE_LENGTH = 1 << 20
+
+# Единица текста: (разделитель перед ней, текст)
+Unit = tuple[str, str]
+
+
+def _split_long(text: str, chunk_size: int) -> list[str]:
+    """Режет текст длиннее chunk_size на куски, по возможности по пробелам"""
+    pieces = []
+    while len(text) > chunk_size:
+        cut = text.rfind(" ", 0, chunk_size + 1)
+        if cut <= 0:
+            cut = chunk_size
+        pieces.append(text[:cut].rstrip())
+        text = text[cut:].lstrip()
+    if text:
+        pieces.append(text)
+    return pieces
+
+
+def _sentence_units(text: str, chunk_size: int, sep: str) -> Iterator[Unit]:
+    """Предложения текста (длинные — порезанные) как единицы чанкинга"""
+    for sentence in SENTENCE_RE.split(text):
+        for piece in _split_long(sentence, chunk_size):
+            yield sep, piece
+            sep = SENTENCE_SEP
+
+
+def iter_units(lines: Iterable[str], chunk_size: int) -> Iterator[Unit]:
+    """
+    Превращает поток строк в поток единиц чанкинга.
+
+    Абзацы (разделённые пустыми строками), которые помещаются в чанк,
+    остаются целыми; более длинные режутся на предложения.
+
+    Args:
+        lines: Строки документа
+        chunk_size: Максимальный размер чанка в символах
+
+    Yields:
+        Кортежи (разделитель перед единицей, текст единицы)
+    """
+    buffer: list[str] = []
+    size = 0
+    started = False  # часть текущего абзаца уже выдана
+
+    for line in lines:
+        line = line.strip()
+        if line:
+            buffer.append(line)
+            size += len(line) + 1
+            if size > STREAM_FLUSH_FACTOR * chunk_size:
+                # Очень длинный абзац: выдаём готовые предложения, хвост оставляем
+                *sentences, tail = SENTENCE_RE.split("\n".join(buffer))
+                tail_pieces = _split_long(tail, chunk_size)
+                pieces = [piece for sentence in sentences for piece in _split_long(sentence, chunk_size)]
+                for piece in pieces + tail_pieces[:-1]:
+                    yield (SENTENCE_SEP if started else PARAGRAPH_SEP), piece
+                    started = True
+                buffer = tail_pieces[-1:]
+                size = sum(len(piece) for piece in buffer)
+            continue
+
+        if buffer:
+            yield from _paragraph_units("\n".join(buffer), chunk_size, started)
+        buffer, size, started = [], 0, False
+
+    if buffer:
+        yield from _paragraph_units("\n".join(buffer), chunk_size, started)
+
+
+def _paragraph_units(paragraph: str, chunk_size: int, started: bool) -> Iterator[Unit]:
+    """Единицы для (остатка) абзаца"""
+    sep = SENTENCE_SEP if started else PARAGRAPH_SEP
+    if not started and len(paragraph) <= chunk_size:
+        yield sep, paragraph
+    else:
+        yield from _sentence_units(paragraph, chunk_size, sep)
+
+
+def _joined_length(window: list[Unit]) -> int:
+    """Длина окна, склеенного с разделителями"""
+    return sum(len(text) for _, text in window) + sum(len(sep) for sep, _ in window[1:])
+
+
+def _join(window: list[Unit]) -> str:
+    """Склеивает окно в текст чанка"""
+    return window[0][1] + "".join(sep + text for sep, text in window[1:])
+
+
+def _overlap_tail(window: list[Unit], overlap: int) -> list[Unit]:
+    """
+    Хвост окна длиной не больше overlap для начала следующего чанка.
+
+    Берутся целые последние предложения/абзацы; если не помещается
+    ни одно, — последние overlap символов с границы слова.
+    """
+    if overlap <= 0 or not window:
+        return []
+
+    tail: list[Unit] = []
+    length = 0
+    for sep, text in reversed(window):
+        added = len(text) + (len(tail[0][0]) if tail else 0)
+        if length + added > overlap:
+            break
+        tail.insert(0, (sep, text))
+        length += added
+
+    if not tail:
+        sep, text = window[-1]
+        text = text[-overlap:]
+        space = text.find(" ")
+        if 0 <= space < len(text) - 1:
+            text = text[space + 1:]
+        tail = [(sep, text)]
+    return tail
+
+
+def iter_chunks(units: Iterable[Unit], chunk_size: int, chunk_overlap: int = 0) -> Iterator[str]:
+    """
+    Собирает чанки из единиц со скользящим перекрытием.
+
+    Args:
+        units: Поток единиц (см. iter_units)
+        chunk_size: Максимальный размер чанка в символах
+        chunk_overlap: Сколько символов конца чанка повторить в начале следующего
+                       (не больше половины chunk_size)
+
+    Yields:
+        Тексты чанков
+    """
+    overlap = max(0, min(chunk_overlap, chunk_size // 2))
+    window: list[Unit] = []
+    fresh = False  # в окне есть единицы, ещё не попавшие ни в один чанк
+
+    for sep, text in units:
+        if window and _joined_length(window) + len(sep) + len(text) > chunk_size:
+            if fresh:
+                yield _join(window)
+            window = _overlap_tail(window, overlap)
+            fresh = False
+            # Перекрытие не должно вытеснять новую единицу из чанка
+            while window and _joined_length(window) + len(sep) + len(text) > chunk_size:
+                window.pop(0)
+        window.append((sep, text))
+        fresh = True
+
+    if fresh:
+        yield _join(window)
+
+
+def split_text(text: str, chunk_size: int, chunk_overlap: int = 0) -> list[str]:
+    """
+    Разбивает текст на чанки.
+
+    Args:
+        text: Исходный текст
+        chunk_size: Максимальный размер чанка в символах
+        chunk_overlap: Перекрытие соседних чанков в символах
+
+    Returns:
+        Список чанков
+    """
+    return list(iter_chunks(iter_units(text.splitlines(), chunk_size), chunk_size, chunk_overlap))
+
+
+def _read_lines(f, max_length: int = MAX_LINE_LENGTH) -> Iterator[str]:
+    """
+    Строки файла, прочитанные кусками не длиннее max_length.
+
+    Если строка не уместилась в один кусок, незаконченное слово
+    в его конце переносится в следующий, чтобы не разрезать его.
+    Слово длиннее max_length режется принудительно.
+    """
+    carry = ""
+    for part in iter(lambda: f.readline(max_length), ""):
+        part = carry + part
+        carry = ""
+        if not part.endswith("\n"):
+            cut = max(part.rfind(" "), part.rfind("\t")) + 1
+            if cut == 0 and len(part) < 2 * max_length:
+                carry = part
+                continue
+            if 0 < cut < len(part):
+                part, carry = part[:cut], part[cut:]
+        yield part
+    if carry:
+        yield carry
+
+
+def iter_file_chunks(
+    filepath: str,
+    chunk_size: int,
+    chunk_overlap: int = 0,
+    encoding: str = "utf-8"
+) -> Iterator[str]:
+    """
+    Лениво читает файл и выдаёт его чанки.
+
+    Args:
+        filepath: Путь к файлу
+        chunk_size: Максимальный размер чанка в символах
+        chunk_overlap: Перекрытие соседних чанков в символах
+        encoding: Кодировка файла
+
+    Yields:
+        Тексты чанков
+    """
+    with open(filepath, "r", encoding=encoding) as f:
+        yield from iter_chunks(iter_units(_read_lines(f), chunk_size), chunk_size, chunk_overlap)
@@ -0,0 +1,418 @@
+"""
+Collection Manager
+==================
+Несколько именованных баз знаний (коллекций) с ленивой загрузкой.
+
+Каждая коллекция — отдельное хранилище (реализация по RAG_BACKEND,
+см. rag/backend.py) в своей поддиректории CHROMA_PERSIST_DIR. Документы коллекции лежат
+в одноимённой поддиректории DATA_DIR, файлы в корне DATA_DIR относятся
+к коллекции по умолчанию (CHROMA_COLLECTION_NAME):
+
+    data/common_mistakes.md      → chroma_db/brief_refiner_docs/
+    data/ecommerce/payments.md   → chroma_db/ecommerce/
+    data/bots/webhooks.md        → chroma_db/bots/
+
+Коллекция открывается при первом обращении и выгружается, если к ней
+не обращались RAG_COLLECTION_IDLE_TTL секунд. Поиск маршрутизируется
+по типу проекта из брифа (RAG_COLLECTION_ROUTES); если подходящей
+коллекции нет или она пуста, используется коллекция по умолчанию.
+Поиск в профильной коллекции идёт вместе с коллекцией по умолчанию,
+выдачи сливаются по расстоянию — общие документы остаются доступны.
+Список непустых коллекций для маршрутизации кешируется и обновляется
+после индексации (в том числе из KnowledgeBaseWatcher) и очистки.
+
+Интерфейс совпадает с VectorStoreBackend (search, search_many,
+get_stats, index_documents, clear) плюс необязательный аргумент collection.
+"""
+
+import os
+import re
+import json
+import time
+import asyncio
+import shutil
+import logging
+import threading
+from typing import Optional
+
+from dotenv import load_dotenv
+
+from rag.backend import VectorStoreBackend, create_store
+from rag.vectorstore import ProgressCallback
+
+load_dotenv()
+
+logger = logging.getLogger(__name__)
+
+# Допустимое имя коллекции (= имя поддиректории)
+COLLECTION_NAME_RE = re.compile(r"[a-z0-9_-]+")
+
+# Тип проекта из брифа → коллекция
+DEFAULT_ROUTES = {
+    "интернет-магазин": "ecommerce",
+    "telegram-бот": "bots",
+    "мобильное приложение": "mobile",
+}
+
+# Файлы индекса, которые до появления коллекций лежали прямо в CHROMA_PERSIST_DIR
+LEGACY_FILES = ("index.bin", "index.json", "manifest.json", "embeddings.npy", "ivf.npz", "dedup.npy")
+
+
+def parse_routes(value: str) -> dict[str, str]:
+    """
+    Разбирает маршруты вида "Интернет-магазин:ecommerce,Telegram-бот:bots".
+
+    Returns:
+        Словарь {тип проекта в нижнем регистре: коллекция}
+    """
+    routes = {}
+    for item in value.split(","):
+        project_type, _, collection = item.rpartition(":")
+        if project_type.strip() and collection.strip():
+            routes[project_type.strip().lower()] = collection.strip().lower()
+    return routes
+
+
+def merge_results(results: list[dict], n_results: int) -> dict:
+    """
+    Сливает выдачи нескольких коллекций на один запрос (формат ChromaDB).
+
+    Коллекции обслуживает один бэкенд, поэтому шкала "distances" у них
+    общая (у BM25 — доля от наибольшего скора, достижимого в коллекции),
+    и чанки можно упорядочить по расстоянию без перенормировки.
+
+    Args:
+        results: Результаты search по коллекциям
+        n_results: Сколько чанков оставить
+
+    Returns:
+        Результат в формате search; "timings" — суммы по стадиям
+    """
+    hits = sorted(
+        (
+            hit
+            for result in results
+            for hit in zip(result["distances"][0], result["documents"][0], result["metadatas"][0])
+        ),
+        key=lambda hit: hit[0]
+    )[:n_results]
+
+    timings: dict[str, float] = {}
+    for result in results:
+        for stage, ms in result.get("timings", {}).items():
+            timings[stage] = timings.get(stage, 0.0) + ms
+
+    return {
+        "documents": [[document for _, document, _ in hits]],
+        "metadatas": [[metadata for _, _, metadata in hits]],
+        "distances": [[distance for distance, _, _ in hits]],
+        "timings": timings,
+    }
+
+
+class CollectionManager:
+    """Набор именованных коллекций с ленивой загрузкой и выгрузкой по простою"""
+
+    def __init__(self, persist_dir: Optional[str] = None):
+        """
+        Args:
+            persist_dir: Корневая директория индексов (по умолчанию CHROMA_PERSIST_DIR)
+        """
+        self.persist_dir = persist_dir or os.getenv("CHROMA_PERSIST_DIR", "./chroma_db")
+        self.default = os.getenv("CHROMA_COLLECTION_NAME", "brief_refiner_docs").lower()
+        self.idle_ttl = float(os.getenv("RAG_COLLECTION_IDLE_TTL", "1800"))  # 0 — не выгружать
+        routes = os.getenv("RAG_COLLECTION_ROUTES", "")
+        self.routes = parse_routes(routes) if routes else dict(DEFAULT_ROUTES)
+
+        if not COLLECTION_NAME_RE.fullmatch(self.default):
+            raise ValueError(f"Недопустимое имя коллекции: {self.default}")
+
+        self._stores: dict[str, VectorStoreBackend] = {}
+        self._last_used: dict[str, float] = {}
+        # Блокировки загрузки по коллекциям: открытие хранилища (mmap, пересчёт
+        # эмбеддингов) идёт вне self._lock и не задерживает другие коллекции
+        self._loading: dict[str, threading.Lock] = {}
+        # Число чанков по коллекциям для route(); None — пересчитать
+        self._chunk_counts: Optional[dict[str, int]] = None
+        self._lock = threading.Lock()
+
+        os.makedirs(self.persist_dir, exist_ok=True)
+        self._migrate_legacy()
+
+        logger.info(f"Коллекции: {', '.join(self.names()) or 'нет'} (по умолчанию {self.default})")
+
+    def _migrate_legacy(self):
+        """Переносит индекс из корня CHROMA_PERSIST_DIR в коллекцию по умолчанию"""
+        legacy = [name for name in LEGACY_FILES if os.path.exists(os.path.join(self.persist_dir, name))]
+        if not legacy:
+            return
+
+        target = self._collection_dir(self.default)
+        os.makedirs(target, exist_ok=True)
+        for name in legacy:
+            os.replace(os.path.join(self.persist_dir, name), os.path.join(target, name))
+        logger.info(f"Индекс перенесён в коллекцию {self.default}")
+
+    def _collection_dir(self, name: str) -> str:
+        """Директория индекса коллекции"""
+        return os.path.join(self.persist_dir, name)
+
+    def names(self) -> list[str]:
+        """Имена коллекций, у которых есть индекс на диске или в памяти"""
+        names = set(self._stores)
+        for entry in os.scandir(self.persist_dir):
+            if entry.is_dir() and COLLECTION_NAME_RE.fullmatch(entry.name):
+                names.add(entry.name)
+        return sorted(names)
+
+    def get(self, name: Optional[str] = None) -> VectorStoreBackend:
+        """
+        Возвращает коллекцию, открывая её при первом обращении.
+
+        Открытие может быть долгим (загрузка и проверка индекса), поэтому
+        из event loop вызывать через asyncio.to_thread.
+
+        Args:
+            name: Имя коллекции (None — коллекция по умолчанию)
+
+        Returns:
+            Хранилище коллекции
+        """
+        name = (name or self.default).lower()
+        if not COLLECTION_NAME_RE.fullmatch(name):
+            raise ValueError(f"Недопустимое имя коллекции: {name}")
+
+        with self._lock:
+            store = self._touch(name)
+            if store is not None:
+                return store
+            loading = self._loading.setdefault(name, threading.Lock())
+
+        with loading:
+            # Пока ждали, коллекцию мог открыть другой поток
+            with self._lock:
+                store = self._touch(name)
+            if store is not None:
+                return store
+
+            store = create_store(self._collection_dir(name))
+            logger.info(f"Коллекция {name} загружена ({store.get_stats()['total_chunks']} чанков)")
+            with self._lock:
+                self._stores[name] = store
+                self._last_used[name] = time.monotonic()
+            return store
+
+    def _touch(self, name: str) -> Optional[VectorStoreBackend]:
+        """Выгружает простаивающие коллекции и отмечает обращение к name (под self._lock)"""
+        now = time.monotonic()
+        self._evict_idle(now, keep=name)
+        store = self._stores.get(name)
+        if store is not None:
+            self._last_used[name] = now
+        return store
+
+    def _evict_idle(self, now: float, keep: str):
+        """Выгружает коллекции, к которым не обращались дольше idle_ttl (под self._lock)"""
+        if not self.idle_ttl:
+            return
+        for name, last_used in list(self._last_used.items()):
+            store = self._stores[name]
+            # Коллекцию, которая сейчас индексируется, не трогаем
+            if name == keep or now - last_used < self.idle_ttl or store.is_indexing:
+                continue
+            del self._stores[name]
+            del self._last_used[name]
+            store.close()
+            logger.info(f"Коллекция {name} выгружена после простоя")
+
+    def route(self, project_type: Optional[str]) -> str:
+        """
+        Коллекция для типа проекта из брифа.
+
+        Args:
+            project_type: BriefData.project_type
+
+        Returns:
+            Имя коллекции; коллекция по умолчанию, если подходящей нет или она пуста
+        """
+        name = self.routes.get((project_type or "").strip().lower())
+        with self._lock:
+            if self._chunk_counts is None:
+                self._chunk_counts = {known: self._counts(known)[0] for known in self.names()}
+            if name and self._chunk_counts.get(name):
+                return name
+        return self.default
+
+    def refresh(self):
+        """Сбрасывает кеш коллекций для route() (после индексации или удаления)"""
+        with self._lock:
+            self._chunk_counts = None
+
+    def _counts(self, name: str) -> tuple[int, int]:
+        """
+        Число чанков и источников коллекции.
+
+        Для невыгруженной коллекции считается по манифесту, без загрузки индекса.
+        """
+        store = self._stores.get(name)
+        if store is not None:
+            stats = store.get_stats()
+            return stats["total_chunks"], stats["sources"]
+        try:
+            with open(os.path.join(self._collection_dir(name), "manifest.json"), "r", encoding="utf-8") as f:
+                files = json.load(f).get("files", {})
+        except (OSError, ValueError):
+            return 0, 0
+        chunks = [entry.get("chunks", 0) for entry in files.values()]
+        return sum(chunks), sum(1 for n in chunks if n)
+
+    def search(self, query: str, n_results: int = 3, collection: Optional[str] = None) -> dict:
+        """Поиск в коллекции (см. VectorStoreBackend.search), в профильной — вместе с коллекцией по умолчанию"""
+        results = self.get(collection).search(query, n_results)
+        if not self._is_vertical(collection):
+            return results
+        return merge_results([results, self.get(self.default).search(query, n_results)], n_results)
+
+    def search_many(
+        self,
+        queries: list[str],
+        n_results: int = 3,
+        collection: Optional[str] = None
+    ) -> list[dict]:
+        """Пакетный поиск в коллекции (см. VectorStoreBackend.search_many), в профильной — вместе с коллекцией по умолчанию"""
+        results = self.get(collection).search_many(queries, n_results)
+        if not self._is_vertical(collection):
+            return results
+        general = self.get(self.default).search_many(queries, n_results)
+        return [merge_results(pair, n_results) for pair in zip(results, general)]
+
+    def _is_vertical(self, collection: Optional[str]) -> bool:
+        """Задана профильная коллекция, а не коллекция по умолчанию"""
+        return bool(collection) and collection.lower() != self.default
+
+    async def index_documents(
+        self,
+        data_dir: str,
+        progress: Optional[ProgressCallback] = None
+    ) -> dict:
+        """
+        Инкрементально индексирует все коллекции.
+
+        Файлы в корне data_dir индексируются в коллекцию по умолчанию,
+        поддиректории — в одноимённые коллекции. Коллекции, чьих
+        поддиректорий больше нет, удаляются; если нет самой data_dir
+        (например, не смонтирован том), ничего не удаляется.
+
+        Args:
+            data_dir: Путь к директории с документами
+            progress: Колбэк прогресса (для каждой коллекции по очереди)
+
+        Returns:
+            Суммарная статистика индексации и "collections" — по коллекциям
+        """
+        data_dir_exists = os.path.isdir(data_dir)
+        present: set[str] = set()  # имена всех поддиректорий (в нижнем регистре)
+        subdirs = []
+        if data_dir_exists:
+            for entry in sorted(os.scandir(data_dir), key=lambda entry: entry.name):
+                if not entry.is_dir():
+                    continue
+                present.add(entry.name.lower())
+                if not COLLECTION_NAME_RE.fullmatch(entry.name):
+                    logger.warning(f"Директория {entry.name} пропущена: недопустимое имя коллекции")
+                elif entry.name != self.default:
+                    subdirs.append(entry.name)
+        else:
+            logger.warning(f"Директория {data_dir} не найдена — коллекции не удаляются")
+
+        targets = {self.default: data_dir, **{name: os.path.join(data_dir, name) for name in subdirs}}
+        per_collection = {}
+        for name, directory in targets.items():
+            store = await asyncio.to_thread(self.get, name)
+            per_collection[name] = await store.index_documents(directory, progress)
+
+        if data_dir_exists:
+            for name in set(self.names()) - set(per_collection) - present:
+                await asyncio.to_thread(self._drop, name)
+        self.refresh()
+
+        totals = {key: 0 for key in ("files", "chunks", "added", "updated", "removed", "skipped", "restored", "total_chunks")}
+        duplicates = []
+        for name, stats in per_collection.items():
+            for key in totals:
+                totals[key] += stats[key]
+            duplicates.extend({**duplicate, "collection": name} for duplicate in stats["duplicates"])
+
+        return {**totals, "duplicates": duplicates, "collections": per_collection}
+
+    def _drop(self, name: str):
+        """Удаляет коллекцию, документов которой больше нет"""
+        with self._lock:
+            store = self._stores.pop(name, None)
+            self._last_used.pop(name, None)
+        if store is not None:
+            store.close()
+        shutil.rmtree(self._collection_dir(name), ignore_errors=True)
+        logger.info(f"Коллекция {name} удалена: её директории с документами больше нет")
+
+    def get_stats(self, collection: Optional[str] = None) -> dict:
+        """
+        Статистика коллекции или всех коллекций.
+
+        Невыгруженные коллекции при подсчёте общей статистики не загружаются:
+        число чанков берётся из их манифестов.
+
+        Args:
+            collection: Имя коллекции (None — сумма по всем)
+
+        Returns:
+            Словарь со статистикой (для суммы — также "collections": {имя: чанков})
+        """
+        if collection is not None:
+            return self.get(collection).get_stats()
+
+        with self._lock:
+            loaded = dict(self._stores)
+
+        counts = {name: self._counts(name) for name in self.names()}
+        stats = {
+            "total_chunks": sum(chunks for chunks, _ in counts.values()),
+            "sources": sum(sources for _, sources in counts.values()),
+            "generation": 0,
+            "cache_hits": 0,
+            "cache_misses": 0,
+            "cache_size": 0,
+            "collections": {name: chunks for name, (chunks, _) in counts.items()},
+            "loaded_collections": sorted(loaded),
+        }
+        for store in loaded.values():
+            store_stats = store.get_stats()
+            for key in ("generation", "cache_hits", "cache_misses", "cache_size"):
+                stats[key] += store_stats[key]
+
+        lookups = stats["cache_hits"] + stats["cache_misses"]
+        stats["cache_hit_rate"] = stats["cache_hits"] / lookups if lookups else 0.0
+        return stats
+
+    def clear(self) -> bool:
+        """
+        Очищает все коллекции.
+
+        Returns:
+            True если успешно
+        """
+        cleared = all([self.get(name).clear() for name in self.names() or [self.default]])
+        self.refresh()
+        return cleared
+
+    def close(self):
+        """Закрывает все открытые коллекции (менеджер после этого не используется)"""
+        with self._lock:
+            stores = list(self._stores.items())
+            self._stores.clear()
+            self._last_used.clear()
+        for name, store in stores:
+            try:
+                store.close()
+            except Exception as e:
+                logger.error(f"Ошибка закрытия коллекции {name}: {e}")
@@ -0,0 +1,254 @@
+"""
+Near-Duplicate Detection
+========================
+Поиск почти-дубликатов чанков при индексации (MinHash + LSH).
+
+Чанк представляется множеством шинглов — хешей n-грамм слов. MinHash-подпись
+из NUM_PERM минимумов хешей сохраняет сходство Жаккара, а LSH режет её
+на BANDS полос: чанки, у которых совпала хотя бы одна полоса, становятся
+кандидатами. Для кандидатов сходство Жаккара шинглов считается точно,
+поэтому порог применяется без ошибок оценки. Всё, кроме хеширования слов,
+считается векторно (NumPy).
+
+На диске хранятся только ключи полос (BANDS × uint32 на чанк, строки
+совпадают с doc_id) — шинглы кандидатов восстанавливаются из текста чанка.
+"""
+
+import os
+import zlib
+import logging
+from typing import Callable, Iterable, Optional
+
+import numpy as np
+
+from rag.tokenizer import WORD_RE
+
+logger = logging.getLogger(__name__)
+
+NUM_PERM = 64
+BANDS = 16  # по NUM_PERM // BANDS строк в полосе; кандидат с вероятностью ≥ 0.99 при J ≥ 0.7
+SHINGLE_SIZE = 3
+
+_SHIFT_32 = np.uint64(32)
+
+
+class MinHasher:
+    """MinHash-подписи и LSH-ключи по шинглам слов"""
+
+    def __init__(self, num_perm: int = NUM_PERM, bands: int = BANDS,
+                 shingle_size: int = SHINGLE_SIZE, seed: int = 1):
+        if num_perm % bands:
+            raise ValueError("num_perm должно делиться на bands")
+        self.num_perm = num_perm
+        self.bands = bands
+        self.shingle_size = shingle_size
+        self.name = f"minhash-{num_perm}-{bands}-{shingle_size}-{seed}"
+
+        # Хеши multiply-shift: старшие 32 бита (a·x + b) mod 2**64 при нечётном a.
+        # Переполнение uint64 здесь и ниже намеренное
+        rng = np.random.default_rng(seed)
+        self._a = rng.integers(0, 1 << 63, num_perm, dtype=np.uint64) * np.uint64(2) + np.uint64(1)
+        self._b = rng.integers(0, 1 << 63, num_perm, dtype=np.uint64)
+        self._mix = rng.integers(0, 1 << 63, shingle_size, dtype=np.uint64) * np.uint64(2) + np.uint64(1)
+        self._band_mix = rng.integers(0, 1 << 63, num_perm // bands, dtype=np.uint64) * np.uint64(2) + np.uint64(1)
+
+    def shingles(self, text: str) -> np.ndarray:
+        """
+        Шинглы текста — отсортированные уникальные хеши n-грамм слов
+        (для коротких текстов — хеши самих слов).
+
+        Args:
+            text: Текст чанка
+
+        Returns:
+            Массив uint64
+        """
+        # crc32 стабилен между процессами (в отличие от hash())
+        words = np.fromiter(
+            (zlib.crc32(word.encode("utf-8")) for word in WORD_RE.findall(text.lower())),
+            dtype=np.uint64
+        )
+        n = min(self.shingle_size, len(words))
+        if not n:
+            return words
+        hashes = words[:len(words) - n + 1] * self._mix[0]
+        for i in range(1, n):
+            hashes += words[i:len(words) - n + 1 + i] * self._mix[i]
+        return np.unique(hashes >> _SHIFT_32)
+
+    def band_keys(self, shingles: np.ndarray) -> np.ndarray:
+        """
+        LSH-ключи полос MinHash-подписи.
+
+        Args:
+            shingles: Шинглы чанка
+
+        Returns:
+            Массив uint32 длины bands (нули для пустого множества)
+        """
+        if not len(shingles):
+            return np.zeros(self.bands, dtype=np.uint32)
+
+        signature = ((self._a[:, None] * shingles + self._b[:, None]) >> _SHIFT_32).min(axis=1)
+        keys = (signature.reshape(self.bands, -1) * self._band_mix).sum(axis=1)
+        return (keys >> _SHIFT_32).astype(np.uint32)
+
+
+def jaccard(a: np.ndarray, b: np.ndarray) -> float:
+    """Сходство Жаккара двух множеств шинглов (отсортированных уникальных массивов)"""
+    if not len(a) or not len(b):
+        return 0.0
+    common = len(np.intersect1d(a, b, assume_unique=True))
+    return common / (len(a) + len(b) - common)
+
+
+class DedupIndex:
+    """
+    LSH-ключи полос всех чанков индекса (строка = doc_id).
+
+    Изменения возвращают новый индекс, поэтому его можно безопасно
+    класть в снапшот. Для поиска кандидатов лениво строится одна
+    отсортированная таблица ключей (номер полосы, ключ) всех полос.
+    """
+
+    def __init__(self, keys: np.ndarray):
+        self.keys = keys
+        self._table: Optional[tuple[np.ndarray, np.ndarray]] = None  # (ключи, doc_id)
+
+    @property
+    def n_docs(self) -> int:
+        """Количество чанков"""
+        return self.keys.shape[0]
+
+    def candidates(self, band_keys: np.ndarray) -> set[int]:
+        """doc_id чанков, у которых совпадает хотя бы одна полоса"""
+        if not self.n_docs:
+            return set()
+        if self._table is None:
+            table = self._band_table(self.keys)
+            order = np.argsort(table, axis=None, kind="stable")
+            self._table = (table.ravel()[order], (order // self.keys.shape[1]).astype(np.uint32))
+
+        sorted_keys, doc_ids = self._table
+        query = self._band_table(band_keys[None, :])[0]
+        starts = np.searchsorted(sorted_keys, query, side="left")
+        ends = np.searchsorted(sorted_keys, query, side="right")
+        found: set[int] = set()
+        for start, end in zip(starts.tolist(), ends.tolist()):
+            if start < end:
+                found.update(doc_ids[start:end].tolist())
+        return found
+
+    @staticmethod
+    def _band_table(keys: np.ndarray) -> np.ndarray:
+        """Ключи полос с номером полосы в старших битах (uint64)"""
+        bands = np.arange(keys.shape[1], dtype=np.uint64) << _SHIFT_32
+        return keys.astype(np.uint64) | bands
+
+    def without(self, doc_ids: set[int]) -> "DedupIndex":
+        """Новый индекс без указанных строк (порядок остальных сохраняется)"""
+        if not doc_ids:
+            return self
+        keep = np.ones(self.n_docs, dtype=bool)
+        keep[list(doc_ids)] = False
+        return DedupIndex(np.ascontiguousarray(self.keys[keep]))
+
+    def extended(self, keys: np.ndarray) -> "DedupIndex":
+        """Новый индекс с добавленными строками в конце"""
+        if not len(keys):
+            return self
+        return DedupIndex(np.vstack([self.keys, keys]).astype(np.uint32, copy=False))
+
+    def save(self, path: str):
+        """Атомарно сохраняет ключи в .npy"""
+        tmp_path = path + ".tmp"
+        with open(tmp_path, "wb") as f:
+            np.save(f, np.ascontiguousarray(self.keys, dtype=np.uint32))
+        os.replace(tmp_path, path)
+
+    @classmethod
+    def load(cls, path: str) -> Optional["DedupIndex"]:
+        """Открывает ключи через mmap (None, если файла нет или он повреждён)"""
+        if not os.path.exists(path):
+            return None
+        try:
+            return cls(np.load(path, mmap_mode="r"))
+        except Exception as e:
+            logger.error(f"Ошибка загрузки ключей дедупликации: {e}")
+            return None
+
+    @classmethod
+    def build(cls, texts: Iterable[str], hasher: MinHasher) -> "DedupIndex":
+        """Ключи полос для последовательности текстов (doc_id = позиция)"""
+        keys = [hasher.band_keys(hasher.shingles(text)) for text in texts]
+        if not keys:
+            return cls.empty(hasher.bands)
+        return cls(np.vstack(keys))
+
+    @classmethod
+    def empty(cls, bands: int = BANDS) -> "DedupIndex":
+        """Пустой индекс"""
+        return cls(np.zeros((0, bands), dtype=np.uint32))
+
+
+class NearDuplicateFilter:
+    """
+    Отсев почти-дубликатов в рамках одной сборки индекса.
+
+    Новый чанк сравнивается и с уже проиндексированными, и с принятыми
+    ранее в этой же сборке.
+    """
+
+    def __init__(self, hasher: MinHasher, index: DedupIndex, threshold: float,
+                 text_of: Callable[[int], str]):
+        """
+        Args:
+            hasher: MinHasher
+            index: Ключи уже проиндексированных чанков
+            threshold: Порог сходства Жаккара шинглов (0..1)
+            text_of: Текст чанка по doc_id
+        """
+        self.hasher = hasher
+        self.index = index
+        self.threshold = threshold
+        self.text_of = text_of
+        self._buckets: dict[tuple[int, int], list[int]] = {}  # (полоса, ключ) → doc_id новых чанков
+        self._new_keys: list[np.ndarray] = []
+
+    def find(self, text: str) -> tuple[Optional[tuple[int, float]], np.ndarray]:
+        """
+        Ищет почти-дубликат чанка.
+
+        Args:
+            text: Текст нового чанка
+
+        Returns:
+            Кортеж ((doc_id, сходство) лучшего дубликата или None, ключи полос чанка)
+        """
+        shingles = self.hasher.shingles(text)
+        band_keys = self.hasher.band_keys(shingles)
+        if not len(shingles):
+            return None, band_keys
+
+        candidates = self.index.candidates(band_keys)
+        for band, key in enumerate(band_keys.tolist()):
+            candidates.update(self._buckets.get((band, key), ()))
+
+        best: Optional[tuple[int, float]] = None
+        for doc_id in sorted(candidates):
+            similarity = jaccard(shingles, self.hasher.shingles(self.text_of(doc_id)))
+            if similarity >= self.threshold and (best is None or similarity > best[1]):
+                best = (doc_id, similarity)
+        return best, band_keys
+
+    def add(self, doc_id: int, band_keys: np.ndarray):
+        """Регистрирует принятый чанк (doc_id должны идти подряд после index)"""
+        for band, key in enumerate(band_keys.tolist()):
+            self._buckets.setdefault((band, key), []).append(doc_id)
+        self._new_keys.append(band_keys)
+
+    def result(self) -> DedupIndex:
+        """Ключи всех чанков после сборки"""
+        if not self._new_keys:
+            return self.index
+        return self.index.extended(np.vstack(self._new_keys))
@@ -0,0 +1,192 @@
+"""
+Dense Retrieval
+===============
+Офлайн dense-поиск на NumPy без внешних сервисов и моделей.
+
+Эмбеддинги — хешированные символьные n-граммы слов (hashing trick со знаком),
+нормированные по L2. Все векторы чанков хранятся одной непрерывной
+float32-матрицей в embeddings.npy и открываются через mmap; запрос — одно
+матрично-векторное произведение и argpartition для top-k.
+"""
+
+import os
+import zlib
+import logging
+from collections import Counter
+from functools import lru_cache
+from typing import Iterable, Optional
+
+import numpy as np
+
+from rag.tokenizer import WORD_RE
+
+logger = logging.getLogger(__name__)
+
+
+class HashingEmbedder:
+    """
+    Эмбеддер на хешированных символьных n-граммах.
+
+    Args:
+        dim: Размерность вектора
+        min_n: Минимальная длина n-граммы
+        max_n: Максимальная длина n-граммы
+    """
+
+    def __init__(self, dim: int = 1024, min_n: int = 3, max_n: int = 5):
+        self.dim = dim
+        self.min_n = min_n
+        self.max_n = max_n
+        self.name = f"hashing-{dim}-{min_n}-{max_n}"
+        # Признаки слова зависят только от слова — считаем их один раз
+        self._word_features = lru_cache(maxsize=200_000)(self._compute_word_features)
+
+    def _compute_word_features(self, word: str) -> tuple[np.ndarray, np.ndarray]:
+        """Индексы и знаки хешированных n-грамм слова (и самого слова)"""
+        padded = f"<{word}>"
+        grams = [padded]
+        for n in range(self.min_n, self.max_n + 1):
+            grams.extend(padded[i:i + n] for i in range(len(padded) - n + 1))
+
+        hashes = np.fromiter(
+            (zlib.crc32(gram.encode("utf-8")) for gram in grams),
+            dtype=np.uint32,
+            count=len(grams)
+        )
+        indices = (hashes % self.dim).astype(np.intp)
+        signs = np.where(hashes & 0x80000000, 1.0, -1.0).astype(np.float32)
+        return indices, signs
+
+    def embed_one(self, text: str) -> np.ndarray:
+        """Нормированный вектор одного текста"""
+        words = Counter(WORD_RE.findall(text.lower()))
+        if not words:
+            return np.zeros(self.dim, dtype=np.float32)
+
+        indices, weights = [], []
+        for word, count in words.items():
+            word_indices, signs = self._word_features(word)
+            indices.append(word_indices)
+            # Сублинейный вес частоты слова
+            weights.append(signs * (1.0 + np.log(count)))
+
+        vector = np.bincount(
+            np.concatenate(indices),
+            weights=np.concatenate(weights),
+            minlength=self.dim
+        ).astype(np.float32)
+
+        norm = np.linalg.norm(vector)
+        if norm > 0:
+            vector /= norm
+        return vector
+
+    def embed(self, texts: Iterable[str]) -> np.ndarray:
+        """Матрица векторов (n_texts, dim), float32"""
+        vectors = [self.embed_one(text) for text in texts]
+        if not vectors:
+            return np.zeros((0, self.dim), dtype=np.float32)
+        return np.vstack(vectors)
+
+
+class DenseIndex:
+    """
+    Неизменяемый dense-индекс: матрица векторов, строка = doc_id.
+
+    Изменения (удаление/добавление строк) возвращают новый индекс,
+    поэтому его можно безопасно класть в снапшот.
+    """
+
+    def __init__(self, vectors: np.ndarray):
+        self.vectors = vectors
+
+    @property
+    def n_docs(self) -> int:
+        """Количество векторов"""
+        return self.vectors.shape[0]
+
+    def search(self, query_vector: np.ndarray, k: int) -> list[tuple[int, float]]:
+        """
+        Top-k по косинусной близости.
+
+        Args:
+            query_vector: Нормированный вектор запроса
+            k: Количество результатов
+
+        Returns:
+            Список (doc_id, косинус) по убыванию, только с положительной близостью
+        """
+        if not self.n_docs or k <= 0:
+            return []
+
+        scores = self.vectors @ query_vector
+        k = min(k, len(scores))
+        top = np.argpartition(-scores, k - 1)[:k]
+        top = top[np.argsort(-scores[top], kind="stable")]
+        return [(int(doc_id), float(scores[doc_id])) for doc_id in top if scores[doc_id] > 0]
+
+    def search_many(self, query_vectors: np.ndarray, k: int) -> list[list[tuple[int, float]]]:
+        """
+        Top-k для пачки запросов одним матричным произведением.
+
+        Args:
+            query_vectors: Нормированные векторы запросов (n_queries, dim)
+            k: Количество результатов на запрос
+
+        Returns:
+            Для каждого запроса — список (doc_id, косинус) по убыванию
+        """
+        if not self.n_docs or k <= 0:
+            return [[] for _ in range(len(query_vectors))]
+
+        scores = self.vectors @ query_vectors.T  # (n_docs, n_queries)
+        k = min(k, self.n_docs)
+        top = np.argpartition(-scores, k - 1, axis=0)[:k]
+
+        results = []
+        for column in range(scores.shape[1]):
+            column_scores = scores[:, column]
+            ids = top[:, column]
+            ids = ids[np.argsort(-column_scores[ids], kind="stable")]
+            results.append([
+                (int(doc_id), float(column_scores[doc_id]))
+                for doc_id in ids if column_scores[doc_id] > 0
+            ])
+        return results
+
+    def without(self, doc_ids: set[int]) -> "DenseIndex":
+        """Новый индекс без указанных строк (порядок остальных сохраняется)"""
+        if not doc_ids:
+            return self
+        keep = np.ones(self.n_docs, dtype=bool)
+        keep[list(doc_ids)] = False
+        return DenseIndex(np.ascontiguousarray(self.vectors[keep]))
+
+    def extended(self, vectors: np.ndarray) -> "DenseIndex":
+        """Новый индекс с добавленными строками в конце"""
+        if not len(vectors):
+            return self
+        return DenseIndex(np.vstack([self.vectors, vectors]).astype(np.float32, copy=False))
+
+    def save(self, path: str):
+        """Атомарно сохраняет матрицу в .npy"""
+        tmp_path = path + ".tmp"
+        with open(tmp_path, "wb") as f:
+            np.save(f, np.ascontiguousarray(self.vectors, dtype=np.float32))
+        os.replace(tmp_path, path)
+
+    @classmethod
+    def load(cls, path: str) -> Optional["DenseIndex"]:
+        """Открывает матрицу через mmap (None, если файла нет или он повреждён)"""
+        if not os.path.exists(path):
+            return None
+        try:
+            return cls(np.load(path, mmap_mode="r"))
+        except Exception as e:
+            logger.error(f"Ошибка загрузки эмбеддингов: {e}")
+            return None
+
+    @classmethod
+    def empty(cls, dim: int) -> "DenseIndex":
+        """Пустой индекс заданной размерности"""
+        return cls(np.zeros((0, dim), dtype=np.float32))
@@ -0,0 +1,31 @@
+"""
+Rank Fusion
+===========
+Объединение ранжированных списков нескольких ретриверов.
+
+Reciprocal-rank fusion использует только позиции документов, поэтому
+не требует приводить несопоставимые скоры (BM25, косинус) к одной шкале.
+"""
+
+
+def reciprocal_rank_fusion(
+    rankings: list[list[tuple[int, float]]],
+    k: int = 60
+) -> list[tuple[int, float]]:
+    """
+    Reciprocal-rank fusion: score(d) = Σ 1 / (k + rank(d)).
+
+    Args:
+        rankings: Списки (doc_id, скор) каждого ретривера, по убыванию релевантности
+        k: Сглаживающая константа (больше — меньше вес верхних позиций)
+
+    Returns:
+        Список (doc_id, скор RRF) по убыванию
+    """
+    fused: dict[int, float] = {}
+    for ranking in rankings:
+        for rank, (doc_id, _) in enumerate(ranking, 1):
+            fused[doc_id] = fused.get(doc_id, 0.0) + 1.0 / (k + rank)
+
+    # При равенстве скоров — меньший doc_id выше (детерминированный порядок)
+    return sorted(fused.items(), key=lambda item: (-item[1], item[0]))
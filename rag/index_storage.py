@@ -0,0 +1,348 @@
+"""
+Index Storage
+=============
+Компактный бинарный формат индекса с загрузкой через mmap.
+
+Один файл index.bin из секций:
+    sources       — JSON-список имён файлов-источников
+    text_offsets  — смещения чанков в текстовом блобе (uint64, n_docs + 1)
+    doc_sources   — номер источника для каждого чанка (uint32)
+    doc_ordinals  — порядковый номер чанка внутри источника (uint32)
+    doc_lengths   — длина чанка в токенах (uint32)
+    vocab         — JSON-словарь {термин: [смещение в postings, размер в байтах,
+                    df, последний doc_id]}
+    postings      — сжатые postings терминов подряд: пары (разрыв doc_id, tf)
+                    в формате VByte (см. rag.postings_codec)
+    text          — UTF-8 тексты чанков подряд
+
+При открытии в память читаются только словарь и список источников;
+массивы отображаются через memoryview поверх mmap, а текст чанка
+подгружается ОС только при обращении к нему (т.е. для top-k результатов).
+Postings термина декодируются только при его поиске.
+
+Файлы версии 1 (несжатые пары uint32) при открытии один раз
+переписываются в текущий формат.
+"""
+
+import os
+import json
+import mmap
+import struct
+import logging
+from array import array
+from typing import Iterator, Optional
+
+import numpy as np
+
+from rag.inverted_index import EMPTY_POSTINGS, InvertedIndex, Postings
+from rag.postings_codec import decode_postings, encode_postings
+
+logger = logging.getLogger(__name__)
+
+MAGIC = b"BRIEFIDX"
+VERSION = 2
+LEGACY_VERSION = 1  # несжатые postings: пары (doc_id, tf) uint32
+SECTIONS = (
+    "sources", "text_offsets", "doc_sources", "doc_ordinals",
+    "doc_lengths", "vocab", "postings", "text",
+)
+# magic, version, n_docs, total_length, затем (offset, size) для каждой секции
+HEADER = struct.Struct("<8sIIQ" + "QQ" * len(SECTIONS))
+ALIGN = 8
+
+
+class ChunkTable:
+    """
+    Ленивая таблица чанков поверх mmap.
+
+    Ведёт себя как list[dict] с ключами "id", "content", "source",
+    но декодирует текст чанка только при обращении к нему.
+    """
+
+    def __init__(self, text: memoryview, offsets: memoryview,
+                 doc_sources: memoryview, doc_ordinals: memoryview,
+                 sources: list[str]):
+        self._text = text
+        self._offsets = offsets
+        self._doc_sources = doc_sources
+        self._doc_ordinals = doc_ordinals
+        self.sources = sources
+
+    def __len__(self) -> int:
+        return len(self._doc_sources)
+
+    def __getitem__(self, doc_id: int) -> dict:
+        if doc_id < 0:
+            doc_id += len(self)
+        if not 0 <= doc_id < len(self):
+            raise IndexError(doc_id)
+
+        source = self.sources[self._doc_sources[doc_id]]
+        start, end = self._offsets[doc_id], self._offsets[doc_id + 1]
+        return {
+            "id": f"{source}_{self._doc_ordinals[doc_id]}",
+            "content": bytes(self._text[start:end]).decode("utf-8"),
+            "source": source
+        }
+
+    def __iter__(self) -> Iterator[dict]:
+        for doc_id in range(len(self)):
+            yield self[doc_id]
+
+    def source_of(self, doc_id: int) -> str:
+        """Имя источника чанка без декодирования текста"""
+        return self.sources[self._doc_sources[doc_id]]
+
+
+class MmapIndex:
+    """
+    Инвертированный индекс только для чтения поверх mmap.
+
+    Реализует тот же интерфейс чтения, что и InvertedIndex,
+    поэтому с ним работает BM25Scorer.
+    """
+
+    def __init__(self, vocab: dict[str, list[int]], postings: memoryview,
+                 doc_lengths: memoryview, total_length: int):
+        self._vocab = vocab
+        self._postings = postings
+        self.doc_lengths = doc_lengths
+        self.total_length = total_length
+
+    def get_postings(self, term: str) -> Postings:
+        """Возвращает postings термина (декодируются из mmap при вызове)"""
+        entry = self._vocab.get(term)
+        if not entry:
+            return EMPTY_POSTINGS
+        return Postings(*decode_postings(self._postings[entry[0]:entry[0] + entry[1]]))
+
+    def encoded_postings(self, term: str) -> tuple[memoryview, int, int]:
+        """
+        Postings термина без декодирования.
+
+        Returns:
+            Кортеж (поток VByte, число вхождений, последний doc_id)
+        """
+        offset, size, doc_freq, last_doc_id = self._vocab[term]
+        return self._postings[offset:offset + size], doc_freq, last_doc_id
+
+    def doc_freq(self, term: str) -> int:
+        """Документная частота термина"""
+        entry = self._vocab.get(term)
+        return entry[2] if entry else 0
+
+    def terms(self) -> Iterator[str]:
+        """Термины словаря"""
+        return iter(self._vocab)
+
+    def to_inverted_index(self) -> InvertedIndex:
+        """Разворачивает индекс в изменяемый InvertedIndex"""
+        return InvertedIndex.from_postings(
+            ((term, *self.encoded_postings(term)) for term in self._vocab),
+            array("I", self.doc_lengths.tobytes()),
+            self.total_length
+        )
+
+    @property
+    def n_docs(self) -> int:
+        """Количество документов в индексе"""
+        return len(self.doc_lengths)
+
+    @property
+    def avg_doc_length(self) -> float:
+        """Средняя длина чанка в токенах"""
+        if not len(self.doc_lengths):
+            return 0.0
+        return self.total_length / len(self.doc_lengths)
+
+    @property
+    def n_terms(self) -> int:
+        """Размер словаря"""
+        return len(self._vocab)
+
+
+def _parse_id(doc: dict) -> int:
+    """Достаёт порядковый номер чанка из id вида "<source>_<i>\""""
+    try:
+        return int(doc["id"].rsplit("_", 1)[1])
+    except (KeyError, IndexError, ValueError):
+        return 0
+
+
+def _chunk_columns(documents) -> tuple[list[str], bytes, array, array, array]:
+    """Колонки таблицы чанков: источники, текст, смещения, номера источников и порядковые номера"""
+    if isinstance(documents, ChunkTable):
+        # Таблица уже хранит колонки — копируем буферы целиком
+        return (
+            list(documents.sources),
+            bytes(documents._text),
+            array("Q", bytes(documents._offsets)),
+            array("I", bytes(documents._doc_sources)),
+            array("I", bytes(documents._doc_ordinals)),
+        )
+
+    source_ids: dict[str, int] = {}
+    text_offsets = array("Q", [0])
+    doc_sources = array("I")
+    doc_ordinals = array("I")
+    text_parts: list[bytes] = []
+
+    offset = 0
+    for doc in documents:
+        data = doc["content"].encode("utf-8")
+        text_parts.append(data)
+        offset += len(data)
+        text_offsets.append(offset)
+        doc_sources.append(source_ids.setdefault(doc["source"], len(source_ids)))
+        doc_ordinals.append(_parse_id(doc))
+
+    return list(source_ids), b"".join(text_parts), text_offsets, doc_sources, doc_ordinals
+
+
+def write_index(path: str, documents, index: InvertedIndex | MmapIndex):
+    """
+    Записывает чанки и инвертированный индекс в бинарный файл.
+
+    Запись идёт во временный файл с последующим os.replace,
+    поэтому читатели никогда не видят частично записанный индекс.
+
+    Args:
+        path: Путь к index.bin
+        documents: Чанки (list[dict] или ChunkTable), doc_id = позиция
+        index: Инвертированный индекс по этим чанкам
+    """
+    sources, text, text_offsets, doc_sources, doc_ordinals = _chunk_columns(documents)
+
+    vocab: dict[str, list[int]] = {}
+    postings = bytearray()
+    for term in index.terms():
+        # Postings уже сжаты — копируем байты без перекодирования
+        data, doc_freq, last_doc_id = index.encoded_postings(term)
+        vocab[term] = [len(postings), len(data), doc_freq, last_doc_id]
+        postings += data
+
+    payloads = {
+        "sources": json.dumps(sources, ensure_ascii=False).encode("utf-8"),
+        "text_offsets": text_offsets.tobytes(),
+        "doc_sources": doc_sources.tobytes(),
+        "doc_ordinals": doc_ordinals.tobytes(),
+        "doc_lengths": bytes(index.doc_lengths),
+        "vocab": json.dumps(vocab, ensure_ascii=False, separators=(",", ":")).encode("utf-8"),
+        "postings": bytes(postings),
+        "text": text,
+    }
+
+    layout: list[int] = []
+    position = HEADER.size
+    for name in SECTIONS:
+        position += -position % ALIGN
+        layout.extend((position, len(payloads[name])))
+        position += len(payloads[name])
+
+    header = HEADER.pack(MAGIC, VERSION, len(doc_sources), index.total_length, *layout)
+
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "wb") as f:
+        f.write(header)
+        for name in SECTIONS:
+            f.write(b"\0" * (-f.tell() % ALIGN))
+            f.write(payloads[name])
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp_path, path)
+
+
+def open_index(path: str) -> tuple[ChunkTable, MmapIndex]:
+    """
+    Открывает бинарный индекс через mmap.
+
+    Args:
+        path: Путь к index.bin
+
+    Returns:
+        Кортеж (таблица чанков, индекс)
+    """
+    with open(path, "rb") as f:
+        mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+    magic, version, n_docs, total_length, *layout = HEADER.unpack_from(mm, 0)
+    if magic != MAGIC or version not in (VERSION, LEGACY_VERSION):
+        mm.close()
+        raise ValueError(f"Неподдерживаемый формат индекса: {path}")
+
+    view = memoryview(mm)
+    sections = {
+        name: view[layout[2 * i]:layout[2 * i] + layout[2 * i + 1]]
+        for i, name in enumerate(SECTIONS)
+    }
+
+    sources = json.loads(bytes(sections["sources"]).decode("utf-8"))
+    vocab = json.loads(bytes(sections["vocab"]).decode("utf-8"))
+
+    chunks = ChunkTable(
+        text=sections["text"],
+        offsets=sections["text_offsets"].cast("Q"),
+        doc_sources=sections["doc_sources"].cast("I"),
+        doc_ordinals=sections["doc_ordinals"].cast("I"),
+        sources=sources
+    )
+    if version == LEGACY_VERSION:
+        _upgrade_legacy(path, chunks, vocab, sections, total_length)
+        return open_index(path)
+
+    index = MmapIndex(
+        vocab=vocab,
+        postings=sections["postings"],
+        doc_lengths=sections["doc_lengths"].cast("I"),
+        total_length=total_length
+    )
+
+    logger.info(f"Открыт бинарный индекс {path}: {n_docs} чанков, {len(vocab)} терминов")
+    return chunks, index
+
+
+def _upgrade_legacy(path: str, chunks: ChunkTable, vocab: dict[str, list[int]],
+                    sections: dict[str, memoryview], total_length: int):
+    """Переписывает индекс версии 1 (несжатые пары uint32) в текущий формат"""
+    pairs = np.frombuffer(sections["postings"], dtype=np.uint32)
+
+    def encoded():
+        for term, (start, doc_freq) in vocab.items():
+            term_pairs = pairs[2 * start:2 * (start + doc_freq)]
+            doc_ids = term_pairs[0::2]
+            yield term, encode_postings(doc_ids, term_pairs[1::2]), doc_freq, int(doc_ids[-1])
+
+    index = InvertedIndex.from_postings(
+        encoded(),
+        array("I", bytes(sections["doc_lengths"])),
+        total_length
+    )
+    write_index(path, chunks, index)
+    logger.info(f"Индекс {path} переписан со сжатыми postings (формат версии {VERSION})")
+
+
+def migrate_json_index(json_path: str, bin_path: str, tokenize) -> Optional[list[dict]]:
+    """
+    Одноразовая миграция index.json → index.bin.
+
+    После успешной записи index.json переименовывается в index.json.migrated.
+
+    Args:
+        json_path: Путь к старому index.json
+        bin_path: Путь к новому index.bin
+        tokenize: Функция токенизации для построения postings
+
+    Returns:
+        Список чанков из index.json или None, если миграция не удалась
+    """
+    try:
+        with open(json_path, "r", encoding="utf-8") as f:
+            documents = json.load(f)
+        index = InvertedIndex.build((doc["content"] for doc in documents), tokenize)
+        write_index(bin_path, documents, index)
+        os.replace(json_path, json_path + ".migrated")
+        logger.info(f"Индекс мигрирован в бинарный формат: {len(documents)} чанков")
+        return documents
+    except Exception as e:
+        logger.error(f"Ошибка миграции индекса: {e}")
+        return None
@@ -0,0 +1,69 @@
+"""
+Ingestion Workers
+=================
+Задачи для параллельной индексации документов в пуле процессов.
+
+Чтение файла, подсчёт sha256 и чанкинг — CPU/IO-работа, которая не должна
+выполняться в event loop бота. Функции здесь модульного уровня и принимают
+только простые аргументы, чтобы их можно было передать в ProcessPoolExecutor.
+"""
+
+import os
+import hashlib
+from typing import Optional
+
+from rag.chunker import iter_file_chunks
+
+# Размер блока при подсчёте sha256
+HASH_BLOCK_SIZE = 1 << 20
+
+
+def file_sha256(filepath: str) -> str:
+    """sha256 файла, читаемого блоками (без загрузки целиком в память)"""
+    digest = hashlib.sha256()
+    with open(filepath, "rb") as f:
+        for block in iter(lambda: f.read(HASH_BLOCK_SIZE), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def ingest_file(
+    filepath: str,
+    known_sha256: Optional[str],
+    chunk_size: int,
+    chunk_overlap: int = 0
+) -> dict:
+    """
+    Читает файл и, если содержимое изменилось, разбивает его на чанки.
+
+    Файл читается потоково: сначала блоками для sha256, затем построчно
+    чанкером, так что целиком в памяти текст файла не держится. Но
+    чанки собираются в список и передаются (pickle) в основной процесс,
+    поэтому память воркера и основного процесса растёт с размером файла —
+    как и сам индекс, который хранит текст всех чанков.
+
+    Args:
+        filepath: Путь к файлу
+        known_sha256: Хеш из манифеста (None для нового файла)
+        chunk_size: Размер чанка
+        chunk_overlap: Перекрытие соседних чанков
+
+    Returns:
+        {"entry": запись манифеста, "chunks": список чанков или None, если файл не изменился}
+    """
+    st = os.stat(filepath)
+
+    entry = {
+        "mtime": st.st_mtime,
+        "size": st.st_size,
+        "sha256": file_sha256(filepath),
+        "chunks": 0
+    }
+
+    if entry["sha256"] == known_sha256:
+        return {"entry": entry, "chunks": None}
+
+    chunks = list(iter_file_chunks(filepath, chunk_size, chunk_overlap))
+    entry["chunks"] = len(chunks)
+
+    return {"entry": entry, "chunks": chunks}
@@ -0,0 +1,247 @@
+"""
+Inverted Index
+==============
+Инвертированный индекс для лексического поиска по чанкам.
+
+Строится один раз при индексации/загрузке: для каждого термина хранится
+список документов (postings) с частотой термина, плюс длина каждого чанка
+в токенах. Поиск затрагивает только postings терминов запроса.
+
+Хранение компактное: термины интернируются и получают целочисленный id,
+а postings каждого термина — один bytearray с дельта-кодированными
+doc_id и частотами в формате VByte (см. rag.postings_codec), обычно
+около 2 байт на вхождение. Postings декодируются лениво, при запросе.
+"""
+
+import sys
+from array import array
+from bisect import bisect_left
+from collections import Counter
+from typing import Callable, Iterable, Iterator, Optional
+
+import numpy as np
+
+from rag.postings_codec import append_posting, decode_postings, encode_postings
+
+
+class Postings:
+    """
+    Postings термина: отсортированные doc_id и частоты.
+
+    Ведёт себя как словарь {doc_id: tf} только для чтения (len, items, get),
+    но хранит данные в двух плоских массивах (array или NumPy).
+    """
+
+    __slots__ = ("doc_ids", "tfs")
+
+    def __init__(self, doc_ids, tfs):
+        self.doc_ids = doc_ids
+        self.tfs = tfs
+
+    def __len__(self) -> int:
+        return len(self.doc_ids)
+
+    def __iter__(self) -> Iterator[int]:
+        return iter(self.doc_ids)
+
+    def items(self) -> Iterator[tuple[int, int]]:
+        """Пары (doc_id, tf) по возрастанию doc_id"""
+        return zip(self.doc_ids, self.tfs)
+
+    def get(self, doc_id: int, default: Optional[int] = None) -> Optional[int]:
+        """Частота термина в документе (двоичный поиск)"""
+        i = bisect_left(self.doc_ids, doc_id)
+        if i < len(self.doc_ids) and self.doc_ids[i] == doc_id:
+            return self.tfs[i]
+        return default
+
+
+EMPTY_POSTINGS = Postings(array("I"), array("I"))
+
+
+class InvertedIndex:
+    """Инвертированный индекс: термин → postings (doc_id, tf)"""
+
+    def __init__(self):
+        self.vocab: dict[str, int] = {}  # интернированный термин → term_id
+        self._postings: list[bytearray] = []  # term_id → закодированные пары (разрыв doc_id, tf)
+        self._doc_freqs = array("I")  # term_id → число вхождений
+        self._last_doc_ids = array("I")  # term_id → последний doc_id (для дельты при дописывании)
+        self.doc_lengths = array("I")
+        self.total_length = 0
+
+    @classmethod
+    def build(
+        cls,
+        texts: Iterable[str],
+        tokenize: Callable[[str], list[str]]
+    ) -> "InvertedIndex":
+        """
+        Строит индекс по последовательности текстов.
+
+        Args:
+            texts: Тексты чанков (doc_id = позиция в последовательности)
+            tokenize: Функция токенизации
+
+        Returns:
+            Готовый индекс
+        """
+        index = cls()
+        for text in texts:
+            index.add_document(tokenize(text))
+        return index
+
+    @classmethod
+    def from_postings(
+        cls,
+        postings: Iterable[tuple[str, bytes, int, int]],
+        doc_lengths: array,
+        total_length: int
+    ) -> "InvertedIndex":
+        """
+        Собирает индекс из готовых закодированных postings (например, прочитанных с диска).
+
+        Args:
+            postings: Четвёрки (термин, поток VByte, число вхождений, последний doc_id)
+            doc_lengths: Длины документов в токенах
+            total_length: Сумма длин
+
+        Returns:
+            Индекс
+        """
+        index = cls()
+        for term, data, doc_freq, last_doc_id in postings:
+            index._add_term(term, bytearray(data), doc_freq, last_doc_id)
+        index.doc_lengths = doc_lengths
+        index.total_length = total_length
+        return index
+
+    def _add_term(self, term: str, data: bytearray, doc_freq: int, last_doc_id: int) -> int:
+        """Регистрирует термин с его postings и возвращает term_id"""
+        term_id = self.vocab[sys.intern(term)] = len(self._postings)
+        self._postings.append(data)
+        self._doc_freqs.append(doc_freq)
+        self._last_doc_ids.append(last_doc_id)
+        return term_id
+
+    def copy(self) -> "InvertedIndex":
+        """Независимая копия индекса (для сборки новой версии без блокировки поиска)"""
+        index = InvertedIndex()
+        index.vocab = dict(self.vocab)
+        index._postings = [data[:] for data in self._postings]
+        index._doc_freqs = self._doc_freqs[:]
+        index._last_doc_ids = self._last_doc_ids[:]
+        index.doc_lengths = self.doc_lengths[:]
+        index.total_length = self.total_length
+        return index
+
+    def add_document(self, tokens: list[str]) -> int:
+        """
+        Добавляет документ в индекс.
+
+        Args:
+            tokens: Токены документа
+
+        Returns:
+            doc_id добавленного документа
+        """
+        doc_id = len(self.doc_lengths)
+        self.doc_lengths.append(len(tokens))
+        self.total_length += len(tokens)
+
+        for term, tf in Counter(tokens).items():
+            term_id = self.vocab.get(term)
+            if term_id is None:
+                term_id = self._add_term(term, bytearray(), 0, 0)
+            # doc_id растут, поэтому разрыв с предыдущим вхождением неотрицателен
+            append_posting(self._postings[term_id], doc_id - self._last_doc_ids[term_id], tf)
+            self._doc_freqs[term_id] += 1
+            self._last_doc_ids[term_id] = doc_id
+
+        return doc_id
+
+    def remove_documents(self, doc_ids: set[int]) -> list[int]:
+        """
+        Удаляет документы из индекса и уплотняет doc_id оставшихся.
+
+        Порядок оставшихся документов сохраняется, поэтому вызывающий код
+        должен удалить те же позиции из своего списка чанков.
+
+        Args:
+            doc_ids: doc_id удаляемых документов
+
+        Returns:
+            Отображение старый doc_id → новый (-1 для удалённых)
+        """
+        removed = np.zeros(self.n_docs, dtype=bool)
+        removed[list(doc_ids)] = True
+        remap = np.cumsum(~removed, dtype=np.int64) - 1
+        remap[removed] = -1
+
+        lengths = np.frombuffer(self.doc_lengths, dtype=np.uint32)
+        self.total_length -= int(lengths[removed].sum())
+        self.doc_lengths = array("I", lengths[~removed].tobytes())
+
+        old_vocab, old_postings = self.vocab, self._postings
+        self.vocab = {}
+        self._postings = []
+        self._doc_freqs = array("I")
+        self._last_doc_ids = array("I")
+        for term, term_id in old_vocab.items():
+            term_doc_ids, tfs = decode_postings(old_postings[term_id])
+            new_ids = remap[term_doc_ids]
+            keep = new_ids >= 0
+            if not keep.any():
+                continue
+            new_ids = new_ids[keep]
+            self._add_term(
+                term,
+                bytearray(encode_postings(new_ids, tfs[keep])),
+                len(new_ids),
+                int(new_ids[-1])
+            )
+
+        return remap.tolist()
+
+    def get_postings(self, term: str) -> Postings:
+        """Возвращает postings термина (декодируются при вызове)"""
+        term_id = self.vocab.get(term)
+        if term_id is None:
+            return EMPTY_POSTINGS
+        return Postings(*decode_postings(self._postings[term_id]))
+
+    def encoded_postings(self, term: str) -> tuple[bytes, int, int]:
+        """
+        Postings термина без декодирования.
+
+        Returns:
+            Кортеж (поток VByte, число вхождений, последний doc_id)
+        """
+        term_id = self.vocab[term]
+        return self._postings[term_id], self._doc_freqs[term_id], self._last_doc_ids[term_id]
+
+    def doc_freq(self, term: str) -> int:
+        """Документная частота термина (в скольких чанках встречается)"""
+        term_id = self.vocab.get(term)
+        return self._doc_freqs[term_id] if term_id is not None else 0
+
+    def terms(self) -> Iterator[str]:
+        """Термины словаря"""
+        return iter(self.vocab)
+
+    @property
+    def n_docs(self) -> int:
+        """Количество документов в индексе"""
+        return len(self.doc_lengths)
+
+    @property
+    def avg_doc_length(self) -> float:
+        """Средняя длина чанка в токенах"""
+        if not self.doc_lengths:
+            return 0.0
+        return self.total_length / len(self.doc_lengths)
+
+    @property
+    def n_terms(self) -> int:
+        """Размер словаря"""
+        return len(self.vocab)
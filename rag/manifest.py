@@ -0,0 +1,160 @@
+"""
+Index Manifest
+==============
+Манифест проиндексированных файлов и определение изменённых файлов.
+
+Общие для VectorStoreManager и ChromaVectorStore, чтобы правила
+инвалидации индекса (параметры чанкинга, версия чанкера, эмбеддер)
+и инкрементальной индексации (mtime, размер, sha256) у бэкендов
+не расходились.
+
+Манифест — JSON-файл в директории индекса:
+
+    {"chunk_size": 500, "chunk_overlap": 50, "chunker": "stream-v1", ...,
+     "files": {"guide.md": {"mtime": ..., "size": ..., "sha256": ..., "chunks": 12}}}
+"""
+
+import os
+import json
+import logging
+from typing import Optional
+
+from rag.chunker import CHUNKER_NAME
+
+logger = logging.getLogger(__name__)
+
+# Расширения индексируемых файлов
+SUPPORTED_EXTENSIONS = {".txt", ".md"}
+
+# Значения параметров в манифестах, записанных до их появления
+LEGACY_PARAMS = {"tokenizer": "simple"}
+
+
+def chunking_params(chunk_size: int, chunk_overlap: int) -> dict:
+    """Параметры чанкинга, при смене которых индекс собирается заново"""
+    return {"chunk_size": chunk_size, "chunk_overlap": chunk_overlap, "chunker": CHUNKER_NAME}
+
+
+def read_manifest(path: str) -> dict:
+    """Читает манифест как есть (пустой словарь, если его нет или он повреждён)"""
+    if not os.path.exists(path):
+        return {}
+
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            return json.load(f)
+    except Exception as e:
+        logger.error(f"Ошибка загрузки манифеста: {e}")
+        return {}
+
+
+def load_manifest(path: str, params: dict, total_chunks: int) -> dict[str, dict]:
+    """
+    Загружает манифест проиндексированных файлов.
+
+    Манифест валиден, только если все params совпадают с сохранёнными,
+    а число чанков в нём — с индексом.
+
+    Args:
+        path: Путь к манифесту
+        params: Параметры индекса (chunking_params и параметры бэкенда)
+        total_chunks: Число чанков в индексе
+
+    Returns:
+        Словарь {имя файла: {"mtime", "size", "sha256", "chunks"}}
+        (пустой — полная переиндексация)
+    """
+    manifest = read_manifest(path)
+    files = manifest.get("files", {})
+    if (
+        any(manifest.get(key, LEGACY_PARAMS.get(key)) != value for key, value in params.items())
+        or sum(entry.get("chunks", 0) for entry in files.values()) != total_chunks
+    ):
+        logger.info("Манифест устарел — выполняется полная переиндексация")
+        return {}
+    return files
+
+
+def save_manifest(path: str, params: dict, files: dict[str, dict]):
+    """Сохраняет манифест: параметры индекса и записи файлов"""
+    try:
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump({**params, "files": files}, f, ensure_ascii=False)
+    except Exception as e:
+        logger.error(f"Ошибка сохранения манифеста: {e}")
+
+
+def scan_files(data_dir: str, old_files: dict[str, dict]) -> tuple[dict[str, dict], list[str], int]:
+    """
+    Быстрая проверка файлов по mtime/размеру без чтения содержимого.
+
+    Args:
+        data_dir: Директория с документами
+        old_files: Манифест до индексации
+
+    Returns:
+        Кортеж (новый манифест с неизменёнными и нечитаемыми файлами,
+        файлы для ingest_file, число неизменённых файлов)
+    """
+    new_files: dict[str, dict] = {}
+    to_ingest: list[str] = []
+    skipped = 0
+
+    for filename in sorted(os.listdir(data_dir)):
+        if os.path.splitext(filename)[1].lower() not in SUPPORTED_EXTENSIONS:
+            continue
+
+        entry = old_files.get(filename)
+        try:
+            st = os.stat(os.path.join(data_dir, filename))
+        except OSError as e:
+            logger.error(f"Ошибка чтения файла {filename}: {e}")
+            if entry:
+                new_files[filename] = entry
+            continue
+
+        if entry and entry["mtime"] == st.st_mtime and entry["size"] == st.st_size:
+            new_files[filename] = entry
+            skipped += 1
+        else:
+            to_ingest.append(filename)
+
+    return new_files, to_ingest, skipped
+
+
+def record_ingest(
+    filename: str,
+    result: Optional[dict],
+    old_files: dict[str, dict],
+    new_files: dict[str, dict],
+    changed: dict[str, list[str]]
+) -> bool:
+    """
+    Записывает результат ingest_file в новый манифест.
+
+    Args:
+        filename: Имя файла
+        result: Результат ingest_file (None — ошибка чтения)
+        old_files: Манифест до индексации
+        new_files: Манифест после индексации (дополняется)
+        changed: Чанки изменённых файлов (дополняется)
+
+    Returns:
+        True, если изменился только mtime, а содержимое нет
+    """
+    entry = old_files.get(filename)
+
+    if result is None:
+        # Ошибка чтения — оставляем прежнюю версию файла в индексе
+        if entry:
+            new_files[filename] = entry
+        return False
+
+    if result["chunks"] is None:
+        # mtime изменился, а содержимое нет
+        new_files[filename] = {**entry, "mtime": result["entry"]["mtime"], "size": result["entry"]["size"]}
+        return True
+
+    new_files[filename] = result["entry"]
+    changed[filename] = result["chunks"]
+    return False
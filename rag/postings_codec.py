@@ -0,0 +1,116 @@
+"""
+Postings Codec
+==============
+Сжатие postings: дельта-кодирование doc_id + variable-byte.
+
+Postings термина хранятся одним потоком байт: пары (разрыв doc_id, tf)
+подряд, каждое число — в формате VByte (LEB128): по 7 бит на байт,
+младшие биты первыми, старший бит байта означает «число продолжается».
+Разрывы между соседними doc_id и частоты обычно меньше 128, поэтому
+пара занимает 2 байта вместо 8 у несжатых uint32.
+
+Декодирование векторное (NumPy) и выполняется лениво — только для
+терминов запроса в момент скоринга.
+"""
+
+import numpy as np
+
+# Минимальные значения, требующие 2, 3, 4 и 5 байт
+_VBYTE_LIMITS = np.array([1 << 7, 1 << 14, 1 << 21, 1 << 28], dtype=np.uint64)
+
+
+def vbyte_encode(values: np.ndarray) -> bytes:
+    """
+    Кодирует неотрицательные целые (< 2**32) в VByte.
+
+    Args:
+        values: Числа
+
+    Returns:
+        Закодированный поток байт
+    """
+    values = np.asarray(values, dtype=np.uint64)
+    if not len(values) or values.max() < 0x80:
+        return values.astype(np.uint8).tobytes()
+
+    n_bytes = 1 + (values[:, None] >= _VBYTE_LIMITS).sum(axis=1)
+    starts = np.cumsum(n_bytes) - n_bytes
+    position = np.arange(int(n_bytes.sum())) - np.repeat(starts, n_bytes)
+
+    data = (np.repeat(values, n_bytes) >> (7 * position).astype(np.uint64)) & 0x7F
+    # Во всех байтах числа, кроме последнего, взводим бит продолжения
+    data[position < np.repeat(n_bytes - 1, n_bytes)] |= 0x80
+    return data.astype(np.uint8).tobytes()
+
+
+def vbyte_decode(data) -> np.ndarray:
+    """
+    Декодирует поток VByte.
+
+    Args:
+        data: Байты (bytes, bytearray или memoryview)
+
+    Returns:
+        Массив uint32
+    """
+    raw = np.frombuffer(data, dtype=np.uint8)
+    if not len(raw) or raw.max() < 0x80:
+        return raw.astype(np.uint32)
+
+    ends = np.flatnonzero(raw < 0x80)
+    starts = np.empty_like(ends)
+    starts[0] = 0
+    starts[1:] = ends[:-1] + 1
+    position = np.arange(len(raw)) - np.repeat(starts, ends - starts + 1)
+
+    # 7-битные группы одного числа не пересекаются — сумма равна побитовому ИЛИ
+    groups = (raw & 0x7F).astype(np.uint32) << (7 * position).astype(np.uint32)
+    return np.add.reduceat(groups, starts, dtype=np.uint32)
+
+
+def encode_postings(doc_ids: np.ndarray, tfs: np.ndarray) -> bytes:
+    """
+    Кодирует postings термина.
+
+    Args:
+        doc_ids: Отсортированные по возрастанию doc_id
+        tfs: Частоты термина
+
+    Returns:
+        Поток VByte из пар (разрыв doc_id, tf)
+    """
+    doc_ids = np.asarray(doc_ids, dtype=np.int64)
+    pairs = np.empty(2 * len(doc_ids), dtype=np.int64)
+    pairs[0::2] = np.diff(doc_ids, prepend=0)
+    pairs[1::2] = tfs
+    return vbyte_encode(pairs)
+
+
+def decode_postings(data) -> tuple[np.ndarray, np.ndarray]:
+    """
+    Декодирует postings термина.
+
+    Args:
+        data: Поток VByte из encode_postings
+
+    Returns:
+        Кортеж (doc_id, частоты) — массивы uint32
+    """
+    pairs = vbyte_decode(data)
+    return np.cumsum(pairs[0::2], dtype=np.uint32), pairs[1::2]
+
+
+def append_posting(data: bytearray, gap: int, tf: int):
+    """
+    Дописывает одну пару (разрыв doc_id, tf) в конец потока.
+
+    Args:
+        data: Поток postings термина
+        gap: doc_id минус doc_id предыдущего вхождения (или сам doc_id для первого)
+        tf: Частота термина
+    """
+    for value in (gap, tf):
+        while value >= 0x80:
+            data.append(value & 0x7F | 0x80)
+            value >>= 7
+        data.append(value)
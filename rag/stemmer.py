@@ -0,0 +1,367 @@
+"""
+Stemmer
+=======
+Стемминг русских и английских слов по алгоритмам Snowball
+(Russian и English/Porter2) на чистом Python.
+
+Stemmer выбирает алгоритм по алфавиту слова и мемоизирует результат
+в ограниченной таблице, так что каждая словоформа стеммится один раз.
+"""
+
+from functools import lru_cache
+
+
+# ==================== RUSSIAN ====================
+
+RU_VOWELS = frozenset("аеиоуыэюя")
+
+RU_PERFECTIVE_GERUND_1 = ("в", "вши", "вшись")  # после а/я
+RU_PERFECTIVE_GERUND_2 = ("ив", "ивши", "ившись", "ыв", "ывши", "ывшись")
+RU_ADJECTIVE = (
+    "ее", "ие", "ые", "ое", "ими", "ыми", "ей", "ий", "ый", "ой", "ем", "им", "ым",
+    "ом", "его", "ого", "ему", "ому", "их", "ых", "ую", "юю", "ая", "яя", "ою", "ею",
+)
+RU_PARTICIPLE_1 = ("ем", "нн", "вш", "ющ", "щ")  # после а/я
+RU_PARTICIPLE_2 = ("ивш", "ывш", "ующ")
+RU_REFLEXIVE = ("ся", "сь")
+RU_VERB_1 = (  # после а/я
+    "ла", "на", "ете", "йте", "ли", "й", "л", "ем", "н", "ло", "но", "ет", "ют",
+    "ны", "ть", "ешь", "нно",
+)
+RU_VERB_2 = (
+    "ила", "ыла", "ена", "ейте", "уйте", "ите", "или", "ыли", "ей", "уй", "ил",
+    "ыл", "им", "ым", "ен", "ило", "ыло", "ено", "ят", "ует", "уют", "ит", "ыт",
+    "ены", "ить", "ыть", "ишь", "ую", "ю",
+)
+RU_NOUN = (
+    "а", "ев", "ов", "ие", "ье", "е", "иями", "ями", "ами", "еи", "ии", "и",
+    "ией", "ей", "ой", "ий", "й", "иям", "ям", "ием", "ем", "ам", "ом", "о", "у",
+    "ах", "иях", "ях", "ы", "ь", "ию", "ью", "ю", "ия", "ья", "я",
+)
+RU_SUPERLATIVE = ("ейш", "ейше")
+RU_DERIVATIONAL = ("ост", "ость")
+
+
+def _ru_group(*groups: tuple[str, ...]) -> tuple[str, ...]:
+    """Объединяет группы окончаний в порядке убывания длины (для поиска самого длинного)"""
+    return tuple(sorted({e for group in groups for e in group}, key=len, reverse=True))
+
+
+RU_PERFECTIVE_GERUND = _ru_group(RU_PERFECTIVE_GERUND_1, RU_PERFECTIVE_GERUND_2)
+RU_PARTICIPLE = _ru_group(RU_PARTICIPLE_1, RU_PARTICIPLE_2)
+RU_VERB = _ru_group(RU_VERB_1, RU_VERB_2)
+RU_ADJECTIVE = _ru_group(RU_ADJECTIVE)
+RU_REFLEXIVE = _ru_group(RU_REFLEXIVE)
+RU_NOUN = _ru_group(RU_NOUN)
+RU_SUPERLATIVE = _ru_group(RU_SUPERLATIVE)
+RU_DERIVATIONAL = _ru_group(RU_DERIVATIONAL)
+# Окончания первых групп удаляются только после «а» или «я»
+RU_PERFECTIVE_GERUND_AFTER_A_YA = frozenset(RU_PERFECTIVE_GERUND_1)
+RU_PARTICIPLE_AFTER_A_YA = frozenset(RU_PARTICIPLE_1)
+RU_VERB_AFTER_A_YA = frozenset(RU_VERB_1)
+
+
+def _ru_regions(word: str) -> tuple[int, int]:
+    """Начала областей RV и R2 для русского слова"""
+    rv = len(word)
+    for i, ch in enumerate(word):
+        if ch in RU_VOWELS:
+            rv = i + 1
+            break
+
+    def next_region(start: int) -> int:
+        for i in range(start + 1, len(word)):
+            if word[i] not in RU_VOWELS and word[i - 1] in RU_VOWELS:
+                return i + 1
+        return len(word)
+
+    r1 = next_region(0)
+    r2 = next_region(r1)
+    return rv, r2
+
+
+def _ru_strip(rv: str, endings: tuple[str, ...], after_a_ya: frozenset = frozenset()) -> str | None:
+    """
+    Удаляет самое длинное окончание из группы.
+
+    Как и в Snowball, если самое длинное окончание требует «а»/«я» перед собой,
+    а её нет, более короткие окончания не пробуются.
+
+    Args:
+        rv: Область RV слова
+        endings: Окончания по убыванию длины
+        after_a_ya: Окончания, которые должны идти после «а» или «я» (сама буква остаётся)
+
+    Returns:
+        RV без окончания или None, если окончание не найдено
+    """
+    for ending in endings:
+        if rv.endswith(ending):
+            stem = rv[:-len(ending)]
+            if ending in after_a_ya and not stem.endswith(("а", "я")):
+                return None
+            return stem
+    return None
+
+
+def stem_russian(word: str) -> str:
+    """Snowball-стемминг русского слова"""
+    word = word.replace("ё", "е")
+    rv_start, r2_start = _ru_regions(word)
+    prefix, rv = word[:rv_start], word[rv_start:]
+
+    # Шаг 1
+    stem = _ru_strip(rv, RU_PERFECTIVE_GERUND, RU_PERFECTIVE_GERUND_AFTER_A_YA)
+    if stem is not None:
+        rv = stem
+    else:
+        stem = _ru_strip(rv, RU_REFLEXIVE)
+        if stem is not None:
+            rv = stem
+
+        stem = _ru_strip(rv, RU_ADJECTIVE)
+        if stem is not None:
+            # ADJECTIVAL = [PARTICIPLE] + ADJECTIVE
+            participle = _ru_strip(stem, RU_PARTICIPLE, RU_PARTICIPLE_AFTER_A_YA)
+            rv = participle if participle is not None else stem
+        else:
+            stem = _ru_strip(rv, RU_VERB, RU_VERB_AFTER_A_YA)
+            if stem is None:
+                stem = _ru_strip(rv, RU_NOUN)
+            if stem is not None:
+                rv = stem
+
+    # Шаг 2
+    if rv.endswith("и"):
+        rv = rv[:-1]
+
+    # Шаг 3: словообразовательные суффиксы в R2
+    for ending in RU_DERIVATIONAL:
+        if rv.endswith(ending) and rv_start + len(rv) - len(ending) >= r2_start:
+            rv = rv[:-len(ending)]
+            break
+
+    # Шаг 4
+    if rv.endswith("нн"):
+        rv = rv[:-1]
+    else:
+        stem = _ru_strip(rv, RU_SUPERLATIVE)
+        if stem is not None:
+            rv = stem[:-1] if stem.endswith("нн") else stem
+        elif rv.endswith("ь"):
+            rv = rv[:-1]
+
+    return prefix + rv
+
+
+# ==================== ENGLISH (Porter2) ====================
+
+EN_VOWELS = frozenset("aeiouy")
+EN_DOUBLES = ("bb", "dd", "ff", "gg", "mm", "nn", "pp", "rr", "tt")
+EN_LI_ENDINGS = frozenset("cdeghkmnrt")
+
+EN_EXCEPTIONS = {
+    "skis": "ski", "skies": "sky", "dying": "die", "lying": "lie", "tying": "tie",
+    "idly": "idl", "gently": "gentl", "ugly": "ugli", "early": "earli",
+    "only": "onli", "singly": "singl",
+    "sky": "sky", "news": "news", "howe": "howe",
+    "atlas": "atlas", "cosmos": "cosmos", "bias": "bias", "andes": "andes",
+}
+EN_EXCEPTIONS_1A = frozenset((
+    "inning", "outing", "canning", "herring", "earring",
+    "proceed", "exceed", "succeed",
+))
+
+EN_STEP_2 = (
+    ("ization", "ize"), ("ational", "ate"), ("fulness", "ful"), ("ousness", "ous"),
+    ("iveness", "ive"), ("tional", "tion"), ("biliti", "ble"), ("lessli", "less"),
+    ("entli", "ent"), ("ation", "ate"), ("alism", "al"), ("aliti", "al"),
+    ("ousli", "ous"), ("iviti", "ive"), ("fulli", "ful"), ("enci", "ence"),
+    ("anci", "ance"), ("abli", "able"), ("izer", "ize"), ("ator", "ate"),
+    ("alli", "al"), ("bli", "ble"), ("ogi", "og"), ("li", ""),
+)
+EN_STEP_3 = (
+    ("ational", "ate"), ("tional", "tion"), ("alize", "al"), ("icate", "ic"),
+    ("iciti", "ic"), ("ative", ""), ("ical", "ic"), ("ness", ""), ("ful", ""),
+)
+EN_STEP_4 = (
+    "ement", "ance", "ence", "able", "ible", "ment",
+    "ant", "ent", "ism", "ate", "iti", "ous", "ive", "ize", "ion",
+    "al", "er", "ic",
+)
+
+
+def _en_is_vowel(word: str, i: int) -> bool:
+    return word[i] in EN_VOWELS
+
+
+def _en_regions(word: str) -> tuple[int, int]:
+    """Начала областей R1 и R2 для английского слова"""
+    def next_region(start: int) -> int:
+        for i in range(start + 1, len(word)):
+            if not _en_is_vowel(word, i) and _en_is_vowel(word, i - 1):
+                return i + 1
+        return len(word)
+
+    for prefix in ("gener", "commun", "arsen"):
+        if word.startswith(prefix):
+            r1 = len(prefix)
+            break
+    else:
+        r1 = next_region(0)
+    return r1, next_region(r1)
+
+
+def _en_ends_short_syllable(word: str) -> bool:
+    """Оканчивается ли слово коротким слогом"""
+    if len(word) == 2:
+        return _en_is_vowel(word, 0) and not _en_is_vowel(word, 1)
+    if len(word) >= 3:
+        return (
+            not _en_is_vowel(word, -3)
+            and _en_is_vowel(word, -2)
+            and not _en_is_vowel(word, -1)
+            and word[-1] not in "wxY"
+        )
+    return False
+
+
+def _en_is_short(word: str, r1: int) -> bool:
+    return r1 >= len(word) and _en_ends_short_syllable(word)
+
+
+def _en_has_vowel(part: str) -> bool:
+    return any(ch in EN_VOWELS for ch in part)
+
+
+def stem_english(word: str) -> str:
+    """Snowball (Porter2) стемминг английского слова"""
+    if len(word) <= 2:
+        return word
+    if word in EN_EXCEPTIONS:
+        return EN_EXCEPTIONS[word]
+
+    if word.startswith("'"):
+        word = word[1:]
+    # y в начале слова и после гласной считается согласной
+    chars = list(word)
+    for i, ch in enumerate(chars):
+        if ch == "y" and (i == 0 or chars[i - 1] in EN_VOWELS):
+            chars[i] = "Y"
+    word = "".join(chars)
+
+    r1, r2 = _en_regions(word)
+
+    # Шаг 0
+    for suffix in ("'s'", "'s", "'"):
+        if word.endswith(suffix):
+            word = word[:-len(suffix)]
+            break
+
+    # Шаг 1a
+    if word.endswith("sses"):
+        word = word[:-2]
+    elif word.endswith(("ied", "ies")):
+        word = word[:-2] if len(word) > 4 else word[:-1]
+    elif word.endswith(("us", "ss")):
+        pass
+    elif word.endswith("s") and _en_has_vowel(word[:-2]):
+        word = word[:-1]
+
+    if word in EN_EXCEPTIONS_1A:
+        return word
+
+    # Шаг 1b
+    for suffix in ("eedly", "ingly", "edly", "eed", "ing", "ed"):
+        if word.endswith(suffix):
+            if suffix in ("eed", "eedly"):
+                if len(word) - len(suffix) >= r1:
+                    word = word[:-len(suffix)] + "ee"
+            elif _en_has_vowel(word[:-len(suffix)]):
+                word = word[:-len(suffix)]
+                if word.endswith(("at", "bl", "iz")):
+                    word += "e"
+                elif word.endswith(EN_DOUBLES):
+                    word = word[:-1]
+                elif _en_is_short(word, r1):
+                    word += "e"
+            break
+
+    # Шаг 1c
+    if len(word) > 2 and word[-1] in "yY" and word[-2] not in EN_VOWELS:
+        word = word[:-1] + "i"
+
+    # Шаг 2
+    for suffix, replacement in EN_STEP_2:
+        if word.endswith(suffix):
+            if len(word) - len(suffix) >= r1:
+                if suffix == "ogi":
+                    if word[:-3].endswith("l"):
+                        word = word[:-3] + "og"
+                elif suffix == "li":
+                    if len(word) > 2 and word[-3] in EN_LI_ENDINGS:
+                        word = word[:-2]
+                else:
+                    word = word[:-len(suffix)] + replacement
+            break
+
+    # Шаг 3
+    for suffix, replacement in EN_STEP_3:
+        if word.endswith(suffix):
+            if len(word) - len(suffix) >= r1:
+                if suffix == "ative":
+                    if len(word) - len(suffix) >= r2:
+                        word = word[:-5]
+                else:
+                    word = word[:-len(suffix)] + replacement
+            break
+
+    # Шаг 4
+    for suffix in EN_STEP_4:
+        if word.endswith(suffix):
+            if len(word) - len(suffix) >= r2:
+                if suffix == "ion":
+                    if word[:-3].endswith(("s", "t")):
+                        word = word[:-3]
+                else:
+                    word = word[:-len(suffix)]
+            break
+
+    # Шаг 5
+    if word.endswith("e"):
+        if len(word) - 1 >= r2 or (len(word) - 1 >= r1 and not _en_ends_short_syllable(word[:-1])):
+            word = word[:-1]
+    elif word.endswith("ll") and len(word) - 1 >= r2:
+        word = word[:-1]
+
+    return word.replace("Y", "y")
+
+
+# ==================== DISPATCH ====================
+
+class Stemmer:
+    """
+    Стеммер с ограниченной мемоизацией.
+
+    Русские слова (кириллица) обрабатываются Snowball Russian,
+    латиница — Porter2, остальное (числа, смешанные токены) не меняется.
+    """
+
+    def __init__(self, cache_size: int = 100_000):
+        self._cached_stem = lru_cache(maxsize=cache_size)(self._stem)
+
+    @staticmethod
+    def _stem(word: str) -> str:
+        first = word[0]
+        if "а" <= first <= "я" or first == "ё":
+            return stem_russian(word)
+        if "a" <= first <= "z":
+            return stem_english(word)
+        return word
+
+    def __call__(self, word: str) -> str:
+        return self._cached_stem(word)
+
+    def cache_info(self):
+        """Статистика таблицы мемоизации (hits, misses, maxsize, currsize)"""
+        return self._cached_stem.cache_info()
@@ -0,0 +1,61 @@
+"""
+Tokenizer
+=========
+Токенизация текста для лексического индекса.
+
+Tokenizer применяет к каждому слову подключаемый нормализатор
+(по умолчанию — стеммер), одинаково при индексации и при поиске.
+"""
+
+import re
+from typing import Callable, Optional
+
+from rag.stemmer import Stemmer
+
+WORD_RE = re.compile(r"\b\w+\b")
+
+
+def tokenize(text: str) -> list[str]:
+    """Простая токенизация текста"""
+    # Приводим к нижнему регистру и разбиваем на слова
+    words = WORD_RE.findall(text.lower())
+    # Фильтруем короткие слова
+    return [w for w in words if len(w) > 2]
+
+
+class Tokenizer:
+    """
+    Токенизатор с нормализацией словоформ.
+
+    Args:
+        normalizer: Функция слово → нормальная форма (None — без нормализации)
+        name: Имя конфигурации; сохраняется в манифесте индекса, чтобы
+              индекс перестраивался при смене нормализатора
+    """
+
+    def __init__(self, normalizer: Optional[Callable[[str], str]] = None, name: str = "simple"):
+        self.normalizer = normalizer
+        self.name = name
+
+    def __call__(self, text: str) -> list[str]:
+        words = tokenize(text)
+        if self.normalizer is None:
+            return words
+        normalize = self.normalizer
+        return [normalize(w) for w in words]
+
+
+def create_tokenizer(stemming: bool = True, cache_size: int = 100_000) -> Tokenizer:
+    """
+    Создаёт токенизатор по настройкам.
+
+    Args:
+        stemming: Включить стемминг (Snowball Russian/English)
+        cache_size: Размер таблицы мемоизации стемов
+
+    Returns:
+        Токенизатор
+    """
+    if stemming:
+        return Tokenizer(Stemmer(cache_size), name="snowball")
+    return Tokenizer(name="simple")
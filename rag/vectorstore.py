@@ -2,130 +2,660 @@
 Vector Store Manager (Simplified)
 =================================
 Упрощённая версия хранилища на основе текстового поиска.
-Работает без ChromaDB — используется простой TF-IDF подход.
+Работает без ChromaDB — используется лексический поиск BM25 по инвертированному индексу
+или офлайн dense-поиск по локальным эмбеддингам (RAG_BACKEND=dense),
+или их гибрид с reciprocal-rank fusion (RAG_BACKEND=hybrid).
 
-Для production рекомендуется использовать ChromaDB с правильно скомпилированным hnswlib.
+Хранилище на ChromaDB (RAG_BACKEND=chroma) — см. rag/chroma_store.py.
 """
 
 import os
 import logging
-import json
-import re
-from typing import Optional
-from collections import Counter
-from math import log
+import time
+import asyncio
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from dataclasses import dataclass, replace
+from typing import Awaitable, Callable, Optional
 from dotenv import load_dotenv
 
+from rag.ann import IVFIndex
+from rag.bm25 import BM25Scorer
+from rag.cache import QueryCache
+from rag.chunk_store import ChunkStore
+from rag.chunker import split_text
+from rag.dedup import DedupIndex, MinHasher, NearDuplicateFilter
+from rag.dense import DenseIndex, HashingEmbedder
+from rag.fusion import reciprocal_rank_fusion
+from rag.ingest import ingest_file
+from rag.inverted_index import InvertedIndex
+from rag.manifest import chunking_params, load_manifest, read_manifest, record_ingest, save_manifest, scan_files
+from rag.tokenizer import WORD_RE, create_tokenizer
+from rag.index_storage import ChunkTable, MmapIndex, open_index, write_index, migrate_json_index
+
 load_dotenv()
 
 logger = logging.getLogger(__name__)
 
+# Колбэк прогресса индексации: (обработано файлов, всего файлов)
+ProgressCallback = Callable[[int, int], Awaitable[None]]
+
+# Поддерживаемые бэкенды поиска
+BACKENDS = {"bm25", "dense", "hybrid"}
+
+
+@dataclass(frozen=True)
+class IndexSnapshot:
+    """
+    Неизменяемая версия индекса: чанки + инвертированный индекс.
+    
+    Поиск берёт ссылку на снапшот один раз, поэтому пересборка индекса
+    подменяет его целиком одним присваиванием, не влияя на текущие запросы.
+    """
+    documents: ChunkTable  # элементы — {"id": str, "content": str, "source": str}
+    index: InvertedIndex | MmapIndex  # doc_id = позиция чанка в documents
+    generation: int = 0  # растёт при каждой подмене индекса (инвалидирует кеш)
+    dense: Optional[DenseIndex] = None  # эмбеддинги чанков (только для dense/hybrid)
+    ann: Optional[IVFIndex] = None  # IVF поверх эмбеддингов (только для больших корпусов)
+    dedup: Optional[DedupIndex] = None  # LSH-ключи чанков (только при включённой дедупликации)
+
 
 class VectorStoreManager:
     """Менеджер хранилища документов (упрощённая in-memory версия)"""
     
-    def __init__(self):
+    def __init__(self, persist_dir: Optional[str] = None, backend: Optional[str] = None):
+        """
+        Args:
+            persist_dir: Директория индекса (по умолчанию CHROMA_PERSIST_DIR)
+            backend: Бэкенд поиска из BACKENDS (по умолчанию RAG_BACKEND)
+        """
         # Настройки из окружения
-        self.persist_dir = os.getenv("CHROMA_PERSIST_DIR", "./chroma_db")
+        self.persist_dir = persist_dir or os.getenv("CHROMA_PERSIST_DIR", "./chroma_db")
         self.chunk_size = int(os.getenv("RAG_CHUNK_SIZE", "500"))
         self.chunk_overlap = int(os.getenv("RAG_CHUNK_OVERLAP", "50"))
+        self.index_workers = int(os.getenv("RAG_INDEX_WORKERS", "0")) or None  # None — по числу CPU
+        self.scorer = BM25Scorer(
+            k1=float(os.getenv("RAG_BM25_K1", "1.5")),
+            b=float(os.getenv("RAG_BM25_B", "0.75")),
+            delta=float(os.getenv("RAG_BM25_DELTA", "0.0"))
+        )
+        self.tokenizer = create_tokenizer(
+            stemming=os.getenv("RAG_STEMMING", "true").lower() == "true",
+            cache_size=int(os.getenv("RAG_STEM_CACHE_SIZE", "100000"))
+        )
+        self.cache = QueryCache(
+            max_size=int(os.getenv("RAG_CACHE_SIZE", "256")),
+            ttl_seconds=float(os.getenv("RAG_CACHE_TTL", "600"))
+        )
+        self.backend = (backend or os.getenv("RAG_BACKEND", "bm25")).lower()
+        if self.backend not in BACKENDS:
+            logger.warning(f"Неизвестный RAG_BACKEND={self.backend}, используется bm25")
+            self.backend = "bm25"
+        self.embedder = HashingEmbedder(dim=int(os.getenv("RAG_DENSE_DIM", "1024")))
+        self.ann_min_docs = int(os.getenv("RAG_ANN_MIN_DOCS", "50000"))  # 0 — ANN выключен
+        self.ann_lists = int(os.getenv("RAG_ANN_LISTS", "0")) or None  # None — ~sqrt(числа чанков)
+        self.ann_nprobe = int(os.getenv("RAG_ANN_NPROBE", "0")) or None  # None — четверть списков
+        self.rrf_k = int(os.getenv("RAG_RRF_K", "60"))
+        self.hybrid_depth = int(os.getenv("RAG_HYBRID_DEPTH", "20"))  # кандидатов от каждого ретривера
+        self.dedup_threshold = float(os.getenv("RAG_DEDUP_THRESHOLD", "0.8"))  # 0 — без дедупликации
+        self.hasher = MinHasher()
+        # Лексический ретривер гибридного поиска работает параллельно с dense
+        self._search_pool = ThreadPoolExecutor(max_workers=4, thread_name_prefix="rag-search")
         
-        # In-memory хранилище
-        self.documents: list[dict] = []  # {"id": str, "content": str, "source": str}
-        self.index_file = os.path.join(self.persist_dir, "index.json")
+        # Хранилище: после загрузки с диска — ленивые mmap-структуры,
+        # после индексации — компактные массивы в памяти
+        self._snapshot = IndexSnapshot(documents=ChunkStore(), index=InvertedIndex())
+        self._index_lock = asyncio.Lock()
+        self.index_file = os.path.join(self.persist_dir, "index.bin")
+        self.legacy_index_file = os.path.join(self.persist_dir, "index.json")
+        self.manifest_file = os.path.join(self.persist_dir, "manifest.json")
+        self.embeddings_file = os.path.join(self.persist_dir, "embeddings.npy")
+        self.ann_file = os.path.join(self.persist_dir, "ivf.npz")
+        self.dedup_file = os.path.join(self.persist_dir, "dedup.npy")
         
         # Создаём директорию и загружаем существующий индекс
         os.makedirs(self.persist_dir, exist_ok=True)
         self._load_index()
         
-        logger.info(f"VectorStore инициализирован (simplified): {self.persist_dir}")
+        logger.info(f"VectorStore инициализирован (simplified, {self.backend}): {self.persist_dir}")
+    
+    @property
+    def uses_dense(self) -> bool:
+        """Поддерживаются ли эмбеддинги чанков"""
+        return self.backend in ("dense", "hybrid")
+    
+    @property
+    def uses_dedup(self) -> bool:
+        """Отсеиваются ли почти-дубликаты при индексации"""
+        return self.dedup_threshold > 0
+    
+    @property
+    def is_indexing(self) -> bool:
+        """Идёт ли сейчас индексация"""
+        return self._index_lock.locked()
+    
+    @property
+    def documents(self) -> ChunkTable:
+        """Чанки текущей версии индекса"""
+        return self._snapshot.documents
     
     def _load_index(self):
-        """Загружает индекс из файла"""
+        """Открывает бинарный индекс через mmap (при необходимости мигрирует index.json)"""
+        if not os.path.exists(self.index_file) and os.path.exists(self.legacy_index_file):
+            migrate_json_index(self.legacy_index_file, self.index_file, self._tokenize)
+        
         if os.path.exists(self.index_file):
             try:
-                with open(self.index_file, "r", encoding="utf-8") as f:
-                    self.documents = json.load(f)
-                logger.info(f"Загружено {len(self.documents)} чанков из индекса")
+                documents, index = open_index(self.index_file)
+                self._snapshot = IndexSnapshot(documents=documents, index=index)
+                logger.info(f"Загружено {len(documents)} чанков из индекса")
             except Exception as e:
                 logger.error(f"Ошибка загрузки индекса: {e}")
-                self.documents = []
+                self._snapshot = IndexSnapshot(documents=ChunkStore(), index=InvertedIndex())
+        
+        if self.uses_dense:
+            self._check_embeddings()
+            self._check_ann()
+        if self.uses_dedup:
+            self._check_dedup()
+        if self.documents:
+            self._check_tokenizer()
+    
+    def _check_embeddings(self):
+        """Открывает эмбеддинги через mmap; пересчитывает их, если они устарели"""
+        manifest = self._read_manifest()
+        dense = DenseIndex.load(self.embeddings_file)
+        if (
+            dense is not None
+            and dense.n_docs == len(self.documents)
+            and manifest.get("embedder") == self.embedder.name
+        ):
+            self._snapshot = replace(self._snapshot, dense=dense)
+            return
+        
+        logger.info(f"Эмбеддинги отсутствуют или устарели — пересчитываем ({self.embedder.name})")
+        dense = DenseIndex(self.embedder.embed(doc["content"] for doc in self.documents))
+        self._snapshot = replace(self._snapshot, dense=dense)
+        self._save_embeddings(dense)
+        if self.documents:
+            self._save_manifest(manifest.get("files", {}))
+    
+    def _check_dedup(self):
+        """Открывает LSH-ключи чанков; пересчитывает их, если они устарели"""
+        manifest = self._read_manifest()
+        dedup = DedupIndex.load(self.dedup_file)
+        if (
+            dedup is not None
+            and dedup.n_docs == len(self.documents)
+            and manifest.get("dedup") == self.hasher.name
+        ):
+            self._snapshot = replace(self._snapshot, dedup=dedup)
+            return
+        
+        # Уже проиндексированные дубликаты не удаляются — ключи нужны для новых чанков
+        logger.info(f"Ключи дедупликации отсутствуют или устарели — пересчитываем ({self.hasher.name})")
+        dedup = DedupIndex.build((doc["content"] for doc in self.documents), self.hasher)
+        self._snapshot = replace(self._snapshot, dedup=dedup)
+        self._save_dedup(dedup)
+        if self.documents:
+            self._save_manifest(manifest.get("files", {}))
+    
+    def _check_ann(self):
+        """Загружает IVF-индекс; строит его заново, если он нужен, но отсутствует или устарел"""
+        dense = self._snapshot.dense
+        loaded = IVFIndex.load(self.ann_file)
+        if loaded is not None and (
+            loaded.n_docs != dense.n_docs or loaded.centroids.shape[1] != self.embedder.dim
+        ):
+            loaded = None
+        
+        ann = self._update_ann(loaded, set(), dense.vectors[:0], dense)
+        if ann is not None:
+            ann.prepare(dense.vectors)
+        self._snapshot = replace(self._snapshot, ann=ann)
+        if ann is not loaded:
+            self._save_ann(ann)
+    
+    def _update_ann(
+        self,
+        ann: Optional[IVFIndex],
+        stale_ids: set[int],
+        new_vectors,
+        dense: DenseIndex
+    ) -> Optional[IVFIndex]:
+        """
+        Поддерживает IVF-индекс в актуальном состоянии.
+        
+        Удалённые векторы вычёркиваются, новые распределяются по существующим
+        спискам; центроиды переобучаются, только когда корпус вырос более чем
+        вдвое с момента обучения.
+        
+        Args:
+            ann: Текущий IVF-индекс или None
+            stale_ids: Удалённые doc_id
+            new_vectors: Векторы добавленных чанков
+            dense: Итоговый dense-индекс
+            
+        Returns:
+            IVF-индекс или None, если корпус мал для ANN (точный поиск)
+        """
+        if not self.ann_min_docs or dense.n_docs < self.ann_min_docs:
+            return None
+        
+        if ann is not None:
+            ann = ann.without(stale_ids).extended(new_vectors)
+            if ann.n_docs == dense.n_docs and dense.n_docs <= 2 * ann.trained_size:
+                return ann
+        
+        return IVFIndex.build(dense.vectors, n_lists=self.ann_lists)
+    
+    def _check_tokenizer(self):
+        """Перестраивает postings, если индекс построен другим токенизатором"""
+        manifest = self._read_manifest()
+        if manifest.get("tokenizer", "simple") == self.tokenizer.name:
+            return
+        
+        logger.info(f"Токенизатор изменился на {self.tokenizer.name} — перестраиваем postings")
+        documents = ChunkStore.copy_of(self.documents)
+        snapshot = replace(
+            self._snapshot,
+            documents=documents,
+            index=InvertedIndex.build((doc["content"] for doc in documents), self._tokenize)
+        )
+        self._save_index(snapshot)
+        self._snapshot = snapshot
+        self._save_manifest(manifest.get("files", {}))
     
-    def _save_index(self):
-        """Сохраняет индекс в файл"""
+    def _swap_snapshot(self, snapshot: IndexSnapshot):
+        """Атомарно подменяет текущую версию индекса, увеличивая поколение"""
+        self._snapshot = replace(snapshot, generation=self._snapshot.generation + 1)
+        self.cache.clear()
+    
+    def _save_index(self, snapshot: IndexSnapshot):
+        """Сохраняет индекс в бинарный файл (и эмбеддинги, если они есть)"""
         try:
-            with open(self.index_file, "w", encoding="utf-8") as f:
-                json.dump(self.documents, f, ensure_ascii=False, indent=2)
+            write_index(self.index_file, snapshot.documents, snapshot.index)
         except Exception as e:
             logger.error(f"Ошибка сохранения индекса: {e}")
+        if snapshot.dense is not None:
+            self._save_embeddings(snapshot.dense)
+            self._save_ann(snapshot.ann)
+        if snapshot.dedup is not None:
+            self._save_dedup(snapshot.dedup)
+    
+    def _save_embeddings(self, dense: DenseIndex):
+        """Сохраняет матрицу эмбеддингов в .npy"""
+        try:
+            dense.save(self.embeddings_file)
+        except Exception as e:
+            logger.error(f"Ошибка сохранения эмбеддингов: {e}")
+    
+    def _save_dedup(self, dedup: DedupIndex):
+        """Сохраняет LSH-ключи чанков в .npy"""
+        try:
+            dedup.save(self.dedup_file)
+        except Exception as e:
+            logger.error(f"Ошибка сохранения ключей дедупликации: {e}")
     
-    async def index_documents(self, data_dir: str) -> dict:
+    def _save_ann(self, ann: Optional[IVFIndex]):
+        """Сохраняет IVF-индекс (или удаляет файл, если поиск точный)"""
+        try:
+            if ann is not None:
+                ann.save(self.ann_file)
+            elif os.path.exists(self.ann_file):
+                os.remove(self.ann_file)
+        except Exception as e:
+            logger.error(f"Ошибка сохранения ANN-индекса: {e}")
+    
+    def _read_manifest(self) -> dict:
+        """Читает манифест как есть (пустой словарь, если его нет или он повреждён)"""
+        return read_manifest(self.manifest_file)
+    
+    def _load_manifest(self) -> dict[str, dict]:
+        """
+        Загружает манифест проиндексированных файлов (см. rag/manifest.py).
+        
+        Манифест считается валидным, только если параметры чанкинга и
+        токенизатор не менялись, а число чанков в нём совпадает с загруженным
+        индексом. Иначе возвращается пустой манифест — это означает полную
+        переиндексацию. Эмбеддинги и ключи дедупликации при смене модели
+        пересчитываются отдельно (_check_embeddings, _check_dedup).
+        
+        Returns:
+            Словарь {имя файла: {"mtime", "size", "sha256", "chunks"}}
+        """
+        return load_manifest(self.manifest_file, self._index_params(), len(self.documents))
+    
+    def _save_manifest(self, files: dict[str, dict]):
+        """Сохраняет манифест проиндексированных файлов"""
+        save_manifest(self.manifest_file, {
+            **self._index_params(),
+            # None — эмбеддинги не поддерживались и могут не совпадать с чанками
+            "embedder": self.embedder.name if self.uses_dense else None,
+            "dedup": self.hasher.name if self.uses_dedup else None,
+        }, files)
+    
+    def _index_params(self) -> dict:
+        """Параметры, при смене которых индекс собирается заново"""
+        return {**chunking_params(self.chunk_size, self.chunk_overlap), "tokenizer": self.tokenizer.name}
+    
+    async def index_documents(
+        self,
+        data_dir: str,
+        progress: Optional[ProgressCallback] = None
+    ) -> dict:
         """
-        Индексирует документы из указанной директории.
+        Инкрементально индексирует документы из указанной директории.
+        
+        По манифесту (mtime, размер, sha256) определяются добавленные,
+        изменённые и удалённые файлы; перечанкуются только они, остальные
+        файлы и их postings не трогаются. Чтение и чанкинг выполняются
+        в пуле процессов, сборка индекса — в отдельном потоке, так что
+        event loop не блокируется, а поиск до окончания сборки идёт
+        по предыдущей версии индекса.
         
         Args:
             data_dir: Путь к директории с документами
+            progress: Колбэк прогресса (обработано файлов, всего файлов)
             
         Returns:
             Статистика индексации
         """
+        async with self._index_lock:
+            return await self._index_documents(data_dir, progress)
+    
+    async def _index_documents(
+        self,
+        data_dir: str,
+        progress: Optional[ProgressCallback]
+    ) -> dict:
+        """Индексация под блокировкой (см. index_documents)"""
+        stats = {
+            "files": 0, "chunks": 0,
+            "added": 0, "updated": 0, "removed": 0, "skipped": 0,
+            "restored": 0,  # не изменились, перечанкованы ради возврата дубликатов
+            "duplicates": [],
+            "total_chunks": len(self.documents)
+        }
+        
         if not os.path.exists(data_dir):
             os.makedirs(data_dir)
             logger.info(f"Создана директория {data_dir}")
-            return {"files": 0, "chunks": 0}
+            return stats
         
-        # Поддерживаемые расширения
-        supported_extensions = {".txt", ".md"}
+        old_files = await asyncio.to_thread(self._load_manifest)
         
-        files_processed = 0
-        chunks_created = 0
+        # Быстрая проверка по mtime/размеру без чтения файлов
+        new_files, to_ingest, stats["skipped"] = scan_files(data_dir, old_files)
         
-        # Очищаем старые документы
-        self.documents = []
+        # Читаем и чанкуем кандидатов параллельно в пуле процессов
+        changed: dict[str, list[str]] = {}  # имя файла → чанки
+        forced: set[str] = set()  # файлы, перечанкуемые без проверки sha256
+        pool: Optional[ProcessPoolExecutor] = None
         
-        # Перебираем файлы
-        for filename in os.listdir(data_dir):
-            ext = os.path.splitext(filename)[1].lower()
-            if ext not in supported_extensions:
-                continue
+        try:
+            while True:
+                if to_ingest:
+                    pool = pool or ProcessPoolExecutor(max_workers=self.index_workers)
+                    await self._ingest_files(
+                        pool, data_dir, to_ingest, forced, old_files, new_files, changed, stats, progress
+                    )
+                
+                # Дубликаты, отброшенные в пользу чанков удаляемых/изменённых файлов,
+                # нужно вернуть — такие файлы перечанковываются целиком
+                stale_sources = (set(old_files) - set(new_files)) | (set(changed) & set(old_files))
+                to_ingest = [
+                    filename for filename, entry in new_files.items()
+                    if filename not in changed and filename not in forced
+                    and stale_sources & set(entry.get("dedup_sources", ()))
+                ]
+                if not to_ingest:
+                    break
+                forced.update(to_ingest)
+                stats["skipped"] -= len(to_ingest)
+        finally:
+            if pool is not None:
+                pool.shutdown()
+        
+        removed_sources = set(old_files) - set(new_files)
+        
+        for filename in changed:
+            if filename in forced:
+                stats["restored"] += 1
+            elif filename in old_files:
+                stats["updated"] += 1
+            else:
+                stats["added"] += 1
+        stats["removed"] = len(removed_sources)
+        
+        if changed or stale_sources or not old_files:
+            # Собираем новую версию индекса вне event loop и подменяем атомарно
+            snapshot, duplicates = await asyncio.to_thread(
+                self._build_snapshot,
+                self._snapshot if old_files else None,
+                stale_sources,
+                changed
+            )
+            await asyncio.to_thread(self._save_index, snapshot)
+            self._swap_snapshot(snapshot)
             
-            filepath = os.path.join(data_dir, filename)
+            self._record_duplicates(new_files, changed, duplicates)
+            stats["duplicates"] = duplicates
+            for filename in changed:
+                if new_files[filename]["chunks"]:
+                    stats["files"] += 1
+                    stats["chunks"] += new_files[filename]["chunks"]
+        
+        if new_files != old_files:
+            await asyncio.to_thread(self._save_manifest, new_files)
+        
+        stats["total_chunks"] = len(self.documents)
+        
+        logger.info(
+            f"Индексация: +{stats['added']} ~{stats['updated']} "
+            f"-{stats['removed']} ={stats['skipped']} ↺{stats['restored']}"
+        )
+        
+        return stats
+    
+    async def _ingest_files(
+        self,
+        pool: ProcessPoolExecutor,
+        data_dir: str,
+        filenames: list[str],
+        forced: set[str],
+        old_files: dict[str, dict],
+        new_files: dict[str, dict],
+        changed: dict[str, list[str]],
+        stats: dict,
+        progress: Optional[ProgressCallback]
+    ):
+        """
+        Читает и чанкует файлы в пуле процессов, обновляя new_files и changed.
+        
+        Args:
+            pool: Пул процессов
+            data_dir: Директория с документами
+            filenames: Файлы для обработки
+            forced: Файлы, которые нужно перечанковать, даже если sha256 не изменился
+            old_files: Манифест до индексации
+            new_files: Манифест после индексации (дополняется)
+            changed: Чанки изменённых файлов (дополняется)
+            stats: Статистика индексации
+            progress: Колбэк прогресса
+        """
+        tasks = [
+            self._ingest(
+                pool, data_dir, filename,
+                None if filename in forced else old_files.get(filename, {}).get("sha256")
+            )
+            for filename in filenames
+        ]
+        
+        for done, task in enumerate(asyncio.as_completed(tasks), 1):
+            filename, result = await task
+            if record_ingest(filename, result, old_files, new_files, changed):
+                stats["skipped"] += 1
             
-            try:
-                # Читаем файл
-                with open(filepath, "r", encoding="utf-8") as f:
-                    content = f.read()
-                
-                if not content.strip():
-                    continue
-                
-                # Разбиваем на чанки
-                chunks = self._split_text(content)
-                
-                # Добавляем чанки
-                for i, chunk in enumerate(chunks):
-                    self.documents.append({
-                        "id": f"{filename}_{i}",
-                        "content": chunk,
-                        "source": filename
-                    })
-                
-                files_processed += 1
-                chunks_created += len(chunks)
-                
-                logger.info(f"Проиндексирован файл {filename}: {len(chunks)} чанков")
-                
-            except Exception as e:
-                logger.error(f"Ошибка индексации файла {filename}: {e}")
-                continue
+            if progress:
+                try:
+                    await progress(done, len(filenames))
+                except Exception as e:
+                    logger.warning(f"Ошибка колбэка прогресса: {e}")
+    
+    @staticmethod
+    def _record_duplicates(
+        new_files: dict[str, dict],
+        changed: dict[str, list[str]],
+        duplicates: list[dict]
+    ):
+        """
+        Записывает в манифест результат дедупликации изменённых файлов.
         
-        # Сохраняем индекс
-        self._save_index()
+        "chunks" — число чанков, попавших в индекс; "dedup_sources" — другие
+        файлы, в пользу чанков которых отброшены дубликаты (при их изменении
+        этот файл перечанковывается).
+        """
+        for filename in changed:
+            entry = new_files[filename]
+            entry.pop("dedup_sources", None)
+            entry["duplicates"] = 0
         
-        return {
-            "files": files_processed,
-            "chunks": chunks_created
-        }
+        for duplicate in duplicates:
+            entry = new_files[duplicate["source"]]
+            entry["chunks"] -= 1
+            entry["duplicates"] += 1
+            if duplicate["duplicate_source"] != duplicate["source"]:
+                sources = entry.setdefault("dedup_sources", [])
+                if duplicate["duplicate_source"] not in sources:
+                    sources.append(duplicate["duplicate_source"])
+    
+    async def _ingest(
+        self,
+        pool: ProcessPoolExecutor,
+        data_dir: str,
+        filename: str,
+        known_sha256: Optional[str]
+    ) -> tuple[str, Optional[dict]]:
+        """
+        Читает и чанкует файл в пуле процессов.
+        
+        Returns:
+            Кортеж (имя файла, результат ingest_file или None при ошибке)
+        """
+        loop = asyncio.get_running_loop()
+        try:
+            result = await loop.run_in_executor(
+                pool,
+                ingest_file,
+                os.path.join(data_dir, filename),
+                known_sha256,
+                self.chunk_size,
+                self.chunk_overlap
+            )
+            return filename, result
+        except Exception as e:
+            logger.error(f"Ошибка индексации файла {filename}: {e}")
+            return filename, None
+    
+    def _build_snapshot(
+        self,
+        base: Optional[IndexSnapshot],
+        stale_sources: set[str],
+        changed: dict[str, list[str]]
+    ) -> tuple[IndexSnapshot, list[dict]]:
+        """
+        Собирает новую версию индекса (выполняется в отдельном потоке).
+        
+        Почти-дубликаты уже проиндексированных (или принятых ранее в этой
+        сборке) чанков в индекс не попадают.
+        
+        Args:
+            base: Текущий снапшот или None для сборки с нуля
+            stale_sources: Источники, чанки которых нужно удалить
+            changed: Новые чанки по источникам
+            
+        Returns:
+            Кортеж (новый снапшот, отброшенные дубликаты)
+        """
+        if base is None:
+            documents = ChunkStore()
+            index = InvertedIndex()
+            dense = None
+            ann = None
+            dedup = None
+        else:
+            documents = ChunkStore.copy_of(base.documents)
+            if isinstance(base.index, MmapIndex):
+                index = base.index.to_inverted_index()
+            else:
+                index = base.index.copy()
+            dense = base.dense
+            ann = base.ann
+            dedup = base.dedup
+        
+        stale_ids: set[int] = set()
+        if self.uses_dense and dense is None:
+            dense = DenseIndex.empty(self.embedder.dim)
+        if self.uses_dedup and dedup is None:
+            dedup = DedupIndex.empty(self.hasher.bands)
+        
+        # Удаляем чанки удалённых и изменённых файлов
+        if stale_sources:
+            stale_ids = {
+                doc_id for doc_id in range(len(documents))
+                if documents.source_of(doc_id) in stale_sources
+            }
+            documents.remove(stale_ids)
+            index.remove_documents(stale_ids)
+            if dense is not None:
+                dense = dense.without(stale_ids)
+            if dedup is not None:
+                dedup = dedup.without(stale_ids)
+        
+        dedup_filter = None
+        if dedup is not None:
+            dedup_filter = NearDuplicateFilter(
+                self.hasher, dedup, self.dedup_threshold,
+                lambda doc_id: documents[doc_id]["content"]
+            )
+        
+        # Добавляем чанки новых и изменённых файлов
+        new_chunks: list[str] = []
+        duplicates: list[dict] = []
+        for filename, chunks in changed.items():
+            kept = 0
+            for i, chunk in enumerate(chunks):
+                if dedup_filter is not None:
+                    match, band_keys = dedup_filter.find(chunk)
+                    if match is not None:
+                        doc_id, similarity = match
+                        duplicates.append({
+                            "id": f"{filename}_{i}",
+                            "source": filename,
+                            "duplicate_of": documents[doc_id]["id"],
+                            "duplicate_source": documents.source_of(doc_id),
+                            "similarity": similarity
+                        })
+                        continue
+                    dedup_filter.add(len(documents), band_keys)
+                documents.append(filename, i, chunk)
+                index.add_document(self._tokenize(chunk))
+                new_chunks.append(chunk)
+                kept += 1
+            
+            logger.info(f"Проиндексирован файл {filename}: {kept} чанков из {len(chunks)}")
+        
+        if dense is not None:
+            new_vectors = self.embedder.embed(new_chunks)
+            dense = dense.extended(new_vectors)
+            ann = self._update_ann(ann, stale_ids, new_vectors, dense)
+            if ann is not None:
+                ann.prepare(dense.vectors)
+        if dedup_filter is not None:
+            dedup = dedup_filter.result()
+        
+        snapshot = IndexSnapshot(documents=documents, index=index, dense=dense, ann=ann, dedup=dedup)
+        return snapshot, duplicates
     
     def _split_text(self, text: str) -> list[str]:
         """
@@ -137,124 +667,245 @@ class VectorStoreManager:
         Returns:
             Список чанков
         """
-        chunks = []
-        paragraphs = text.split("\n\n")
-        current_chunk = ""
-        
-        for para in paragraphs:
-            para = para.strip()
-            if not para:
-                continue
-            
-            if len(current_chunk) + len(para) + 2 <= self.chunk_size:
-                if current_chunk:
-                    current_chunk += "\n\n"
-                current_chunk += para
-            else:
-                if current_chunk:
-                    chunks.append(current_chunk)
-                
-                if len(para) > self.chunk_size:
-                    sentences = para.replace(". ", ".|").split("|")
-                    current_chunk = ""
-                    for sentence in sentences:
-                        if len(current_chunk) + len(sentence) + 1 <= self.chunk_size:
-                            if current_chunk:
-                                current_chunk += " "
-                            current_chunk += sentence
-                        else:
-                            if current_chunk:
-                                chunks.append(current_chunk)
-                            current_chunk = sentence
-                else:
-                    current_chunk = para
-        
-        if current_chunk:
-            chunks.append(current_chunk)
-        
-        return chunks
+        return split_text(text, self.chunk_size, self.chunk_overlap)
     
     def _tokenize(self, text: str) -> list[str]:
-        """Простая токенизация текста"""
-        # Приводим к нижнему регистру и разбиваем на слова
-        text = text.lower()
-        words = re.findall(r'\b\w+\b', text)
-        # Фильтруем короткие слова
-        return [w for w in words if len(w) > 2]
-    
-    def _calculate_relevance(self, query_tokens: list[str], doc_content: str) -> float:
+        """Токенизация текста (одинаковая при индексации и поиске)"""
+        return self.tokenizer(text)
+    
+    def search(self, query: str, n_results: int = 3) -> dict:
         """
-        Вычисляет релевантность документа запросу (простой TF-IDF подобный скор).
+        Поиск релевантных документов.
         
         Args:
-            query_tokens: Токены запроса
-            doc_content: Содержимое документа
+            query: Поисковый запрос
+            n_results: Количество результатов
             
         Returns:
-            Скор релевантности
+            Результаты поиска в формате ChromaDB и "timings" — задержка
+            каждой стадии (lexical, dense, fusion или cache) в миллисекундах
         """
-        doc_tokens = self._tokenize(doc_content)
-        if not doc_tokens:
-            return 0.0
+        # Одна ссылка на снапшот на весь запрос — пересборка индекса его не затронет
+        snapshot = self._snapshot
+        if not snapshot.documents:
+            return empty_result()
+        
+        query_tokens, cache_key = self._prepare_query(query, n_results)
+        if cache_key is None:
+            return empty_result()
         
-        doc_counter = Counter(doc_tokens)
-        score = 0.0
+        # Повторные запросы с тем же набором токенов отдаём из кеша
+        started = time.perf_counter()
+        cached = self.cache.get(cache_key, snapshot.generation)
+        if cached is not None:
+            return {**cached, "timings": {"cache": elapsed_ms(started)}}
         
-        for token in query_tokens:
-            if token in doc_counter:
-                # TF компонент
-                tf = doc_counter[token] / len(doc_tokens)
-                # Упрощённый IDF (бонус за редкие слова)
-                idf = 1.0 + log(1.0 + 1.0 / (1.0 + doc_counter[token]))
-                score += tf * idf
+        timings: dict[str, float] = {}
+        if self.backend == "hybrid":
+            depth = max(n_results, self.hybrid_depth)
+            # Лексический поиск — в пуле потоков, dense — в текущем потоке
+            lexical = self._search_pool.submit(
+                self._timed, timings, "lexical", self._lexical_top_k, snapshot, query_tokens, depth
+            )
+            dense_hits = self._timed(timings, "dense", self._dense_top_k, snapshot, query, depth)
+            lexical_hits = lexical.result()
+            
+            started = time.perf_counter()
+            top_hits = reciprocal_rank_fusion([lexical_hits, dense_hits], self.rrf_k)[:n_results]
+            timings["fusion"] = elapsed_ms(started)
+        elif self.backend == "dense":
+            top_hits = self._timed(timings, "dense", self._dense_top_k, snapshot, query, n_results)
+        else:
+            top_hits = self._timed(timings, "lexical", self._lexical_top_k, snapshot, query_tokens, n_results)
         
-        return score
+        result = self._build_result(snapshot, top_hits, query_tokens)
+        self.cache.put(cache_key, snapshot.generation, result)
+        
+        logger.debug(
+            f"Поиск ({self.backend}): "
+            + ", ".join(f"{stage} {ms:.1f} мс" for stage, ms in timings.items())
+        )
+        return {**result, "timings": timings}
     
-    def search(self, query: str, n_results: int = 3) -> dict:
+    def search_many(self, queries: list[str], n_results: int = 3) -> list[dict]:
         """
-        Поиск релевантных документов.
+        Пакетный поиск по нескольким запросам.
+        
+        Запросы токенизируются за один проход; postings общих терминов
+        обходятся один раз с накоплением скоров в NumPy, а dense-скоры
+        всех запросов считаются одним матричным произведением. Запросы,
+        уже лежащие в кеше, не пересчитываются.
         
         Args:
-            query: Поисковый запрос
-            n_results: Количество результатов
+            queries: Поисковые запросы
+            n_results: Количество результатов на запрос
             
         Returns:
-            Результаты поиска в формате ChromaDB
+            Результаты в формате search для каждого запроса (в том же порядке)
         """
-        if not self.documents:
-            return {"documents": [[]], "metadatas": [[]], "distances": [[]]}
+        snapshot = self._snapshot
+        if not snapshot.documents:
+            return [empty_result() for _ in queries]
         
-        query_tokens = self._tokenize(query)
-        if not query_tokens:
-            return {"documents": [[]], "metadatas": [[]], "distances": [[]]}
+        results: list[Optional[dict]] = [None] * len(queries)
+        pending: dict[tuple, list[int]] = {}  # ключ кеша → номера запросов
+        prepared: dict[tuple, tuple[str, list[str]]] = {}  # ключ кеша → (запрос, токены)
         
-        # Вычисляем релевантность для каждого документа
-        scored_docs = []
-        for doc in self.documents:
-            score = self._calculate_relevance(query_tokens, doc["content"])
-            if score > 0:
-                scored_docs.append((doc, score))
+        for i, query in enumerate(queries):
+            started = time.perf_counter()
+            query_tokens, cache_key = self._prepare_query(query, n_results)
+            if cache_key is None:
+                results[i] = empty_result()
+                continue
+            
+            cached = self.cache.get(cache_key, snapshot.generation)
+            if cached is not None:
+                results[i] = {**cached, "timings": {"cache": elapsed_ms(started)}}
+                continue
+            
+            pending.setdefault(cache_key, []).append(i)
+            prepared.setdefault(cache_key, (query, query_tokens))
         
-        # Сортируем по релевантности
-        scored_docs.sort(key=lambda x: x[1], reverse=True)
+        if pending:
+            texts = [query for query, _ in prepared.values()]
+            token_lists = [query_tokens for _, query_tokens in prepared.values()]
+            
+            timings: dict[str, float] = {}
+            if self.backend == "hybrid":
+                depth = max(n_results, self.hybrid_depth)
+                lexical = self._search_pool.submit(
+                    self._timed, timings, "lexical", self._lexical_top_k_many, snapshot, token_lists, depth
+                )
+                dense_hits = self._timed(timings, "dense", self._dense_top_k_many, snapshot, texts, depth)
+                lexical_hits = lexical.result()
+                
+                started = time.perf_counter()
+                all_hits = [
+                    reciprocal_rank_fusion([lexical, dense], self.rrf_k)[:n_results]
+                    for lexical, dense in zip(lexical_hits, dense_hits)
+                ]
+                timings["fusion"] = elapsed_ms(started)
+            elif self.backend == "dense":
+                all_hits = self._timed(timings, "dense", self._dense_top_k_many, snapshot, texts, n_results)
+            else:
+                all_hits = self._timed(
+                    timings, "lexical", self._lexical_top_k_many, snapshot, token_lists, n_results
+                )
+            
+            for cache_key, top_hits, query_tokens in zip(pending, all_hits, token_lists):
+                result = self._build_result(snapshot, top_hits, query_tokens)
+                self.cache.put(cache_key, snapshot.generation, result)
+                for i in pending[cache_key]:
+                    results[i] = {**result, "timings": timings}
+            
+            logger.debug(
+                f"Пакетный поиск ({self.backend}, {len(pending)} запросов): "
+                + ", ".join(f"{stage} {ms:.1f} мс" for stage, ms in timings.items())
+            )
         
-        # Берём топ-N
-        top_docs = scored_docs[:n_results]
+        return results
+    
+    def _prepare_query(self, query: str, n_results: int) -> tuple[list[str], Optional[tuple]]:
+        """
+        Токенизирует запрос и строит ключ кеша.
+        
+        Returns:
+            Кортеж (токены для BM25, ключ кеша или None для пустого запроса)
+        """
+        if self.backend == "dense":
+            words = WORD_RE.findall(query.lower())
+            return [], (("dense", tuple(sorted(words)), n_results) if words else None)
         
-        if not top_docs:
-            return {"documents": [[]], "metadatas": [[]], "distances": [[]]}
+        query_tokens = self._tokenize(query)
+        if self.backend == "bm25":
+            return query_tokens, (("bm25", frozenset(query_tokens), n_results) if query_tokens else None)
         
-        # Формируем результат в формате ChromaDB
-        documents = [[doc["content"] for doc, _ in top_docs]]
-        metadatas = [[{"source": doc["source"]} for doc, _ in top_docs]]
-        distances = [[1.0 - score for _, score in top_docs]]  # Инвертируем скор в "расстояние"
+        words = WORD_RE.findall(query.lower())
+        return query_tokens, ((self.backend, tuple(sorted(words)), n_results) if words else None)
+    
+    def _build_result(
+        self,
+        snapshot: IndexSnapshot,
+        top_hits: list[tuple[int, float]],
+        query_tokens: list[str]
+    ) -> dict:
+        """Переводит (doc_id, скор) в результат формата ChromaDB"""
+        if self.backend == "hybrid":
+            # Максимальный RRF-скор — первое место у обоих ретриверов
+            best = 2.0 / (self.rrf_k + 1)
+            distances = [1.0 - score / best for _, score in top_hits]
+        elif self.backend == "dense":
+            # Косинус нормированных векторов → косинусное расстояние
+            distances = [max(0.0, 1.0 - score) for _, score in top_hits]
+        elif top_hits:
+            # Доля от наибольшего скора, достижимого для запроса в этом индексе
+            # (BM25Scorer.max_score): линейна по скору, а шкала не зависит от
+            # размера коллекции
+            best = self.scorer.max_score(snapshot.index, query_tokens)
+            distances = [max(0.0, 1.0 - score / best) for _, score in top_hits]
+        else:
+            distances = []
         
+        top_docs = [snapshot.documents[doc_id] for doc_id, _ in top_hits]
         return {
-            "documents": documents,
-            "metadatas": metadatas,
-            "distances": distances
+            "documents": [[doc["content"] for doc in top_docs]],
+            "metadatas": [[{"source": doc["source"]} for doc in top_docs]],
+            "distances": [distances]
         }
     
+    @staticmethod
+    def _timed(timings: dict[str, float], stage: str, fn, *args):
+        """Вызывает fn(*args), записывая его задержку в timings[stage]"""
+        started = time.perf_counter()
+        try:
+            return fn(*args)
+        finally:
+            timings[stage] = elapsed_ms(started)
+    
+    def _lexical_top_k(
+        self,
+        snapshot: IndexSnapshot,
+        query_tokens: list[str],
+        k: int
+    ) -> list[tuple[int, float]]:
+        """Топ-k по BM25 (MaxScore)"""
+        if not query_tokens:
+            return []
+        return self.scorer.top_k(snapshot.index, query_tokens, k)
+    
+    def _lexical_top_k_many(
+        self,
+        snapshot: IndexSnapshot,
+        token_lists: list[list[str]],
+        k: int
+    ) -> list[list[tuple[int, float]]]:
+        """Топ-k по BM25 для пачки запросов (общий обход postings)"""
+        return self.scorer.top_k_many(snapshot.index, token_lists, k)
+    
+    def _dense_top_k(self, snapshot: IndexSnapshot, query: str, k: int) -> list[tuple[int, float]]:
+        """Топ-k по эмбеддингам: IVF для больших корпусов, иначе точный перебор"""
+        query_vector = self.embedder.embed_one(query)
+        if snapshot.ann is not None:
+            return snapshot.ann.search(snapshot.dense.vectors, query_vector, k, self.ann_nprobe)
+        # Одно матрично-векторное произведение + argpartition
+        return snapshot.dense.search(query_vector, k)
+    
+    def _dense_top_k_many(
+        self,
+        snapshot: IndexSnapshot,
+        queries: list[str],
+        k: int
+    ) -> list[list[tuple[int, float]]]:
+        """Топ-k по эмбеддингам для пачки запросов"""
+        query_vectors = self.embedder.embed(queries)
+        if snapshot.ann is not None:
+            return [
+                snapshot.ann.search(snapshot.dense.vectors, query_vector, k, self.ann_nprobe)
+                for query_vector in query_vectors
+            ]
+        # Одно матричное произведение на все запросы
+        return snapshot.dense.search_many(query_vectors, k)
+    
     def get_stats(self) -> dict:
         """
         Возвращает статистику базы знаний.
@@ -262,12 +913,18 @@ class VectorStoreManager:
         Returns:
             Словарь со статистикой
         """
-        sources = set(doc["source"] for doc in self.documents)
+        documents = self.documents
         return {
-            "total_chunks": len(self.documents),
-            "sources": len(sources)
+            "total_chunks": len(documents),
+            "sources": len(documents.sources),
+            "generation": self._snapshot.generation,
+            **self.cache.get_stats()
         }
     
+    def close(self):
+        """Освобождает потоки поиска (индекс после этого не используется)"""
+        self._search_pool.shutdown(wait=False)
+    
     def clear(self) -> bool:
         """
         Очищает хранилище.
@@ -276,10 +933,27 @@ class VectorStoreManager:
             True если успешно
         """
         try:
-            self.documents = []
-            self._save_index()
+            snapshot = IndexSnapshot(
+                documents=ChunkStore(),
+                index=InvertedIndex(),
+                dense=DenseIndex.empty(self.embedder.dim) if self.uses_dense else None
+            )
+            self._save_index(snapshot)
+            self._swap_snapshot(snapshot)
+            if os.path.exists(self.manifest_file):
+                os.remove(self.manifest_file)
             logger.info("Хранилище очищено")
             return True
         except Exception as e:
             logger.error(f"Ошибка очистки: {e}")
             return False
+
+
+def empty_result() -> dict:
+    """Пустой результат поиска в формате ChromaDB"""
+    return {"documents": [[]], "metadatas": [[]], "distances": [[]]}
+
+
+def elapsed_ms(started: float) -> float:
+    """Миллисекунды с момента started (time.perf_counter)"""
+    return (time.perf_counter() - started) * 1000
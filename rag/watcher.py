@@ -0,0 +1,167 @@
+"""
+Knowledge Base Watcher
+======================
+Фоновая задача, поддерживающая индекс базы знаний в актуальном состоянии.
+
+Директория с документами опрашивается раз в interval секунд: сравниваются
+только имена, mtime и размеры файлов (os.scandir в отдельном потоке),
+поэтому опрос дешёвый. Опрос выбран вместо inotify, потому что он работает
+и на примонтированных в Docker томах, где события файловой системы
+не доходят до контейнера.
+
+Серия изменений (копирование нескольких файлов, сохранение из редактора)
+сглаживается: переиндексация запускается, только когда директория
+не менялась debounce секунд. Индексация инкрементальная и выполняется
+вне event loop (см. CollectionManager.index_documents).
+"""
+
+import os
+import time
+import asyncio
+import logging
+from typing import Optional
+
+from rag.collection_manager import COLLECTION_NAME_RE, CollectionManager
+from rag.manifest import SUPPORTED_EXTENSIONS
+
+logger = logging.getLogger(__name__)
+
+# Снимок директории: путь файла относительно неё → (mtime в нс, размер)
+DirectoryState = dict[str, tuple[int, int]]
+
+
+def scan_directory(data_dir: str) -> DirectoryState:
+    """
+    Снимок индексируемых файлов директории без чтения их содержимого.
+
+    Учитываются файлы в корне и в поддиректориях коллекций (один уровень).
+
+    Args:
+        data_dir: Директория с документами
+
+    Returns:
+        Словарь {"файл" или "коллекция/файл": (mtime в нс, размер)};
+        пустой, если директории нет
+    """
+    state: DirectoryState = {}
+    _scan_files(data_dir, "", state)
+    try:
+        with os.scandir(data_dir) as entries:
+            subdirs = [
+                entry.name for entry in entries
+                if entry.is_dir() and COLLECTION_NAME_RE.fullmatch(entry.name)
+            ]
+    except FileNotFoundError:
+        return state
+
+    for name in subdirs:
+        # Пустая поддиректория тоже коллекция: её появление и удаление — изменения
+        state[name + "/"] = (0, 0)
+        _scan_files(os.path.join(data_dir, name), name + "/", state)
+    return state
+
+
+def _scan_files(directory: str, prefix: str, state: DirectoryState):
+    """Добавляет в снимок индексируемые файлы одной директории"""
+    try:
+        with os.scandir(directory) as entries:
+            for entry in entries:
+                if os.path.splitext(entry.name)[1].lower() not in SUPPORTED_EXTENSIONS:
+                    continue
+                try:
+                    st = entry.stat()
+                except OSError:
+                    continue
+                state[prefix + entry.name] = (st.st_mtime_ns, st.st_size)
+    except (FileNotFoundError, NotADirectoryError):
+        pass
+
+
+class KnowledgeBaseWatcher:
+    """Следит за директорией документов и инкрементально переиндексирует её"""
+
+    def __init__(
+        self,
+        vector_store: CollectionManager,
+        data_dir: str,
+        interval: float = 5.0,
+        debounce: float = 2.0
+    ):
+        """
+        Args:
+            vector_store: Хранилище, которое нужно обновлять
+            data_dir: Директория с документами
+            interval: Период опроса директории в секундах
+            debounce: Сколько секунд директория должна не меняться перед переиндексацией
+        """
+        self.vector_store = vector_store
+        self.data_dir = data_dir
+        self.interval = interval
+        self.debounce = debounce
+        self._task: Optional[asyncio.Task] = None
+
+    def start(self):
+        """Запускает фоновую задачу (повторный вызов ничего не делает)"""
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._run(), name="kb-watcher")
+            logger.info(
+                f"Отслеживание {self.data_dir} запущено "
+                f"(опрос {self.interval:g} с, debounce {self.debounce:g} с)"
+            )
+
+    async def stop(self):
+        """Останавливает фоновую задачу"""
+        if self._task is None:
+            return
+        self._task.cancel()
+        try:
+            await self._task
+        except asyncio.CancelledError:
+            pass
+        self._task = None
+
+    async def _run(self):
+        """Цикл опроса: начальная синхронизация, затем реакция на изменения"""
+        # Файлы могли измениться, пока бот был остановлен
+        state = await self._reindex(await asyncio.to_thread(scan_directory, self.data_dir))
+
+        while True:
+            await asyncio.sleep(self.interval)
+            current = await asyncio.to_thread(scan_directory, self.data_dir)
+            if current == state:
+                continue
+
+            logger.info(f"Изменения в {self.data_dir} — ждём окончания серии изменений")
+            state = await self._reindex(await self._wait_quiet(current))
+
+    async def _wait_quiet(self, state: DirectoryState) -> DirectoryState:
+        """Ждёт, пока директория не будет меняться debounce секунд"""
+        quiet_since = time.monotonic()
+        while time.monotonic() - quiet_since < self.debounce:
+            await asyncio.sleep(min(self.debounce, self.interval))
+            current = await asyncio.to_thread(scan_directory, self.data_dir)
+            if current != state:
+                state = current
+                quiet_since = time.monotonic()
+        return state
+
+    async def _reindex(self, state: DirectoryState) -> DirectoryState:
+        """
+        Запускает инкрементальную индексацию.
+
+        Returns:
+            Снимок, относительно которого отслеживать следующие изменения
+            (при ошибке — пустой, чтобы повторить попытку при следующем опросе)
+        """
+        try:
+            stats = await self.vector_store.index_documents(self.data_dir)
+        except Exception as e:
+            logger.error(f"Ошибка фоновой индексации: {e}")
+            return {}
+
+        if stats["added"] or stats["updated"] or stats["removed"]:
+            logger.info(
+                f"База знаний обновлена: +{stats['added']} ~{stats['updated']} "
+                f"-{stats['removed']}, всего чанков {stats['total_chunks']}"
+            )
+        return state
@@ -2,11 +2,35 @@
 Auto-RAG Service
 ================
 Автоматическое определение необходимости использования RAG.
+
+Ключевые слова, справочные слова и "?" ищутся проверкой подстрок, а при
+словаре от AUTOMATON_MIN_KEYWORDS слов — за один проход автоматом
+Ахо–Корасик. Паттерны вопросов объединены в одно регулярное выражение,
+которое применяется, только если ключевых слов нет.
+
+Если задан RAG_CLASSIFIER_PATH, решение принимает обученный классификатор
+(services/rag_classifier.py), а ключевые слова остаются запасным вариантом,
+когда модели нет. При заданном RAG_MESSAGE_LOG сообщения пишутся в JSONL
+для разметки и обучения.
+
+Найденные чанки попадают в контекст, только если их релевантность
+(1 - distance, у всех бэкендов линейна по скору) не ниже порога
+RAG_MIN_RELEVANCE и не ниже доли RAG_RELEVANCE_BAND от лучшего чанка; если не прошёл ни один, блок базы
+знаний в промпт не добавляется. Прошедшие чанки собираются в контекст в
+пределах бюджета токенов RAG_CONTEXT_TOKENS (services/context_packer.py).
 """
 
+import os
 import re
+import json
 import logging
-from typing import Optional
+import threading
+from typing import NamedTuple, Optional
+
+from rag.backend import VectorStoreBackend
+from services.context_packer import ContextPacker, PackedContext, ScoredChunk, scored_chunks
+from services.rag_classifier import RAGClassifier
+from utils.aho_corasick import AhoCorasick
 
 logger = logging.getLogger(__name__)
 
@@ -40,89 +64,348 @@ RAG_PATTERNS = [
     r"зачем\s+нужн",
 ]
 
+# Слова, без которых ни один из RAG_PATTERNS не совпадёт: если их нет
+# в сообщении, регулярное выражение не запускается
+PATTERN_ANCHORS = ("как", "что", "почему", "чём", "зачем")
+
+# Вопрос + одно из этих слов тоже требует справочной информации
+QUESTION_PREFIXES = ("как", "что", "какие", "почему", "зачем")
+REFERENCE_WORDS = ("тз", "бриф", "проект", "задание")
+
+# Порог релевантности по умолчанию: шкалы "distances" у бэкендов разные.
+# bm25: доля от наибольшего скора, достижимого для запроса в коллекции
+# (на data/ запросы по теме набирают от 0.35, посторонние — не больше 0.21);
+# dense/chroma: косинус. У hybrid релевантность зависит только от мест
+# в выдачах ретриверов, поэтому абсолютный порог не применяется
+DEFAULT_MIN_RELEVANCE = {"bm25": 0.3, "dense": 0.1, "chroma": 0.1, "hybrid": 0.0}
+
+
+class RAGTrigger(NamedTuple):
+    """Сработавший триггер RAG"""
+    kind: str  # "keyword", "pattern" или "question"
+    value: str  # ключевое слово, паттерн или справочное слово
+
+
+# Запись в журнал сообщений идёт из потоков asyncio.to_thread; общий для
+# всех экземпляров сервиса замок не даёт строкам JSONL перемешаться
+_MESSAGE_LOG_LOCK = threading.Lock()
+
+# Автомат окупается только на большом словаре: по benchmarks/bench_triggers
+# при 34 ключевых словах проверка подстрок быстрее на сообщениях от 500
+# символов, а начиная примерно со 100 слов автомат не медленнее на любых
+AUTOMATON_MIN_KEYWORDS = 100
+
+# Все подстроки, которые ищутся за один проход, с их ролью
+# (None — словарь маленький, подстроки проверяются по одной)
+_TRIGGER_MATCHER = AhoCorasick(
+    [(keyword, "keyword") for keyword in RAG_KEYWORDS]
+    + [(word, "reference") for word in REFERENCE_WORDS]
+    + [(word, "anchor") for word in PATTERN_ANCHORS]
+    + [("?", "question")]
+) if len(RAG_KEYWORDS) >= AUTOMATON_MIN_KEYWORDS else None
+
+# Паттерны — альтернативы одного выражения; имя группы = индекс в RAG_PATTERNS.
+# Сообщение уже в нижнем регистре, поэтому без re.IGNORECASE
+_PATTERNS_RE = re.compile(
+    "|".join(f"(?P<p{i}>{pattern})" for i, pattern in enumerate(RAG_PATTERNS))
+)
+
+
+def _scan_substrings(message_lower: str) -> tuple[Optional[str], Optional[str], bool, bool]:
+    """
+    Ищет триггерные подстроки по одной.
+
+    Returns:
+        Кортеж (ключевое слово, справочное слово, есть "?", есть опорное
+        слово паттернов); при найденном ключевом слове остальное не ищется
+    """
+    keyword = next((keyword for keyword in RAG_KEYWORDS if keyword in message_lower), None)
+    if keyword:
+        return keyword, None, False, False
+    reference = next((word for word in REFERENCE_WORDS if word in message_lower), None)
+    has_anchor = any(word in message_lower for word in PATTERN_ANCHORS)
+    return None, reference, "?" in message_lower, has_anchor
+
+
+def _scan_automaton(message_lower: str) -> tuple[Optional[str], Optional[str], bool, bool]:
+    """Ищет триггерные подстроки одним проходом автомата (см. _scan_substrings)"""
+    reference = None
+    is_question = has_anchor = False
+    for _, word, role in _TRIGGER_MATCHER.iter_matches(message_lower):
+        if role == "keyword":
+            return word, None, False, False
+        if role == "question":
+            is_question = True
+        elif role == "anchor":
+            has_anchor = True
+        elif reference is None:
+            reference = word
+    return None, reference, is_question, has_anchor
+
 
 class AutoRAGService:
     """Сервис автоматического определения необходимости RAG"""
     
-    def __init__(self, vector_store=None):
+    def __init__(self, vector_store: Optional[VectorStoreBackend] = None):
+        """
+        Args:
+            vector_store: Хранилище базы знаний (VectorStoreBackend или
+                CollectionManager — тогда поиск можно ограничить коллекцией)
+        """
         self.vector_store = vector_store
-        self._compiled_patterns = [re.compile(p, re.IGNORECASE) for p in RAG_PATTERNS]
+        self.classifier = self._load_classifier(os.getenv("RAG_CLASSIFIER_PATH", ""))
+        self.message_log = os.getenv("RAG_MESSAGE_LOG", "")
+        backend = os.getenv("RAG_BACKEND", "bm25").lower()
+        self.min_relevance = float(os.getenv("RAG_MIN_RELEVANCE") or DEFAULT_MIN_RELEVANCE.get(backend, 0.0))
+        self.relevance_band = float(os.getenv("RAG_RELEVANCE_BAND", "0.5"))
+        self.packer = ContextPacker()
     
-    def should_use_rag(self, message: str) -> bool:
+    @staticmethod
+    def _load_classifier(path: str) -> Optional[RAGClassifier]:
+        """Загружает классификатор; при ошибке — None (работают ключевые слова)"""
+        if not path:
+            return None
+        try:
+            classifier = RAGClassifier.load(path)
+        except (OSError, ValueError) as e:
+            logger.warning(f"Классификатор RAG не загружен ({path}): {e}. Используются ключевые слова")
+            return None
+        logger.info(f"Классификатор RAG загружен: {path} ({len(classifier.weights)} признаков)")
+        return classifier
+    
+    def detect_trigger(self, message: str) -> Optional[RAGTrigger]:
         """
-        Определяет, нужно ли использовать RAG для данного сообщения.
+        Определяет, нужно ли использовать RAG для данного сообщения,
+        и какой триггер сработал.
+        
+        Приоритет: ключевое слово, затем паттерн вопроса, затем вопрос
+        со справочным словом.
         
         Args:
             message: Текст сообщения пользователя
             
         Returns:
-            True если нужен RAG, False иначе
+            Сработавший триггер или None, если RAG не нужен
         """
         message_lower = message.lower()
         
-        # 1. Проверяем ключевые слова
-        for keyword in RAG_KEYWORDS:
-            if keyword in message_lower:
-                logger.debug(f"RAG triggered by keyword: {keyword}")
-                return True
+        # 1. Ключевые слова (заодно отмечаем справочные слова, "?" и опорные
+        # слова паттернов)
+        scan = _scan_substrings if _TRIGGER_MATCHER is None else _scan_automaton
+        keyword, reference, has_question_mark, has_anchor = scan(message_lower)
+        if keyword:
+            logger.debug(f"RAG triggered by keyword: {keyword}")
+            return RAGTrigger("keyword", keyword)
+        is_question = has_question_mark or message_lower.startswith(QUESTION_PREFIXES)
         
-        # 2. Проверяем паттерны
-        for pattern in self._compiled_patterns:
-            if pattern.search(message_lower):
-                logger.debug(f"RAG triggered by pattern: {pattern.pattern}")
-                return True
+        # 2. Паттерны
+        match = _PATTERNS_RE.search(message_lower) if has_anchor else None
+        if match:
+            pattern = RAG_PATTERNS[int(match.lastgroup[1:])]
+            logger.debug(f"RAG triggered by pattern: {pattern}")
+            return RAGTrigger("pattern", pattern)
         
-        # 3. Проверяем, есть ли вопросительный характер + справочные слова
-        is_question = "?" in message or message_lower.startswith(("как", "что", "какие", "почему", "зачем"))
-        has_reference_context = any(word in message_lower for word in ["тз", "бриф", "проект", "задание"])
-        
-        if is_question and has_reference_context:
+        # 3. Вопросительный характер + справочные слова
+        if is_question and reference:
             logger.debug("RAG triggered by question + reference context")
-            return True
+            return RAGTrigger("question", reference)
         
-        return False
+        return None
     
-    def get_rag_context(self, query: str, top_k: int = 3) -> Optional[str]:
+    def should_use_rag(self, message: str) -> bool:
         """
-        Получает релевантный контекст из базы знаний.
+        Определяет, нужно ли использовать RAG для данного сообщения:
+        классификатором, если он загружен, иначе по ключевым словам.
+        
+        Args:
+            message: Текст сообщения пользователя
+            
+        Returns:
+            True если нужен RAG, False иначе
+        """
+        if self.classifier:
+            score = self.classifier.score(message)
+            logger.debug(f"RAG classifier score: {score:.3f}")
+            use_rag = score >= self.classifier.threshold
+        else:
+            score = None
+            use_rag = self.detect_trigger(message) is not None
+        
+        if self.message_log:
+            keyword = use_rag if score is None else self.detect_trigger(message) is not None
+            self._log_message(message, keyword, score)
+        
+        return use_rag
+    
+    def _log_message(self, message: str, keyword: bool, score: Optional[float]):
+        """Дописывает сообщение в журнал для разметки (формат services/rag_classifier.py)"""
+        record = {"text": message, "keyword": keyword}
+        if score is not None:
+            record["score"] = round(score, 4)
+        line = json.dumps(record, ensure_ascii=False) + "\n"
+        try:
+            with _MESSAGE_LOG_LOCK, open(self.message_log, "a", encoding="utf-8") as f:
+                f.write(line)
+        except OSError as e:
+            logger.warning(f"Не удалось записать журнал сообщений RAG: {e}")
+    
+    def retrieve(self, query: str, top_k: int = 3, collection: Optional[str] = None) -> list[ScoredChunk]:
+        """
+        Ищет чанки и оставляет достаточно релевантные.
+        
+        Чанк проходит, если его релевантность не ниже min_relevance и не
+        ниже relevance_band от релевантности лучшего чанка.
         
         Args:
             query: Поисковый запрос
-            top_k: Количество результатов
+            top_k: Количество результатов поиска
+            collection: Коллекция (None — по умолчанию)
             
         Returns:
-            Контекст для LLM или None
+            Прошедшие чанки по убыванию релевантности (пустой список, если
+            не прошёл ни один)
         """
         if not self.vector_store:
-            return None
+            return []
+        
+        results = self.vector_store.search(query=query, n_results=top_k, **self._scope(collection))
+        return self._gate(scored_chunks(results))
+    
+    def retrieve_many(
+        self,
+        queries: list[str],
+        top_k: int = 2,
+        collection: Optional[str] = None
+    ) -> list[list[ScoredChunk]]:
+        """
+        Пакетный retrieve: один поиск search_many, порог — для каждого
+        запроса отдельно.
+        
+        Args:
+            queries: Поисковые запросы
+            top_k: Количество результатов на запрос
+            collection: Коллекция (None — по умолчанию)
+            
+        Returns:
+            Прошедшие чанки для каждого запроса (в том же порядке)
+        """
+        if not self.vector_store or not queries:
+            return [[] for _ in queries]
+        
+        results = self.vector_store.search_many(queries=queries, n_results=top_k, **self._scope(collection))
+        return [self._gate(scored_chunks(result)) for result in results]
+    
+    def _gate(self, chunks: list[ScoredChunk]) -> list[ScoredChunk]:
+        """Оставляет чанки не ниже min_relevance и доли relevance_band от лучшего"""
+        if not chunks:
+            return []
         
+        best = max(chunk.relevance for chunk in chunks)
+        floor = max(self.min_relevance, best * self.relevance_band)
+        passed = [chunk for chunk in chunks if chunk.relevance >= floor]
+        logger.debug(
+            f"RAG-контекст: {len(passed)}/{len(chunks)} чанков, "
+            f"лучшая релевантность {best:.3f}, порог {floor:.3f}"
+        )
+        return passed
+    
+    def pack_rag_context(
+        self,
+        query: str,
+        top_k: int = 3,
+        collection: Optional[str] = None,
+        budget: Optional[int] = None
+    ) -> Optional[PackedContext]:
+        """
+        Собирает контекст из базы знаний в пределах бюджета токенов.
+        
+        Args:
+            query: Поисковый запрос
+            top_k: Количество результатов
+            collection: Коллекция (None — по умолчанию)
+            budget: Бюджет токенов (None — RAG_CONTEXT_TOKENS)
+            
+        Returns:
+            Контекст с размерами в токенах или None, если ни один чанк не
+            прошёл порог релевантности или не поместился в бюджет
+        """
         try:
-            results = self.vector_store.search(query=query, n_results=top_k)
+            packed = self.packer.pack(self.retrieve(query, top_k, collection), budget)
+            return packed if packed.text else None
             
-            if not results or not results.get("documents") or not results["documents"][0]:
-                return None
+        except Exception as e:
+            logger.error(f"Ошибка получения RAG-контекста: {e}")
+            return None
+    
+    def get_rag_context(self, query: str, top_k: int = 3, collection: Optional[str] = None) -> Optional[str]:
+        """
+        Получает релевантный контекст из базы знаний.
+        
+        Args:
+            query: Поисковый запрос
+            top_k: Количество результатов
+            collection: Коллекция (None — по умолчанию)
             
-            documents = results["documents"][0]
-            metadatas = results.get("metadatas", [[]])[0]
+        Returns:
+            Контекст для LLM или None, если ни один чанк не прошёл порог
+            релевантности
+        """
+        packed = self.pack_rag_context(query, top_k, collection)
+        return packed.text if packed else None
+    
+    def get_brief_context(
+        self,
+        queries: list[str],
+        top_k: int = 2,
+        collection: Optional[str] = None
+    ) -> Optional[str]:
+        """
+        Получает контекст из базы знаний сразу по нескольким запросам
+        (например, по полям брифа) одним пакетным поиском; порог
+        релевантности применяется к выдаче каждого запроса, как в retrieve.
+        
+        Args:
+            queries: Поисковые запросы (пустые пропускаются)
+            top_k: Количество результатов на запрос
+            collection: Коллекция (None — по умолчанию)
             
-            # Форматируем контекст
-            context_parts = []
-            for doc, meta in zip(documents, metadatas):
-                source = meta.get("source", "unknown")
-                context_parts.append(f"[{source}]\n{doc}")
+        Returns:
+            Контекст для LLM без повторов чанков или None
+        """
+        queries = [query for query in queries if query and query.strip()]
+        if not self.vector_store or not queries:
+            return None
+        
+        try:
+            # Один чанк может найтись по нескольким полям — оставляем лучшую оценку
+            chunks: dict[str, ScoredChunk] = {}
+            for passed in self.retrieve_many(queries, top_k, collection):
+                for chunk in passed:
+                    if chunk.text not in chunks or chunk.relevance > chunks[chunk.text].relevance:
+                        chunks[chunk.text] = chunk
             
-            return "\n\n---\n\n".join(context_parts)
+            return self.packer.pack(chunks.values()).text or None
             
         except Exception as e:
-            logger.error(f"Ошибка получения RAG-контекста: {e}")
+            logger.error(f"Ошибка получения RAG-контекста по брифу: {e}")
             return None
     
-    def has_knowledge_base(self) -> bool:
-        """Проверяет, есть ли документы в базе знаний"""
+    def collection_for(self, project_type: Optional[str]) -> Optional[str]:
+        """Коллекция базы знаний для типа проекта из брифа"""
+        route = getattr(self.vector_store, "route", None)
+        return route(project_type) if route else None
+    
+    @staticmethod
+    def _scope(collection: Optional[str]) -> dict:
+        """Аргументы поиска по коллекции (у хранилища без коллекций — пустые)"""
+        return {"collection": collection} if collection else {}
+    
+    def has_knowledge_base(self, collection: Optional[str] = None) -> bool:
+        """Проверяет, есть ли документы в базе знаний (в коллекции)"""
         if not self.vector_store:
             return False
         try:
-            stats = self.vector_store.get_stats()
+            stats = self.vector_store.get_stats(**self._scope(collection))
             return stats.get("total_chunks", 0) > 0
         except:
             return False
@@ -0,0 +1,174 @@
+"""
+Context Packer
+==============
+Сборка контекста базы знаний для LLM в пределах бюджета токенов.
+
+Чанки добавляются по убыванию релевантности, пока помещаются в бюджет;
+первый не поместившийся обрезается по границе предложения до остатка
+бюджета, и сборка на этом заканчивается. Токены считаются кодировщиком
+модели (utils/tokens.py). Используется AutoRAGService, RAGHandler и
+RAGService.
+"""
+
+import os
+import re
+import logging
+from dataclasses import dataclass, field
+from typing import Iterable, NamedTuple, Optional
+
+from utils.tokens import count_tokens, truncate_tokens
+
+logger = logging.getLogger(__name__)
+
+SEPARATOR = "\n\n---\n\n"
+
+# Конец предложения или строки — допустимое место обрезки чанка
+SENTENCE_END_RE = re.compile(r"[.!?…](?=\s)|\n")
+
+# Обрывок чанка короче этого в контекст не добавляется
+MIN_TRUNCATED_TOKENS = 32
+
+
+class ScoredChunk(NamedTuple):
+    """Найденный чанк с оценкой релевантности"""
+    text: str
+    metadata: dict
+    relevance: float  # 1 - distance, чем больше, тем релевантнее
+
+
+def scored_chunks(results: dict) -> list[ScoredChunk]:
+    """
+    Чанки результата поиска (формат ChromaDB, один запрос).
+
+    Returns:
+        Чанки с релевантностью 1 - distance (1.0, если расстояний нет)
+    """
+    if not results or not results.get("documents") or not results["documents"][0]:
+        return []
+    documents = results["documents"][0]
+    metadatas = results.get("metadatas", [[]])[0] or [{}] * len(documents)
+    distances = results.get("distances", [[]])[0] or [0.0] * len(documents)
+    return [
+        ScoredChunk(doc, meta, 1.0 - distance)
+        for doc, meta, distance in zip(documents, metadatas, distances)
+    ]
+
+
+@dataclass
+class PackedContext:
+    """Собранный контекст и его размер в токенах"""
+    text: str
+    chunks: list[ScoredChunk] = field(default_factory=list)  # вошедшие, последний может быть обрезан
+    tokens: int = 0  # токенов в text
+    budget: int = 0
+    candidate_tokens: int = 0  # токенов во всех кандидатах (с заголовками)
+    truncated: bool = False
+    dropped: int = 0  # кандидатов не вошло
+
+    @property
+    def sources(self) -> list[dict]:
+        """Уникальные источники вошедших чанков в порядке появления"""
+        seen = {}
+        for chunk in self.chunks:
+            seen.setdefault(chunk.metadata.get("source", "unknown"), None)
+        return [{"source": source} for source in seen]
+
+    def metrics(self) -> dict:
+        """Размеры для логов и метрик"""
+        return {
+            "tokens": self.tokens,
+            "budget": self.budget,
+            "candidate_tokens": self.candidate_tokens,
+            "chunks": len(self.chunks),
+            "dropped": self.dropped,
+            "truncated": self.truncated,
+        }
+
+
+class ContextPacker:
+    """
+    Жадная упаковка чанков в бюджет токенов.
+
+    Args:
+        budget: Бюджет токенов по умолчанию (None — RAG_CONTEXT_TOKENS)
+        header: Заголовок чанка, формат с полем {source}
+    """
+
+    def __init__(self, budget: Optional[int] = None, header: str = "[{source}]"):
+        self.budget = budget if budget is not None else int(os.getenv("RAG_CONTEXT_TOKENS", "1500"))
+        self.header = header
+
+    def pack(self, chunks: Iterable[ScoredChunk], budget: Optional[int] = None) -> PackedContext:
+        """
+        Собирает контекст из чанков.
+
+        Args:
+            chunks: Кандидаты (порядок не важен — сортируются по релевантности)
+            budget: Бюджет токенов на этот вызов (None — по умолчанию)
+
+        Returns:
+            Контекст; text пустой, если не поместился ни один чанк
+        """
+        budget = self.budget if budget is None else budget
+        candidates = sorted(chunks, key=lambda chunk: chunk.relevance, reverse=True)
+        separator_tokens = count_tokens(SEPARATOR)
+        parts = [self._part(chunk) for chunk in candidates]
+        costs = [count_tokens(part) for part in parts]
+
+        packed_parts, packed = [], []
+        used = 0
+        truncated = False
+        for chunk, part, cost in zip(candidates, parts, costs):
+            separator = separator_tokens if packed else 0
+            if used + separator + cost <= budget:
+                packed_parts.append(part)
+                packed.append(chunk)
+                used += separator + cost
+                continue
+
+            # Не поместился: обрезаем по предложениям до остатка и заканчиваем
+            header = part[:len(part) - len(chunk.text)]
+            text = self._truncate(chunk.text, budget - used - separator - count_tokens(header))
+            if text:
+                packed_parts.append(header + text)
+                packed.append(chunk._replace(text=text))
+                truncated = True
+            break
+
+        # Сумма токенов частей может на единицы разойтись с токенами склейки
+        text = SEPARATOR.join(packed_parts)
+        tokens = count_tokens(text) if text else 0
+        while tokens > budget:
+            packed_parts.pop()
+            packed.pop()
+            truncated = False  # обрезанный чанк всегда последний
+            text = SEPARATOR.join(packed_parts)
+            tokens = count_tokens(text) if text else 0
+
+        context = PackedContext(
+            text=text,
+            chunks=packed,
+            tokens=tokens,
+            budget=budget,
+            candidate_tokens=sum(costs) + separator_tokens * max(len(costs) - 1, 0),
+            truncated=truncated,
+            dropped=len(candidates) - len(packed),
+        )
+        logger.debug(f"Контекст RAG: {context.metrics()}")
+        return context
+
+    def _part(self, chunk: ScoredChunk) -> str:
+        """Чанк с заголовком источника"""
+        return f"{self.header.format(source=chunk.metadata.get('source', 'unknown'))}\n{chunk.text}"
+
+    @staticmethod
+    def _truncate(text: str, max_tokens: int) -> str:
+        """Начало текста до последней границы предложения в пределах max_tokens"""
+        if max_tokens < MIN_TRUNCATED_TOKENS:
+            return ""
+        prefix = truncate_tokens(text, max_tokens)
+        ends = [match.end() for match in SENTENCE_END_RE.finditer(prefix)]
+        if not ends:
+            return ""
+        cut = prefix[:ends[-1]].rstrip()
+        return cut if count_tokens(cut) >= MIN_TRUNCATED_TOKENS else ""
@@ -0,0 +1,376 @@
+"""
+RAG Classifier
+==============
+Лёгкий обучаемый классификатор «нужна ли сообщению база знаний».
+
+Признаки — хешированные (crc32) стемы слов, пары соседних стемов, первое
+слово и наличие "?"; модель — логистическая регрессия. Предсказание —
+несколько десятков поисков в словаре весов на чистом Python (микросекунды),
+обучение — полный градиентный спуск на NumPy.
+
+Данные — JSONL, по сообщению в строке: {"text": "...", "label": true|false}.
+Журнал сообщений бота (RAG_MESSAGE_LOG) пишется в том же формате, но без
+"label" и с решением фильтра по ключевым словам в "keyword"; разметить его
+можно командой label.
+
+Запуск из корня репозитория:
+    python -m services.rag_classifier label messages.jsonl
+    python -m services.rag_classifier train messages.jsonl [...] [--output rag_classifier.json]
+    python -m services.rag_classifier evaluate rag_classifier.json messages.jsonl [...]
+"""
+
+import os
+import json
+import math
+import time
+import zlib
+import random
+import logging
+import argparse
+from typing import Callable, Iterable
+
+import numpy as np
+
+from rag.stemmer import Stemmer
+from rag.tokenizer import WORD_RE
+
+logger = logging.getLogger(__name__)
+
+MODEL_FORMAT = 1
+FEATURE_BITS = 18
+REPORT_THRESHOLDS = (0.3, 0.4, 0.5, 0.6, 0.7)
+
+_stem = Stemmer(cache_size=20_000)
+
+
+def message_features(text: str, bits: int = FEATURE_BITS) -> list[int]:
+    """
+    Хешированные признаки сообщения.
+
+    Args:
+        text: Текст сообщения
+        bits: Разрядность хеша (пространство признаков — 2**bits)
+
+    Returns:
+        Индексы признаков без повторов
+    """
+    stems = [_stem(word) for word in WORD_RE.findall(text.lower())]
+    grams = stems + [f"{a} {b}" for a, b in zip(stems, stems[1:])]
+    if stems:
+        grams.append(f"^{stems[0]}")
+    if "?" in text:
+        grams.append("<?>")
+    mask = (1 << bits) - 1
+    return list({zlib.crc32(gram.encode("utf-8")) & mask for gram in grams})
+
+
+class RAGClassifier:
+    """
+    Логистическая регрессия на хешированных признаках.
+
+    Args:
+        weights: {индекс признака: вес}; отсутствующие признаки имеют вес 0
+        bias: Свободный член
+        threshold: Порог вероятности, с которого нужен RAG
+        bits: Разрядность хеша признаков
+    """
+
+    def __init__(self, weights: dict[int, float], bias: float, threshold: float = 0.5, bits: int = FEATURE_BITS):
+        self.weights = weights
+        self.bias = bias
+        self.threshold = threshold
+        self.bits = bits
+
+    def score(self, message: str) -> float:
+        """Вероятность того, что сообщению нужна база знаний"""
+        features = message_features(message, self.bits)
+        if not features:
+            return 1 / (1 + math.exp(-self.bias))
+        weights = self.weights
+        # Признаки нормированы: у каждого значение 1/sqrt(числа признаков)
+        z = self.bias + sum(weights.get(f, 0.0) for f in features) / math.sqrt(len(features))
+        return 1 / (1 + math.exp(-z)) if z > -700 else 0.0
+
+    def predict(self, message: str) -> bool:
+        """Нужен ли RAG для сообщения"""
+        return self.score(message) >= self.threshold
+
+    @classmethod
+    def fit(
+        cls,
+        texts: list[str],
+        labels: list[bool],
+        threshold: float = 0.5,
+        bits: int = FEATURE_BITS,
+        epochs: int = 1000,
+        learning_rate: float = 2.0,
+        l2: float = 1e-4
+    ) -> "RAGClassifier":
+        """
+        Обучает модель полным градиентным спуском.
+
+        Классы взвешиваются обратно их частоте, поэтому редкие RAG-запросы
+        не теряются среди обычных сообщений.
+
+        Args:
+            texts: Сообщения
+            labels: Нужен ли RAG каждому сообщению
+            threshold: Порог вероятности для predict
+            bits: Разрядность хеша признаков
+            epochs: Число шагов спуска
+            learning_rate: Шаг спуска
+            l2: Коэффициент L2-регуляризации
+
+        Returns:
+            Обученная модель
+        """
+        if not texts:
+            raise ValueError("Нет размеченных сообщений для обучения")
+
+        rows = [message_features(text, bits) for text in texts]
+        # Разреженная матрица в координатном виде по признакам, встреченным в обучении
+        columns = sorted({feature for row in rows for feature in row})
+        column_of = {feature: i for i, feature in enumerate(columns)}
+        lengths = np.array([len(row) for row in rows])
+        row_ids = np.repeat(np.arange(len(rows)), lengths)
+        col_ids = np.array([column_of[feature] for row in rows for feature in row], dtype=np.intp)
+        values = np.repeat(1 / np.sqrt(np.maximum(lengths, 1)), lengths)
+
+        y = np.array(labels, dtype=np.float64)
+        positive = y.mean()
+        if 0 < positive < 1:
+            sample_weight = np.where(y == 1, 0.5 / positive, 0.5 / (1 - positive)) / len(y)
+        else:
+            sample_weight = np.full(len(y), 1 / len(y))
+
+        w = np.zeros(len(columns))
+        b = 0.0
+        for _ in range(epochs):
+            z = np.bincount(row_ids, weights=w[col_ids] * values, minlength=len(rows)) + b
+            error = (1 / (1 + np.exp(-z)) - y) * sample_weight
+            w -= learning_rate * (np.bincount(col_ids, weights=error[row_ids] * values, minlength=len(columns)) + l2 * w)
+            b -= learning_rate * error.sum()
+
+        weights = {feature: float(weight) for feature, weight in zip(columns, w) if abs(weight) > 1e-6}
+        return cls(weights, float(b), threshold=threshold, bits=bits)
+
+    def save(self, path: str):
+        """Сохраняет модель в JSON"""
+        model = {
+            "format": MODEL_FORMAT,
+            "bits": self.bits,
+            "threshold": self.threshold,
+            "bias": round(self.bias, 6),
+            "weights": {str(feature): round(weight, 6) for feature, weight in sorted(self.weights.items())},
+        }
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(model, f)
+        os.replace(tmp_path, path)
+
+    @classmethod
+    def load(cls, path: str) -> "RAGClassifier":
+        """
+        Загружает модель из JSON.
+
+        Raises:
+            OSError: Файл недоступен
+            ValueError: Файл повреждён или другого формата
+        """
+        with open(path, "r", encoding="utf-8") as f:
+            model = json.load(f)
+        if not isinstance(model, dict) or model.get("format") != MODEL_FORMAT:
+            raise ValueError(f"неподдерживаемый формат модели: {model.get('format') if isinstance(model, dict) else model!r}")
+        try:
+            weights = {int(feature): float(weight) for feature, weight in model["weights"].items()}
+            return cls(weights, float(model["bias"]), float(model["threshold"]), int(model["bits"]))
+        except (KeyError, TypeError, AttributeError) as e:
+            raise ValueError(f"повреждённая модель: {e}") from e
+
+
+# ==================== ОТЧЁТ ====================
+
+def load_messages(paths: Iterable[str], weak_labels: bool = False) -> tuple[list[str], list[bool]]:
+    """
+    Читает размеченные сообщения из JSONL.
+
+    Args:
+        paths: Файлы JSONL
+        weak_labels: Для строк без "label" брать решение фильтра по ключевым
+            словам ("keyword" из журнала сообщений)
+
+    Returns:
+        (тексты, метки); строки без метки пропускаются
+    """
+    texts, labels = [], []
+    skipped = 0
+    for path in paths:
+        with open(path, "r", encoding="utf-8") as f:
+            for line in f:
+                if not line.strip():
+                    continue
+                row = json.loads(line)
+                label = row.get("label")
+                if label is None and weak_labels:
+                    label = row.get("keyword")
+                if label is None or not row.get("text"):
+                    skipped += 1
+                    continue
+                texts.append(row["text"])
+                labels.append(bool(label))
+    if skipped:
+        print(f"Пропущено сообщений без метки: {skipped}")
+    return texts, labels
+
+
+def quality(predictions: list[bool], labels: list[bool]) -> dict:
+    """Точность, полнота, F1 и число ошибок каждого рода"""
+    tp = sum(1 for p, y in zip(predictions, labels) if p and y)
+    fp = sum(1 for p, y in zip(predictions, labels) if p and not y)
+    fn = sum(1 for p, y in zip(predictions, labels) if not p and y)
+    precision = tp / (tp + fp) if tp + fp else 0.0
+    recall = tp / (tp + fn) if tp + fn else 0.0
+    return {
+        "precision": precision,
+        "recall": recall,
+        "f1": 2 * precision * recall / (precision + recall) if precision + recall else 0.0,
+        "false_positives": fp,
+        "false_negatives": fn,
+    }
+
+
+def timed(predict: Callable[[str], bool], texts: list[str]) -> tuple[list[bool], float, float]:
+    """
+    Решения по сообщениям и их задержка.
+
+    Returns:
+        (решения, p50 мкс, p99 мкс)
+    """
+    predictions, latencies = [], []
+    for text in texts:
+        started = time.perf_counter()
+        predictions.append(predict(text))
+        latencies.append((time.perf_counter() - started) * 1e6)
+    return predictions, float(np.percentile(latencies, 50)), float(np.percentile(latencies, 99))
+
+
+def print_report(classifier: RAGClassifier, texts: list[str], labels: list[bool]):
+    """Сравнение модели с фильтром по ключевым словам на одних и тех же сообщениях"""
+    from services.auto_rag import AutoRAGService
+
+    if not texts:
+        print("Нет сообщений для отчёта")
+        return
+
+    keyword_gate = AutoRAGService()
+    for text in texts:  # прогрев кеша стемов, чтобы задержка была установившейся
+        classifier.score(text)
+
+    gates = {
+        "keywords": lambda text: keyword_gate.detect_trigger(text) is not None,
+        f"model@{classifier.threshold:g}": classifier.predict,
+    }
+    print(f"Сообщений: {len(texts)}, из них RAG: {sum(labels)}")
+    print(f"{'gate':<12} {'precision':>9} {'recall':>7} {'f1':>6} {'FP':>5} {'FN':>5} {'p50 us':>7} {'p99 us':>7}")
+    for name, predict in gates.items():
+        predictions, p50, p99 = timed(predict, texts)
+        m = quality(predictions, labels)
+        print(
+            f"{name:<12} {m['precision']:>9.3f} {m['recall']:>7.3f} {m['f1']:>6.3f} "
+            f"{m['false_positives']:>5} {m['false_negatives']:>5} {p50:>7.1f} {p99:>7.1f}"
+        )
+
+    # Подсказка для выбора --threshold
+    scores = [classifier.score(text) for text in texts]
+    for threshold in REPORT_THRESHOLDS:
+        m = quality([score >= threshold for score in scores], labels)
+        print(
+            f"{f'  @{threshold:g}':<12} {m['precision']:>9.3f} {m['recall']:>7.3f} {m['f1']:>6.3f} "
+            f"{m['false_positives']:>5} {m['false_negatives']:>5}"
+        )
+
+
+# ==================== CLI ====================
+
+def label_messages(path: str):
+    """Интерактивная разметка строк журнала без "label" (файл перезаписывается)"""
+    with open(path, "r", encoding="utf-8") as f:
+        rows = [json.loads(line) for line in f if line.strip()]
+
+    todo = [row for row in rows if row.get("label") is None and row.get("text")]
+    print(f"Без разметки: {len(todo)} из {len(rows)}. y — нужен RAG, n — не нужен, s — пропустить, q — выход")
+    try:
+        for done, row in enumerate(todo, 1):
+            hint = " (ключевые слова: RAG)" if row.get("keyword") else ""
+            answer = ""
+            while answer not in ("y", "n", "s", "q"):
+                answer = input(f"\n[{done}/{len(todo)}]{hint}\n{row['text']}\n> ").strip().lower()
+            if answer == "q":
+                break
+            if answer != "s":
+                row["label"] = answer == "y"
+    finally:
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            for row in rows:
+                f.write(json.dumps(row, ensure_ascii=False) + "\n")
+        os.replace(tmp_path, path)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Классификатор необходимости RAG")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    label_parser = commands.add_parser("label", help="разметить журнал сообщений")
+    label_parser.add_argument("path")
+
+    train_parser = commands.add_parser("train", help="обучить модель и показать отчёт на отложенной выборке")
+    train_parser.add_argument("inputs", nargs="+", help="JSONL с размеченными сообщениями")
+    train_parser.add_argument("--output", default="rag_classifier.json")
+    train_parser.add_argument("--threshold", type=float, default=0.5)
+    train_parser.add_argument("--test-size", type=float, default=0.2, help="доля отложенной выборки для отчёта")
+    train_parser.add_argument("--epochs", type=int, default=1000)
+    train_parser.add_argument("--l2", type=float, default=1e-4)
+    train_parser.add_argument("--seed", type=int, default=42)
+    train_parser.add_argument("--weak-labels", action="store_true", help="без label брать решение ключевых слов")
+
+    evaluate_parser = commands.add_parser("evaluate", help="отчёт по сохранённой модели")
+    evaluate_parser.add_argument("model")
+    evaluate_parser.add_argument("inputs", nargs="+")
+
+    args = parser.parse_args()
+
+    if args.command == "label":
+        label_messages(args.path)
+        return
+
+    if args.command == "evaluate":
+        texts, labels = load_messages(args.inputs)
+        print_report(RAGClassifier.load(args.model), texts, labels)
+        return
+
+    texts, labels = load_messages(args.inputs, weak_labels=args.weak_labels)
+    params = {"threshold": args.threshold, "epochs": args.epochs, "l2": args.l2}
+
+    order = list(range(len(texts)))
+    random.Random(args.seed).shuffle(order)
+    n_test = int(len(order) * args.test_size)
+    if n_test:
+        train_ids, test_ids = order[n_test:], order[:n_test]
+        holdout = RAGClassifier.fit([texts[i] for i in train_ids], [labels[i] for i in train_ids], **params)
+        print("Отложенная выборка:")
+        print_report(holdout, [texts[i] for i in test_ids], [labels[i] for i in test_ids])
+        print()
+
+    # Итоговая модель обучается на всех сообщениях
+    started = time.perf_counter()
+    classifier = RAGClassifier.fit(texts, labels, **params)
+    classifier.save(args.output)
+    print(
+        f"Модель: {args.output} ({len(classifier.weights)} признаков, "
+        f"{len(texts)} сообщений, {time.perf_counter() - started:.1f} с)"
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -6,11 +6,13 @@ RAG Service
 """
 
 import os
+import asyncio
 import logging
 from typing import Optional
 
+from services.context_packer import ContextPacker, PackedContext, scored_chunks
 from services.openai_client import get_openai_client
-from rag.vectorstore import VectorStoreManager
+from rag.backend import VectorStoreBackend
 from utils.prompts import RAG_SYSTEM_PROMPT
 from utils.helpers import format_sources
 
@@ -20,10 +22,11 @@ logger = logging.getLogger(__name__)
 class RAGService:
     """Сервис для RAG-запросов"""
     
-    def __init__(self, vector_store: VectorStoreManager):
+    def __init__(self, vector_store: VectorStoreBackend):
         self.vector_store = vector_store
         self.openai_client = get_openai_client()
         self.top_k = int(os.getenv("RAG_TOP_K", "3"))
+        self.packer = ContextPacker()
     
     async def query(
         self,
@@ -41,31 +44,17 @@ class RAGService:
             Кортеж (ответ, список источников)
         """
         try:
-            # 1. Поиск релевантных документов
-            search_results = self.vector_store.search(
-                query=user_query,
-                n_results=self.top_k
-            )
-            
-            if not search_results or not search_results.get("documents"):
+            # 1-2. Поиск релевантных документов и сборка контекста в пределах
+            # бюджета токенов (индекс и кодировщик tiktoken блокируют — в отдельном потоке)
+            packed = await asyncio.to_thread(self._retrieve, user_query)
+            if not packed.text:
                 # Если база пуста или нет результатов
                 logger.info("RAG: база знаний пуста или нет релевантных документов")
                 context = "База знаний пуста или не содержит релевантной информации."
-                sources = []
             else:
-                # 2. Формируем контекст из найденных документов
-                documents = search_results["documents"][0]  # ChromaDB возвращает вложенный список
-                metadatas = search_results.get("metadatas", [[]])[0]
-                
-                context_parts = []
-                sources = []
-                
-                for i, (doc, meta) in enumerate(zip(documents, metadatas)):
-                    source_name = meta.get("source", f"Документ {i+1}")
-                    context_parts.append(f"[{source_name}]\n{doc}")
-                    sources.append({"source": source_name})
-                
-                context = "\n\n---\n\n".join(context_parts)
+                logger.info(f"RAG-контекст: {packed.tokens}/{packed.budget} токенов, {len(packed.chunks)} чанков")
+                context = packed.text
+            sources = packed.sources
             
             # 3. Формируем промпт с контекстом
             system_prompt = RAG_SYSTEM_PROMPT.format(context=context)
@@ -85,6 +74,14 @@ class RAGService:
             logger.error(f"Ошибка RAG-запроса: {e}")
             raise
     
+    def _retrieve(self, user_query: str) -> PackedContext:
+        """Поиск и упаковка контекста (вызывать через asyncio.to_thread)"""
+        search_results = self.vector_store.search(
+            query=user_query,
+            n_results=self.top_k
+        )
+        return self.packer.pack(scored_chunks(search_results))
+    
     async def query_with_formatted_sources(
         self,
         user_query: str,
@@ -0,0 +1,78 @@
+"""
+Aho–Corasick
+============
+Поиск множества подстрок за один проход по тексту.
+
+Ключевые слова собираются в бор, из которого заранее строится полный
+автомат: для каждого состояния хранятся все переходы с учётом
+суффиксных ссылок, поэтому на каждый символ текста приходится один
+поиск в словаре без откатов. Время прохода — O(длина текста + число
+совпадений) независимо от количества ключевых слов.
+"""
+
+from collections import deque
+from typing import Generic, Iterable, Iterator, TypeVar
+
+Label = TypeVar("Label")
+
+
+class AhoCorasick(Generic[Label]):
+    """
+    Неизменяемый автомат Ахо–Корасик.
+
+    Args:
+        words: Пары (подстрока, метка); одна подстрока может иметь несколько меток
+    """
+
+    def __init__(self, words: Iterable[tuple[str, Label]]):
+        # Бор: переходы и метки слов, заканчивающихся в состоянии
+        goto: list[dict[str, int]] = [{}]
+        outputs: list[list[tuple[str, Label]]] = [[]]
+        for word, label in words:
+            if not word:
+                raise ValueError("Пустая подстрока")
+            state = 0
+            for char in word:
+                next_state = goto[state].get(char)
+                if next_state is None:
+                    next_state = len(goto)
+                    goto[state][char] = next_state
+                    goto.append({})
+                    outputs.append([])
+                state = next_state
+            outputs[state].append((word, label))
+
+        # Обход в ширину: суффиксные ссылки, наследование совпадений и полные переходы
+        fail = [0] * len(goto)
+        delta: list[dict[str, int]] = [dict(goto[0])]
+        delta.extend({} for _ in range(len(goto) - 1))
+        queue = deque(goto[0].values())
+        while queue:
+            state = queue.popleft()
+            outputs[state].extend(outputs[fail[state]])
+            # Переходы суффикса, перекрытые собственными переходами бора
+            delta[state] = {**delta[fail[state]], **goto[state]}
+            for char, next_state in goto[state].items():
+                fail[next_state] = delta[fail[state]].get(char, 0)
+                queue.append(next_state)
+
+        self._delta = delta
+        self._outputs = {state: tuple(found) for state, found in enumerate(outputs) if found}
+
+    def iter_matches(self, text: str) -> Iterator[tuple[int, str, Label]]:
+        """
+        Совпадения в порядке их окончания в тексте.
+
+        Args:
+            text: Текст
+
+        Yields:
+            (позиция конца совпадения, подстрока, метка)
+        """
+        delta, outputs = self._delta, self._outputs
+        state = 0
+        for position, char in enumerate(text):
+            state = delta[state].get(char, 0)
+            if state in outputs:
+                for word, label in outputs[state]:
+                    yield position, word, label
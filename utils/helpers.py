@@ -11,6 +11,7 @@ from typing import Optional
 from dataclasses import dataclass, field
 from datetime import datetime
 from config import config
+from utils.tokens import count_tokens
 
 logger = logging.getLogger(__name__)
 
@@ -200,8 +201,8 @@ def sanitize_filename(filename: str) -> str:
 
 
 def estimate_tokens(text: str) -> int:
-    """Примерная оценка количества токенов"""
-    return len(text) // 3
+    """Количество токенов текста для модели OPENAI_MODEL (см. utils/tokens.py)"""
+    return count_tokens(text)
 
 
 def format_timestamp(dt: datetime) -> str:
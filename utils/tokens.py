@@ -0,0 +1,90 @@
+"""
+Tokens
+======
+Подсчёт токенов кодировщиком tiktoken для модели OPENAI_MODEL.
+
+Кодировщик создаётся один раз на модель, подсчёт для повторяющихся текстов
+(чанки базы знаний) мемоизирован. Если tiktoken не установлен или не
+может загрузить словарь (нет сети при первом запуске), используется
+оценка «символов / 3».
+"""
+
+import logging
+from functools import lru_cache
+from typing import Optional
+
+from config import config
+
+logger = logging.getLogger(__name__)
+
+# Кодировка для моделей, которых tiktoken не знает (семейство gpt-4o)
+DEFAULT_ENCODING = "o200k_base"
+
+# Символов на токен в оценке без tiktoken
+CHARS_PER_TOKEN = 3
+
+
+@lru_cache(maxsize=8)
+def get_encoding(model: str):
+    """
+    Кодировщик tiktoken для модели.
+
+    Returns:
+        tiktoken.Encoding или None, если tiktoken недоступен
+    """
+    try:
+        import tiktoken
+    except ImportError:
+        logger.warning("tiktoken не установлен, токены оцениваются по длине текста")
+        return None
+
+    try:
+        try:
+            return tiktoken.encoding_for_model(model)
+        except KeyError:
+            return tiktoken.get_encoding(DEFAULT_ENCODING)
+    except Exception as e:
+        logger.warning(f"Кодировщик tiktoken для {model} недоступен ({e}), токены оцениваются по длине текста")
+        return None
+
+
+@lru_cache(maxsize=8192)
+def count_tokens(text: str, model: Optional[str] = None) -> int:
+    """
+    Количество токенов текста.
+
+    Args:
+        text: Текст
+        model: Модель (по умолчанию OPENAI_MODEL)
+
+    Returns:
+        Число токенов
+    """
+    encoding = get_encoding(model or config.OPENAI_MODEL)
+    if encoding is None:
+        return len(text) // CHARS_PER_TOKEN
+    return len(encoding.encode(text, disallowed_special=()))
+
+
+def truncate_tokens(text: str, max_tokens: int, model: Optional[str] = None) -> str:
+    """
+    Начало текста не длиннее max_tokens токенов.
+
+    Args:
+        text: Текст
+        max_tokens: Максимум токенов
+        model: Модель (по умолчанию OPENAI_MODEL)
+
+    Returns:
+        Префикс текста
+    """
+    if max_tokens <= 0:
+        return ""
+    encoding = get_encoding(model or config.OPENAI_MODEL)
+    if encoding is None:
+        return text[:max_tokens * CHARS_PER_TOKEN]
+    tokens = encoding.encode(text, disallowed_special=())
+    if len(tokens) <= max_tokens:
+        return text
+    # Обрезка по токенам может разрезать многобайтный символ — декодер его отбросит
+    return encoding.decode(tokens[:max_tokens], errors="ignore")